@@ -2,7 +2,7 @@
 ERP AI RAG - Flask API
 """
 
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
 import os
 import sys
 
@@ -10,15 +10,48 @@ import sys
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, BASE_DIR)
 
-from config.db_config import LLM_CONFIG
-from sql_ai.nl_to_sql import generate_sql, learn_from_correction
+from config.db_config import RAG_CONFIG
+from sql_ai.nl_to_sql import generate_sql, stream_sql, learn_from_correction, remember_sql, forget_sql
+from sql_ai.sql_cache import get_sql_cache
+from sql_ai.prompt_budget import get_usage_stats
+from sql_ai.intent_templates import get_fast_path_stats
 from sql_ai.run_sql import run_query
-from sql_ai.sql_validator import validate_sql
+from sql_ai.sql_validator import prepare_sql
 from learning.feedback_system import save_feedback, get_feedback_stats, get_all_corrections
-import requests
+from rag.cache import get_cache_stats, normalize_question
+from rag.storage import store_exists
+from rag.query_rag import start_warmup, get_warmup_status
+from sql_ai import llm_client
+from api.single_flight import SingleFlight, FlightAbandoned
+from sql_ai.llm_dispatcher import LLMBusy, get_dispatcher
 
 app = Flask(__name__, template_folder='../web/templates')
 
+# Aynı anda sorulan aynı soru (normalize) tek SQL üretimi + tek sorgu çalıştırır
+chat_flight = SingleFlight(name='chat')
+
+@app.errorhandler(LLMBusy)
+def llm_busy(error):
+    """LLM kapasitesi dolu: worker'ı bekletmeden 503 + Retry-After"""
+    print(f"LLM meşgul: {error} (Retry-After {error.retry_after} sn)")
+    response = jsonify({
+        'success': False,
+        'message': 'Sistem şu anda yoğun, lütfen birkaç saniye sonra tekrar deneyin.',
+        'retry_after': error.retry_after
+    })
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def warmup_on_start(debug=False):
+    """
+    Embedding modeli ve indeksi arka planda yükle
+    Debug reloader'ın ana sürecinde atla (asıl sunucu alt süreçte çalışır)
+    """
+    if debug and os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
+        return
+    start_warmup()
+
 @app.route('/')
 def index():
     """Ana sayfa"""
@@ -37,59 +70,183 @@ def chat():
     print(f"SORU: {question}")
     print('='*60)
     
-    # Selamlaşma kontrolü
+    greeting = greeting_response(question)
+    if greeting:
+        return jsonify(greeting)
+    
+    return jsonify(chat_flight.do(normalize_question(question), lambda: answer_question(question)))
+
+def answer_question(question):
+    """SQL üret, doğrula, çalıştır (/api/chat pipeline'ı)"""
+    # 1. SQL üret
+    sql = generate_sql(question)
+    print(f"SQL: {sql}")
+    
+    return answer_with_sql(question, sql)
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Server-Sent Events chat endpoint
+    Olaylar: token (SQL parçaları) → sql → status (validating / executing) → result
+    result verisi /api/chat yanıtıyla aynıdır
+    """
+    data = request.get_json(silent=True) or {}
+    question = data.get('message', '').strip()
+    
+    if not question:
+        return jsonify({'error': 'Mesaj boş'}), 400
+    
+    print(f"\n{'='*60}")
+    print(f"SORU (stream): {question}")
+    print('='*60)
+    
+    def events():
+        greeting = greeting_response(question)
+        if greeting:
+            yield sse_event('result', greeting)
+            return
+        
+        # Aynı soru zaten işleniyorsa onun sonucunu bekle (token akışı olmadan)
+        key = normalize_question(question)
+        call, leader = chat_flight.begin(key)
+        if not leader:
+            try:
+                result = call.result()
+            except FlightAbandoned:
+                result = yield from stream_pipeline(question)
+            else:
+                print("Aynı soru işleniyor, sonucu paylaşıldı")
+                yield sse_event('sql', {'sql': result.get('sql')})
+            yield sse_event('result', result)
+            return
+        
+        try:
+            result = yield from stream_pipeline(question)
+        except GeneratorExit:
+            # İstemci bağlantıyı kesti: bekleyenler işi kendileri yapsın
+            chat_flight.finish(key, call, error=FlightAbandoned())
+            raise
+        except Exception as e:
+            chat_flight.finish(key, call, error=e)
+            raise
+        chat_flight.finish(key, call, result=result)
+        yield sse_event('result', result)
+    
+    # İlk olayı yanıt başlamadan al: LLM meşgulse (LLMBusy) SSE yerine 503 döner
+    stream = events()
+    first = next(stream, None)
+    
+    return Response(stream_with_context(prepend_event(first, stream)), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # nginx arkasında buffer'lanmasın
+    })
+
+def prepend_event(first, stream):
+    """Önceden alınmış ilk olay + kalan akış (bağlantı kesilince akış kapatılır)"""
+    try:
+        if first is not None:
+            yield first
+        yield from stream
+    finally:
+        stream.close()
+
+def stream_pipeline(question):
+    """
+    Stream endpoint adımları: token / sql / status SSE olaylarını üretir
+    Returns (generator dönüş değeri): result yanıtı (/api/chat ile aynı)
+    """
+    sql = None
+    for event, value in stream_sql(question):
+        if event == 'token':
+            yield sse_event('token', {'text': value})
+        elif event == 'sql':
+            sql = value
+    print(f"SQL: {sql}")
+    yield sse_event('sql', {'sql': sql})
+    
+    result = None
+    for stage, payload in answer_stages(question, sql):
+        if stage == 'status':
+            yield sse_event('status', {'stage': payload})
+        else:
+            result = payload
+    return result
+
+def sse_event(event, data):
+    """Tek SSE mesajı (jsonify ile aynı serileştirme: Decimal, datetime)"""
+    return f"event: {event}\ndata: {app.json.dumps(data)}\n\n"
+
+def greeting_response(question):
+    """Selamlaşma ise hazır yanıt, değilse None"""
     greetings = ['merhaba', 'selam', 'hey', 'hi', 'hello', 'günaydın', 'iyi günler']
     if any(g in question.lower() for g in greetings) and len(question.split()) <= 3:
-        return jsonify({
+        return {
             'success': True,
             'message': 'Merhaba! Size satınalma, sipariş, firma ve proje bilgileri hakkında yardımcı olabilirim.',
             'sql': None,
             'raw_results': []
-        })
-    
-    # 1. SQL üret
-    sql = generate_sql(question)
-    print(f"SQL: {sql}")
-    
+        }
+    return None
+
+def answer_with_sql(question, sql):
+    """Üretilen SQL'i doğrula, çalıştır, yanıtı oluştur"""
+    result = None
+    for stage, payload in answer_stages(question, sql):
+        if stage == 'result':
+            result = payload
+    return result
+
+def answer_stages(question, sql):
+    """
+    answer_with_sql adımları
+    Yields: ('status', aşama adı) ... en sonda ('result', yanıt)
+    """
     if not sql:
-        return jsonify({
+        yield 'result', {
             'success': False,
             'message': 'Sorunuz için uygun bir sorgu oluşturulamadı. Lütfen daha açık bir şekilde sorun.',
             'sql': None
-        })
+        }
+        return
     
     # 2. Güvenlik kontrolü
-    is_valid, error = validate_sql(sql)
-    if not is_valid:
-        return jsonify({
+    yield 'status', 'validating'
+    query = prepare_sql(sql)
+    if not query.is_valid:
+        yield 'result', {
             'success': False,
-            'message': error,
+            'message': query.error,
             'sql': sql
-        })
+        }
+        return
     
-    # 3. Sorguyu çalıştır
-    results, columns, error = run_query(sql)
+    # 3. Sorguyu çalıştır (aynı ayrıştırılmış sorgu, tekrar doğrulanmaz)
+    yield 'status', 'executing'
+    results, columns, error = run_query(query)
     
     if error:
         print(f"SQL HATA: {error}")
-        return jsonify({
+        yield 'result', {
             'success': False,
             'message': f'Sorgu hatası: {error}',
             'sql': sql
-        })
+        }
+        return
     
     print(f"SONUÇ: {len(results) if results else 0} kayıt")
+    remember_sql(question, sql)
     
     # 4. Sonuçları açıkla
     explanation = explain_results(question, results)
     
-    return jsonify({
+    yield 'result', {
         'success': True,
         'message': explanation,
         'sql': sql,
         'raw_results': results[:100] if results else [],
         'total_count': len(results) if results else 0
-    })
+    }
 
 def explain_results(question, results):
     """Sonuçları Türkçe açıkla"""
@@ -123,12 +280,8 @@ def test_db():
 @app.route('/api/test-ollama')
 def test_ollama():
     """Ollama bağlantı testi"""
-    try:
-        response = requests.get(f"{LLM_CONFIG['base_url']}/api/tags", timeout=5)
-        if response.status_code == 200:
-            return jsonify({'status': 'ok'})
-    except:
-        pass
+    if llm_client.is_available():
+        return jsonify({'status': 'ok'})
     return jsonify({'status': 'error'})
 
 @app.route('/api/health')
@@ -136,10 +289,13 @@ def health():
     """Sistem sağlık kontrolü"""
     from sql_ai.run_sql import get_connection
     
+    warmup = get_warmup_status()
     status = {
         'database': False,
         'ollama': False,
-        'rag': False
+        'rag': False,
+        'ready': warmup['ready'],
+        'warmup': warmup
     }
     
     # DB
@@ -149,15 +305,10 @@ def health():
         status['database'] = True
     
     # Ollama
-    try:
-        response = requests.get(f"{LLM_CONFIG['base_url']}/api/tags", timeout=5)
-        if response.status_code == 200:
-            status['ollama'] = True
-    except:
-        pass
+    status['ollama'] = llm_client.is_available()
     
     # RAG
-    if os.path.exists('data/vector_db/embeddings.npy'):
+    if store_exists(RAG_CONFIG['vector_db_path']):
         status['rag'] = True
     
     return jsonify(status)
@@ -204,6 +355,9 @@ def submit_feedback():
     if is_correct and sql:
         from learning.feedback_system import add_learned_example
         add_learned_example(question, sql)
+    elif question:
+        # Yanlış işaretlenen SQL tekrar cache'ten dönmesin
+        forget_sql(question, sql or None)
     
     return jsonify({'success': True})
 
@@ -213,10 +367,17 @@ def get_stats():
     """İstatistikleri getir"""
     stats = get_feedback_stats()
     corrections = get_all_corrections()
+    sql_cache = get_sql_cache()
     
     return jsonify({
         'feedback': stats,
-        'corrections_count': len(corrections)
+        'corrections_count': len(corrections),
+        'rag_cache': get_cache_stats(),
+        'sql_cache': sql_cache.stats() if sql_cache else None,
+        'prompt_tokens': get_usage_stats(),
+        'single_flight': chat_flight.stats(),
+        'fast_path': get_fast_path_stats(),
+        'llm_dispatcher': get_dispatcher().stats()
     })
 
 
@@ -234,4 +395,5 @@ if __name__ == '__main__':
     print("\n🌐 http://localhost:5000")
     print("="*60)
     
+    warmup_on_start(debug=True)
     app.run(debug=True, host='0.0.0.0', port=5000)
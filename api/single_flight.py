@@ -0,0 +1,98 @@
+"""
+Single-flight: aynı anahtarlı eşzamanlı istekleri tek çalıştırmada birleştir
+İlk istek (lider) işi yapar, o sürerken gelen aynı anahtarlı istekler (takipçi)
+yeni iş başlatmaz, liderin sonucunu bekler
+
+Lider işi bitiremeden bırakırsa (ör. stream istemcisi bağlantıyı kesti) takipçilere
+FlightAbandoned iletilir; takipçi işi kendisi yapar.
+"""
+
+import threading
+
+
+class FlightAbandoned(Exception):
+    """Lider sonuç üretmeden ayrıldı"""
+
+
+class Call:
+    """Devam eden tek çalıştırma"""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._result = None
+        self._error = None
+        self.followers = 0
+
+    def result(self, timeout=None):
+        """Liderin sonucunu bekle, lider hata aldıysa aynı hatayı fırlat"""
+        if not self._done.wait(timeout):
+            raise TimeoutError('single-flight sonucu beklenirken zaman aşımı')
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+class SingleFlight:
+    """Anahtar → devam eden Call, thread-safe"""
+
+    def __init__(self, name=None):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    def begin(self, key):
+        """
+        Returns: (call, lider mi?)
+        Lider mutlaka finish() çağırmalı (try/finally)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.followers += 1
+                self.coalesced += 1
+                return call, False
+            call = Call()
+            self._calls[key] = call
+            self.leaders += 1
+            return call, True
+
+    def finish(self, key, call, result=None, error=None):
+        """Sonucu yayınla, anahtarı serbest bırak (sonraki istek yeni çalıştırma başlatır)"""
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+            if isinstance(error, FlightAbandoned):
+                self.abandoned += 1
+        call._result = result
+        call._error = error
+        call._done.set()
+
+    def do(self, key, fn):
+        """fn() sonucunu döndür; aynı anahtarla fn zaten çalışıyorsa onun sonucunu bekle"""
+        call, leader = self.begin(key)
+        if not leader:
+            try:
+                return call.result()
+            except FlightAbandoned:
+                return fn()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            self.finish(key, call, error=e if isinstance(e, Exception) else FlightAbandoned())
+            raise
+        self.finish(key, call, result=result)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                'name': self.name,
+                'in_flight': len(self._calls),
+                'leaders': self.leaders,
+                'coalesced': self.coalesced,
+                'abandoned': self.abandoned
+            }
@@ -41,21 +41,75 @@ LLM_CONFIG = {
     'base_url': os.getenv('ERP_LLM_BASE_URL', 'http://localhost:11434'),
     'model': os.getenv('ERP_LLM_MODEL', 'qwen2.5-coder:7b'),
     'temperature': _float_env('ERP_LLM_TEMPERATURE', 0.1),
-    'timeout': _int_env('ERP_LLM_TIMEOUT', 120)
+    'timeout': _int_env('ERP_LLM_TIMEOUT', 120),  # okuma timeout'u (saniye)
+    'num_ctx': _int_env('ERP_LLM_NUM_CTX', 8192),  # context penceresi (token)
+    'num_predict': _int_env('ERP_LLM_NUM_PREDICT', 800),  # üretilecek en fazla token
+    'prompt_budget': _int_env('ERP_LLM_PROMPT_BUDGET', 0),  # prompt token bütçesi, 0 = num_ctx - num_predict
+    'tokenizer': os.getenv('ERP_LLM_TOKENIZER', ''),  # tokenizer.json yolu, '' = tahmini sayım
+    'chars_per_token': _float_env('ERP_LLM_CHARS_PER_TOKEN', 3.0),  # tahmini sayım oranı (--calibrate)
+    'context_workers': _int_env('ERP_LLM_CONTEXT_WORKERS', 12),  # LLM öncesi context aşamaları thread havuzu
+    'rag_timeout': _float_env('ERP_LLM_RAG_TIMEOUT', 10),  # saniye, aşılırsa context'siz devam
+    'examples_timeout': _float_env('ERP_LLM_EXAMPLES_TIMEOUT', 2),  # aşılırsa önceki önek
+    'corrections_timeout': _float_env('ERP_LLM_CORRECTIONS_TIMEOUT', 2),  # aşılırsa düzeltmesiz
+    'max_concurrent': _int_env('ERP_LLM_MAX_CONCURRENT', 2),  # eşzamanlı üretim (OLLAMA_NUM_PARALLEL ile uyumlu)
+    'max_queue': _int_env('ERP_LLM_MAX_QUEUE', 16),  # slot bekleyen en fazla istek, fazlası 503
+    'queue_timeout': _float_env('ERP_LLM_QUEUE_TIMEOUT', 20),  # saniye, slot beklemek için son süre
+    'candidates': _int_env('ERP_LLM_CANDIDATES', 1),  # eşzamanlı SQL adayı, 1 = tek üretim (akışlı)
+    'candidate_budget': _float_env('ERP_LLM_CANDIDATE_BUDGET', 60),  # saniye, adayların toplam süresi
+    'temperature_step': _float_env('ERP_LLM_TEMPERATURE_STEP', 0.2),  # aday başına sıcaklık artışı
+    'compile_check': os.getenv('ERP_LLM_COMPILE_CHECK', 'noexec'),  # noexec | describe | off
+    'keep_alive': os.getenv('ERP_LLM_KEEP_ALIVE', '30m'),  # model bellekte kalma süresi (-1 = süresiz)
+    'connect_timeout': _float_env('ERP_LLM_CONNECT_TIMEOUT', 5),
+    'pool_size': _int_env('ERP_LLM_POOL_SIZE', 10),  # keep-alive bağlantı havuzu
+    'retries': _int_env('ERP_LLM_RETRIES', 2),  # bağlantı kopmalarında yeniden deneme
+    'retry_backoff': _float_env('ERP_LLM_RETRY_BACKOFF', 0.5)  # saniye, denemede ikiye katlanır
 }
 
 # RAG Ayarları
 RAG_CONFIG = {
     'chunk_size': _int_env('ERP_RAG_CHUNK_SIZE', 500),
     'chunk_overlap': _int_env('ERP_RAG_CHUNK_OVERLAP', 50),
+    'chunking': os.getenv('ERP_RAG_CHUNKING', '1') == '1',  # tablo dökümanlarını bölümlere ayır
+    'chunk_aggregation': os.getenv('ERP_RAG_CHUNK_AGGREGATION', 'max'),  # max | sum
     'top_k': _int_env('ERP_RAG_TOP_K', 5),  # En ilgili 5 tablo bilgisi
-    'vector_db_path': os.getenv('ERP_RAG_VECTOR_DB_PATH', './data/vector_db')
+    'pattern_top_k': _int_env('ERP_RAG_PATTERN_TOP_K', 2),  # Ayrı kotalı sorgu kalıbı sayısı, 0 = tablolarla karışık
+    'vector_db_path': os.getenv('ERP_RAG_VECTOR_DB_PATH', './data/vector_db'),
+    'index_mode': os.getenv('ERP_RAG_INDEX_MODE', 'exact'),  # exact | ivf | int8 | binary
+    'ivf_nlist': _int_env('ERP_RAG_IVF_NLIST', 0),  # 0 = sqrt(döküman sayısı)
+    'ivf_nprobe': _int_env('ERP_RAG_IVF_NPROBE', 8),
+    'rerank_factor': _int_env('ERP_RAG_RERANK_FACTOR', 0),  # int8/binary aday çarpanı, 0 = mod varsayılanı
+    'encode_workers': _int_env('ERP_RAG_ENCODE_WORKERS', 1),  # build encode süreçleri, 0 = CPU sayısı
+    'hybrid': os.getenv('ERP_RAG_HYBRID', '1') == '1',  # BM25 + dense füzyonu
+    'join_expansion': os.getenv('ERP_RAG_JOIN_EXPANSION', '1') == '1',  # FK JOIN yolu ipuçları
+    'join_max_depth': _int_env('ERP_RAG_JOIN_MAX_DEPTH', 3),  # JOIN yolu en fazla kaç adım
+    'embedding_dtype': os.getenv('ERP_RAG_EMBEDDING_DTYPE', 'float32'),  # float32 | float16
+    'embedding_socket': os.getenv('ERP_RAG_EMBEDDING_SOCKET', './data/embedding.sock'),  # paylaşılan servis, '' = kapalı
+    'embedding_batch': _int_env('ERP_RAG_EMBEDDING_BATCH', 64),  # servis micro-batch üst sınırı (metin)
+    'embedding_wait_ms': _int_env('ERP_RAG_EMBEDDING_WAIT_MS', 5),  # servis micro-batch bekleme penceresi
+    'cache_size': _int_env('ERP_RAG_CACHE_SIZE', 512),  # 0 = cache kapalı
+    'cache_ttl': _int_env('ERP_RAG_CACHE_TTL', 3600)  # saniye
+}
+
+# Soru → SQL Cache Ayarları
+SQL_CACHE_CONFIG = {
+    'enabled': os.getenv('ERP_SQL_CACHE', '1') == '1',
+    'path': os.getenv('ERP_SQL_CACHE_PATH', './data/sql_cache.json'),
+    'threshold': _float_env('ERP_SQL_CACHE_THRESHOLD', 0.93),  # semantik eşleşme için min. cosine, 0 = sadece birebir
+    'max_entries': _int_env('ERP_SQL_CACHE_MAX_ENTRIES', 5000)
+}
+
+# Şablonlu Soru Hızlı Yolu (LLM'siz)
+FAST_PATH_CONFIG = {
+    'enabled': os.getenv('ERP_FAST_PATH', '1') == '1',
+    'min_confidence': _float_env('ERP_FAST_PATH_MIN_CONFIDENCE', 0.85)  # tanınan kelime oranı, altı LLM'e gider
 }
 
 # Güvenlik Ayarları
 SECURITY_CONFIG = {
     'allowed_operations': ['SELECT'],
-    'blocked_keywords': ['DROP', 'DELETE', 'UPDATE', 'INSERT', 'TRUNCATE', 'ALTER', 'CREATE', 'EXEC'],
+    'blocked_keywords': ['DROP', 'DELETE', 'UPDATE', 'INSERT', 'TRUNCATE', 'ALTER', 'CREATE', 'EXEC',
+                         # Uzak sorgu: ikinci argümandaki metin bağlı sunucuda çalışır
+                         'OPENQUERY', 'OPENROWSET', 'OPENDATASOURCE'],
     'max_results': _int_env('ERP_MAX_RESULTS', 1000)
 }
 
@@ -28,23 +28,19 @@ def check_requirements():
 
 def check_ollama():
     """Ollama'yı kontrol et"""
-    import requests
     from config.db_config import LLM_CONFIG
+    from sql_ai.llm_client import list_models
     
-    try:
-        response = requests.get(f"{LLM_CONFIG['base_url']}/api/tags", timeout=5)
-        if response.status_code == 200:
-            models = [m['name'] for m in response.json().get('models', [])]
-            if LLM_CONFIG['model'] in models or any(LLM_CONFIG['model'] in m for m in models):
-                print(f"✓ Ollama çalışıyor, model: {LLM_CONFIG['model']}")
-                return True
-            else:
-                print(f"✗ Model bulunamadı: {LLM_CONFIG['model']}")
-                print(f"  Mevcut modeller: {models}")
-                print(f"  Kurulum: ollama pull {LLM_CONFIG['model']}")
-                return False
-    except:
-        pass
+    models = list_models()
+    if models is not None:
+        if LLM_CONFIG['model'] in models or any(LLM_CONFIG['model'] in m for m in models):
+            print(f"✓ Ollama çalışıyor, model: {LLM_CONFIG['model']}")
+            return True
+        else:
+            print(f"✗ Model bulunamadı: {LLM_CONFIG['model']}")
+            print(f"  Mevcut modeller: {models}")
+            print(f"  Kurulum: ollama pull {LLM_CONFIG['model']}")
+            return False
     
     print("✗ Ollama çalışmıyor")
     print("  Başlatmak için: ollama serve")
@@ -66,7 +62,10 @@ def check_database():
 
 def check_rag():
     """RAG vektör DB'yi kontrol et"""
-    if os.path.exists('data/vector_db/embeddings.npy'):
+    from config.db_config import RAG_CONFIG
+    from rag.storage import store_exists
+    
+    if store_exists(RAG_CONFIG['vector_db_path']):
         print("✓ RAG vektör veritabanı mevcut")
         return True
     
@@ -74,8 +73,8 @@ def check_rag():
     print("  Oluşturmak için: python main.py setup")
     return False
 
-def setup_rag():
-    """RAG sistemini kur"""
+def setup_rag(full=False):
+    """RAG sistemini kur (full=True: tüm embedding'leri yeniden oluştur)"""
     print("\n" + "="*60)
     print("RAG Sistemi Kurulumu")
     print("="*60)
@@ -93,7 +92,7 @@ def setup_rag():
     # 3. Vektör DB oluştur
     print("\n3. Vektör veritabanı oluşturuluyor...")
     from rag.build_vector_db import build_vector_db
-    build_vector_db()
+    build_vector_db(full=full)
     
     print("\n✓ RAG sistemi kuruldu!")
 
@@ -105,9 +104,19 @@ def run_server():
     
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
     
-    from api.app import app
+    from api.app import app, warmup_on_start
+    warmup_on_start(debug=True)
     app.run(debug=True, host='0.0.0.0', port=5000)
 
+def run_embedding_service():
+    """Paylaşılan embedding servisini başlat (API worker'ları Unix socket ile bağlanır)"""
+    print("\n" + "="*60)
+    print("   ERP AI RAG - Embedding Servisi")
+    print("="*60)
+    
+    from rag.embedding_service import serve
+    serve()
+
 def main():
     """Ana fonksiyon"""
     print("="*60)
@@ -126,7 +135,7 @@ def main():
                 return
             if not check_database():
                 return
-            setup_rag()
+            setup_rag(full='--full' in sys.argv)
             
         elif command == 'run':
             # Sunucuyu başlat
@@ -134,6 +143,12 @@ def main():
                 return
             run_server()
             
+        elif command == 'embedding':
+            # Paylaşılan embedding servisi
+            if not check_requirements():
+                return
+            run_embedding_service()
+            
         elif command == 'check':
             # Sistem kontrolü
             print("\nSistem Kontrolü:")
@@ -153,8 +168,10 @@ def print_usage():
     """Kullanım bilgisi"""
     print("""
 Kullanım:
-    python main.py setup    - RAG sistemini kur (ilk kurulum)
+    python main.py setup    - RAG sistemini kur / güncelle (sadece değişen tablolar)
+    python main.py setup --full - Tüm embedding'leri sıfırdan oluştur
     python main.py run      - Sunucuyu başlat
+    python main.py embedding - Paylaşılan embedding servisini başlat (çok worker'lı kurulum)
     python main.py check    - Sistem kontrolü
 
 İlk Kurulum Adımları:
@@ -0,0 +1,306 @@
+"""
+RAG Retrieval Benchmark
+SEED_EXAMPLES + data/learned_examples.json soruları, gold SQL'deki tablolar = doğru cevap
+
+Veritabanı ve model indirmesi gerekmez: gold SQL'lerden türetilen tablolar ve
+istenen sayıda sentetik "rakip" tablodan oluşan yerel bir şema kullanılır.
+Varsayılan encoder karakter n-gram hashing'dir (çevrimdışı); gerçek modelle
+ölçmek için --model verilir.
+
+Kullanım:
+    python rag/benchmark.py --tables 500 --modes exact,ivf,int8,binary --top-k 5
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+import zlib
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.db_config import RAG_CONFIG
+from rag.build_vector_db import SchemaVectorDB, add_table_document, build_lexical_index
+from rag.join_graph import JoinGraph
+from rag.lexical_index import tokenize
+from rag.vector_index import INDEX_TYPES
+from schema.clean_schema import create_table_document, COLUMN_DESCRIPTIONS
+
+_TABLE_RE = re.compile(r'\b(?:FROM|JOIN)\s+(TOHOM_\w+)(?:\s+(?:AS\s+)?(?!ON\b|WHERE\b|INNER\b|LEFT\b|GROUP\b|ORDER\b)([A-Z]\w*))?', re.I)
+_QUALIFIED_RE = re.compile(r'\b([A-Z]\w*)\.([A-Z_]+)\b')
+_IDENT_RE = re.compile(r'\b[A-Z][A-Z_]{2,}\b')
+
+_SQL_WORDS = {
+    'SELECT', 'FROM', 'WHERE', 'AND', 'INNER', 'LEFT', 'JOIN', 'GROUP', 'ORDER', 'DESC',
+    'ASC', 'COUNT', 'SUM', 'AVG', 'MAX', 'MIN', 'CAST', 'DATE', 'GETDATE', 'YEAR', 'MONTH',
+    'DAY', 'TOP', 'DISTINCT', 'HAVING', 'CASE', 'WHEN', 'THEN', 'ELSE', 'END', 'NOT', 'NULL',
+    'DATEADD', 'DATEDIFF', 'ISNULL', 'LIKE', 'BETWEEN', 'EXISTS', 'UNION', 'ALL',
+}
+
+# Sentetik tablo adları için ERP sözcükleri
+_WORDS = [
+    'SIPARIS', 'FATURA', 'DEPO', 'STOK', 'URUN', 'PARTI', 'CARI', 'HAREKET', 'PROJE',
+    'PERSONEL', 'AKTIVITE', 'HESAP', 'KASA', 'BANKA', 'CEK', 'SENET', 'IRSALIYE', 'TEKLIF',
+    'SOZLESME', 'MASRAF', 'BUTCE', 'ODEME', 'TAHSILAT', 'FIYAT', 'BIRIM', 'ADRES', 'SATIRI',
+    'DETAY', 'GECMIS', 'ONAY', 'TALEP', 'IADE', 'KALITE', 'URETIM', 'ROTA', 'MAKINE',
+]
+_COLUMN_TYPES = ['int', 'decimal', 'nvarchar', 'datetime', 'bit']
+
+
+def gold_tables(sql):
+    """SQL'deki FROM / JOIN tabloları (sıralı, tekrarsız)"""
+    tables = []
+    for table, _ in _TABLE_RE.findall(sql):
+        table = table.upper()
+        if table not in tables:
+            tables.append(table)
+    return tables
+
+
+def sql_columns(sql):
+    """
+    Gold SQL'den tablo → kolon adları
+    Alias'lı kolonlar alias'ın tablosuna, tek tablolu sorgularda çıplak adlar o tabloya
+    """
+    aliases = {}
+    tables = []
+    for table, alias in _TABLE_RE.findall(sql):
+        table = table.upper()
+        tables.append(table)
+        if alias:
+            aliases[alias.upper()] = table
+
+    columns = {table: set() for table in tables}
+    for alias, column in _QUALIFIED_RE.findall(sql.upper()):
+        if alias in aliases:
+            columns[aliases[alias]].add(column)
+    if len(set(tables)) == 1:
+        for word in _IDENT_RE.findall(sql.upper()):
+            if word not in _SQL_WORDS and not word.startswith('TOHOM_'):
+                columns[tables[0]].add(word)
+    return columns
+
+
+def load_examples(learned_path='data/learned_examples.json'):
+    """Soru + gold tablo listesi (tablosu çıkarılamayan örnekler atlanır)"""
+    from finetuning.prepare_data import SEED_EXAMPLES
+
+    examples = list(SEED_EXAMPLES)
+    if learned_path and os.path.exists(learned_path):
+        with open(learned_path, 'r', encoding='utf-8') as f:
+            examples += json.load(f)
+
+    seen = set()
+    result = []
+    for ex in examples:
+        tables = gold_tables(ex['sql'])
+        key = ex['question'].lower()
+        if tables and key not in seen:
+            seen.add(key)
+            result.append({'question': ex['question'], 'sql': ex['sql'], 'tables': tables})
+    return result
+
+
+def _table_info(columns, foreign_keys, rng):
+    return {
+        'columns': [
+            {'name': name, 'type': rng.choice(_COLUMN_TYPES), 'max_length': None}
+            for name in columns
+        ],
+        'primary_keys': [columns[0]],
+        'foreign_keys': foreign_keys,
+        'row_count': int(rng.integers(10, 1_000_000)),
+        'sample_values': {},
+    }
+
+
+def synthetic_schema(examples, n_tables, seed=42):
+    """
+    raw_schema.json formatında yerel şema
+    Gold tablolar SQL'deki kolonlarıyla, kalanı ERP sözcüklerinden rakip tablolar
+    """
+    rng = np.random.default_rng(seed)
+
+    real_columns = {}
+    for ex in examples:
+        for table, columns in sql_columns(ex['sql']).items():
+            real_columns.setdefault(table, set()).update(columns)
+
+    tables = {}
+    for table in sorted(real_columns):
+        pk = table[len('TOHOM_'):] + '_ID'
+        columns = [pk] + sorted(real_columns[table] - {pk})
+        tables[table] = _table_info(columns, [], rng)
+
+    # Gold SQL'deki JOIN'ler → foreign key (X.A_ID = Y.A_ID, A_ID Y'nin primary key'i)
+    for table, info in tables.items():
+        for column in info['columns']:
+            target = 'TOHOM_' + column['name'][:-3] if column['name'].endswith('_ID') else None
+            if target and target != table and target in tables:
+                info['foreign_keys'].append({
+                    'column': column['name'], 'references_table': target,
+                    'references_column': column['name']
+                })
+
+    names = list(tables)
+    while len(tables) < max(n_tables, len(names)):
+        size = int(rng.integers(2, 4))
+        name = 'TOHOM_' + '_'.join(rng.choice(_WORDS, size=size, replace=False))
+        if name in tables:
+            continue
+        columns = [name[len('TOHOM_'):] + '_ID']
+        columns += list(rng.choice(list(COLUMN_DESCRIPTIONS) + [w + '_ID' for w in _WORDS],
+                                   size=int(rng.integers(4, 30)), replace=False))
+        columns = list(dict.fromkeys(columns))
+        foreign_keys = []
+        if names:
+            target = names[int(rng.integers(0, len(names)))]
+            foreign_keys.append({
+                'column': tables[target]['primary_keys'][0], 'references_table': target,
+                'references_column': tables[target]['primary_keys'][0]
+            })
+        tables[name] = _table_info(columns, foreign_keys, rng)
+        names.append(name)
+    return {'tables': tables}
+
+
+class HashingEncoder:
+    """
+    Çevrimdışı stand-in encoder: karakter 3-gram feature hashing
+    SentenceTransformer.encode ile aynı arayüz
+    """
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def encode(self, texts, **kwargs):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for token in tokenize(text):
+                padded = f' {token} '
+                for j in range(len(padded) - 2):
+                    h = zlib.crc32(padded[j:j + 3].encode('utf-8'))
+                    vectors[i, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        return vectors
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+
+def build_benchmark_db(schema, mode, model, model_name, schema_path, previous=None, encode_workers=None):
+    """Şemadan bellekte vektör DB (+ BM25, JOIN grafiği)"""
+    db = SchemaVectorDB(model_name=model_name, index_mode=mode, model=model, encode_workers=encode_workers)
+    for table_name, table_info in schema['tables'].items():
+        add_table_document(db, table_name, create_table_document(table_name, table_info))
+    db.lexical = build_lexical_index(db, schema_path)
+    db.join_graph = JoinGraph.build(schema['tables'])
+    db.build_index(previous=previous)
+    db.version = f'benchmark-{mode}'
+    return db
+
+
+def evaluate(db, examples, top_k, repeat=3):
+    """
+    recall@k / MRR: retrieve() sonuçlarındaki tablo sırası
+    Gecikme: önceden encode edilmiş sorgularla sadece indeks araması (search_vectors)
+    """
+    from rag.query_rag import retrieve
+
+    questions = [ex['question'] for ex in examples]
+    all_results = retrieve(db, questions, top_k)
+
+    recalls, reciprocal_ranks = [], []
+    for ex, results in zip(examples, all_results):
+        ranked = [r['metadata']['name'] for r in results if r['metadata'].get('type') == 'table']
+        gold = set(ex['tables'])
+        recalls.append(len(gold & set(ranked[:top_k])) / len(gold))
+        rank = next((i for i, name in enumerate(ranked, start=1) if name in gold), None)
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+
+    vectors = db.encode(questions)
+    latencies = []
+    for _ in range(repeat):
+        for vector in vectors:
+            start = time.perf_counter()
+            db.search_vectors(vector[None, :], top_k=top_k)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        'recall': float(np.mean(recalls)),
+        'mrr': float(np.mean(reciprocal_ranks)),
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'documents': len(db.documents),
+    }
+
+
+def run_benchmark(n_tables=200, modes=None, top_k=5, model_name=None, repeat=3,
+                  learned_path='data/learned_examples.json', seed=42):
+    """
+    Returns: {mode: evaluate() sonucu}
+    """
+    from rag.cache import invalidate_all
+
+    modes = modes or list(INDEX_TYPES)
+    examples = load_examples(learned_path)
+    schema = synthetic_schema(examples, n_tables, seed=seed)
+
+    encode_workers = None
+    if model_name:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(model_name)
+    else:
+        model, model_name = HashingEncoder(), 'hashing-384'
+        # Stand-in encoder worker süreçlerinde yüklenemez
+        encode_workers = 1
+
+    print(f"Örnek: {len(examples)} soru | Şema: {len(schema['tables'])} tablo | Encoder: {model_name}")
+
+    report = {}
+    previous = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        schema_path = os.path.join(tmp, 'raw_schema.json')
+        with open(schema_path, 'w', encoding='utf-8') as f:
+            json.dump(schema, f, ensure_ascii=False)
+
+        for mode in modes:
+            db = build_benchmark_db(schema, mode, model, model_name, schema_path, previous, encode_workers)
+            # Tüm modlar aynı embedding'leri kullanır (sadece ilk mod encode eder)
+            previous = {meta['hash']: vec for meta, vec in zip(db.metadata, db.embeddings)}
+            invalidate_all()
+            report[mode] = evaluate(db, examples, top_k, repeat=repeat)
+    return report
+
+
+def print_report(report, top_k=5):
+    """Benchmark raporunu yazdır"""
+    print(f"{'Mod':<8} {'Döküman':>8} {'Recall@' + str(top_k):>9} {'MRR':>7} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    print('-' * 62)
+    for mode, row in report.items():
+        print(f"{mode:<8} {row['documents']:>8} {row['recall']:>9.3f} {row['mrr']:>7.3f} "
+              f"{row['p50_ms']:>8.3f} {row['p95_ms']:>8.3f} {row['p99_ms']:>8.3f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='RAG retrieval benchmark (çevrimdışı)')
+    parser.add_argument('--tables', type=int, default=200, help='Sentetik şemadaki toplam tablo sayısı')
+    parser.add_argument('--modes', default=','.join(INDEX_TYPES), help='Virgülle ayrılmış indeks modları')
+    parser.add_argument('--top-k', type=int, default=RAG_CONFIG['top_k'])
+    parser.add_argument('--repeat', type=int, default=3, help='Gecikme ölçümü tekrar sayısı')
+    parser.add_argument('--model', default=None, help='SentenceTransformer modeli (varsayılan: hashing)')
+    parser.add_argument('--learned', default='data/learned_examples.json')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    result = run_benchmark(
+        n_tables=args.tables, modes=args.modes.split(','), top_k=args.top_k,
+        model_name=args.model, repeat=args.repeat, learned_path=args.learned, seed=args.seed
+    )
+    print_report(result, top_k=args.top_k)
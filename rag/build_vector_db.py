@@ -4,95 +4,344 @@ Schema bilgilerini vektör veritabanına yükle
 """
 
 import os
+import sys
 import json
-from sentence_transformers import SentenceTransformer
+import uuid
+import hashlib
+from datetime import datetime
 import numpy as np
-import pickle
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.db_config import RAG_CONFIG
+from rag.vector_index import get_index_class, index_options, normalize_rows
+from rag.cache import invalidate_all
+from rag.storage import open_store, store_exists, write_store
+from rag.lexical_index import BM25Index, schema_table_texts
+from rag.chunking import chunk_table_document
+from rag.join_graph import JoinGraph, build_join_graph
+from rag.encoding_pool import encode_parallel, resolve_workers, MIN_PARALLEL_DOCS
 
 class SchemaVectorDB:
-    def __init__(self, model_name='all-MiniLM-L6-v2'):
+    DEFAULT_MODEL = 'all-MiniLM-L6-v2'
+    
+    def __init__(self, model_name=DEFAULT_MODEL, index_mode=None, model=None, encode_workers=None):
         """
         Embedding modeli yükle
         all-MiniLM-L6-v2: Hızlı ve etkili, Türkçe için de iyi
+        index_mode: 'exact', 'ivf', 'int8' veya 'binary' (varsayılan RAG_CONFIG['index_mode'])
+        model: Önceden yüklenmiş model (yeniden yüklemeden paylaşmak için)
+        encode_workers: build encode süreç sayısı (varsayılan RAG_CONFIG['encode_workers'])
         """
-        print(f"Embedding modeli yükleniyor: {model_name}")
-        self.model = SentenceTransformer(model_name)
+        self.model_name = model_name
+        if model is None:
+            # Servis istemcisi / benchmark encoder'ı kullanan süreçler torch yüklemez
+            from sentence_transformers import SentenceTransformer
+            print(f"Embedding modeli yükleniyor: {model_name}")
+            model = SentenceTransformer(model_name)
+        self.model = model
         self.documents = []
         self.embeddings = None
         self.metadata = []
+        self.index_mode = index_mode or RAG_CONFIG['index_mode']
+        self.encode_workers = RAG_CONFIG['encode_workers'] if encode_workers is None else encode_workers
+        self.index = None
+        self.partitions = {}  # metadata type → [(başlangıç, bitiş), ...] satır aralıkları
+        self.version = None
+        self.build_stats = None
+        self.lexical = None  # BM25 indeksi (tablo adı / kolon araması)
+        self.join_graph = None  # Foreign key komşuluk indeksi (JOIN ipuçları)
     
     def add_documents(self, docs, metadata_list=None):
-        """Dökümanları ekle"""
-        self.documents.extend(docs)
-        if metadata_list:
-            self.metadata.extend(metadata_list)
+        """Dökümanları ekle (metadata'ya içerik hash'i eklenir)"""
+        if not metadata_list:
+            metadata_list = [{}] * len(docs)
+        for doc, meta in zip(docs, metadata_list):
+            self.documents.append(doc)
+            self.metadata.append(dict(meta, hash=self.document_hash(doc)))
+    
+    def document_hash(self, doc):
+        """İçerik + model hash'i (model değişirse tüm dökümanlar yeniden embed edilir)"""
+        return hashlib.sha1(f"{self.model_name}\0{doc}".encode('utf-8')).hexdigest()
+    
+    def build_index(self, previous=None):
+        """
+        Vektör indeksini oluştur
+        previous: {hash: embedding} - önceki indeksten aynen kullanılacak vektörler
+        Sadece yeni veya değişmiş dökümanlar encode edilir
+        """
+        previous = previous or {}
+        hashes = [meta['hash'] for meta in self.metadata]
+        missing = [i for i, h in enumerate(hashes) if h not in previous]
+        
+        print(f"{len(missing)} döküman için embedding oluşturuluyor...")
+        encoded = {}
+        if missing:
+            vectors = normalize_rows(self._encode_documents([self.documents[i] for i in missing]))
+            encoded = {hashes[i]: vec for i, vec in zip(missing, vectors)}
+        
+        vectors = [encoded[h] if h in encoded else previous[h] for h in hashes]
+        if vectors:
+            self.embeddings = np.vstack(vectors).astype(np.float32)
         else:
-            self.metadata.extend([{}] * len(docs))
+            dim = self.model.get_sentence_embedding_dimension()
+            self.embeddings = np.zeros((0, dim), dtype=np.float32)
+        
+        self.build_stats = {
+            'reused': len(hashes) - len(missing),
+            'embedded': len(missing),
+            'dropped': len(set(previous) - set(hashes))
+        }
+        
+        self._build_search_index()
+        self._build_partitions()
+        print(f"İndeks oluşturuldu ({self.index_mode})")
+    
+    def _encode_documents(self, docs):
+        """
+        Dökümanları encode et
+        encode_workers > 1 ise süreç havuzunda (her worker kendi modeliyle)
+        """
+        workers = resolve_workers(self.encode_workers)
+        if workers > 1 and len(docs) >= MIN_PARALLEL_DOCS:
+            print(f"{workers} worker süreciyle encode ediliyor...")
+            return encode_parallel(self.model_name, docs, workers)
+        return self.model.encode(docs, show_progress_bar=True)
+    
+    def _build_search_index(self):
+        """Normalize matris üzerinde seçili modda arama indeksini kur"""
+        index_class = get_index_class(self.index_mode)
+        self.index = index_class.build(self.embeddings, **index_options(RAG_CONFIG))
     
-    def build_index(self):
-        """Vektör indeksini oluştur"""
-        print(f"{len(self.documents)} döküman için embedding oluşturuluyor...")
-        self.embeddings = self.model.encode(self.documents, show_progress_bar=True)
-        print("İndeks oluşturuldu")
+    def _partition_ranges(self):
+        """
+        metadata type → ardışık satır aralıkları [(başlangıç, bitiş), ...]
+        Build sırasında hesaplanıp manifest'e yazılır; load metadata'yı okumaz
+        """
+        ranges = {}
+        start, kind = 0, None
+        for i, meta in enumerate(self.metadata):
+            current = meta.get('type')
+            if i and current != kind:
+                ranges.setdefault(kind, []).append((start, i))
+                start = i
+            kind = current
+        if self.metadata:
+            ranges.setdefault(kind, []).append((start, len(self.metadata)))
+        return ranges
+    
+    def _build_partitions(self):
+        """Bölümler global indeksin satır aralıklarıdır (ayrı alt indeks kurulmaz)"""
+        self.partitions = self._partition_ranges()
+    
+    def search(self, query, top_k=5, where=None, quotas=None):
+        """
+        Sorguya en benzer dökümanları bul
+        where: {'type': 'table'} → sadece o bölüm taranır
+        quotas: {'table': 4, 'pattern': 2} → her bölümden ayrı kota (top_k yok sayılır)
+        """
+        return self.search_many([query], top_k=top_k, where=where, quotas=quotas)[0]
+    
+    def search_many(self, queries, top_k=5, where=None, quotas=None):
+        """
+        Birden fazla sorguyu tek seferde ara
+        Tüm sorgular tek batch'te encode edilir, skorlar tek matris çarpımıyla hesaplanır
+        Returns: her sorgu için search() ile aynı formatta sonuç listesi
+        """
+        if not queries:
+            return []
+        return self.search_vectors(self.encode(queries), top_k=top_k, where=where, quotas=quotas)
     
-    def search(self, query, top_k=5):
-        """Sorguya en benzer dökümanları bul"""
-        query_embedding = self.model.encode([query])[0]
+    def encode(self, texts):
+        """Metinleri normalize float32 embedding matrisine çevir"""
+        return normalize_rows(self.model.encode(list(texts)))
+    
+    def search_vectors(self, query_embeddings, top_k=5, where=None, quotas=None):
+        """
+        Normalize sorgu embedding'leri ile ara
+        where / quotas verilirse global indeks sadece ilgili bölümlerin satır aralıklarında taranır
+        """
+        if where is not None:
+            if set(where) != {'type'}:
+                raise ValueError(f"Sadece 'type' ile filtrelenebilir: {sorted(where)}")
+            kinds = where['type'] if isinstance(where['type'], (list, tuple, set)) else [where['type']]
+            quotas = {kind: top_k for kind in kinds}
         
-        # Cosine similarity
-        similarities = np.dot(self.embeddings, query_embedding) / (
-            np.linalg.norm(self.embeddings, axis=1) * np.linalg.norm(query_embedding)
-        )
+        if quotas is None:
+            # Cosine similarity (matris önceden normalize edildi)
+            hits = self.index.search_many(query_embeddings, top_k)
+        else:
+            hits = self._search_partitions(query_embeddings, quotas)
         
-        # En yüksek skorlu indeksleri al
-        top_indices = np.argsort(similarities)[-top_k:][::-1]
+        all_results = []
+        for top_indices, scores in hits:
+            results = []
+            for idx, score in zip(top_indices, scores):
+                results.append({
+                    'id': int(idx),
+                    'document': self.documents[idx],
+                    'score': float(score),
+                    'metadata': self.metadata[idx]
+                })
+            all_results.append(results)
         
-        results = []
-        for idx in top_indices:
-            results.append({
-                'document': self.documents[idx],
-                'score': float(similarities[idx]),
-                'metadata': self.metadata[idx]
-            })
+        return all_results
+    
+    def _search_partitions(self, query_embeddings, quotas):
+        """
+        Her bölümde kotası kadar ara, satır id'lerine çevir, skora göre birleştir
+        Returns: index.search_many ile aynı formatta (indeksler, skorlar) listesi
+        """
+        merged = [([], []) for _ in range(len(query_embeddings))]
+        for kind, k in quotas.items():
+            if kind not in self.partitions or k <= 0:
+                continue
+            runs = [self.index.search_range(query_embeddings, k, start, end)
+                    for start, end in self.partitions[kind]]
+            for q, (ids, scores) in enumerate(merged):
+                kind_ids = np.concatenate([run[q][0] for run in runs])
+                kind_scores = np.concatenate([run[q][1] for run in runs])
+                # Bölüm birden fazla aralıksa kota tüm aralıklar üzerinden
+                order = np.lexsort((kind_ids, -kind_scores))[:k]
+                ids.append(kind_ids[order])
+                scores.append(kind_scores[order])
         
-        return results
+        hits = []
+        for ids, scores in merged:
+            if not ids:
+                hits.append((np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)))
+                continue
+            ids, scores = np.concatenate(ids), np.concatenate(scores)
+            order = np.lexsort((ids, -scores))
+            hits.append((ids[order], scores[order]))
+        return hits
     
-    def save(self, path='data/vector_db'):
-        """Veritabanını kaydet"""
+    def save(self, path='data/vector_db', dtype=None):
+        """
+        Veritabanını kaydet (pickle yok)
+        dtype: 'float32' veya 'float16' (varsayılan RAG_CONFIG['embedding_dtype'])
+        """
+        dtype = dtype or RAG_CONFIG['embedding_dtype']
         os.makedirs(path, exist_ok=True)
         
-        with open(os.path.join(path, 'documents.pkl'), 'wb') as f:
-            pickle.dump(self.documents, f)
+        # Yeni versiyon = yeni dosya adları = eski cache'ler geçersiz
+        self.version = uuid.uuid4().hex
         
-        with open(os.path.join(path, 'metadata.pkl'), 'wb') as f:
-            pickle.dump(self.metadata, f)
+        # İndeks dosyaları embedding dosyalarıyla aynı versiyonda
+        index_files = self.index.save(path, self.version)
+        if self.lexical is not None:
+            index_files += self.lexical.save(path, self.version)
+        if self.join_graph is not None:
+            index_files += self.join_graph.save(path, self.version)
         
-        np.save(os.path.join(path, 'embeddings.npy'), self.embeddings)
+        # Manifest en son, atomik yazılır
+        write_store(path, self.documents, self.metadata, self.embeddings, {
+            'version': self.version,
+            'created_at': datetime.now().isoformat(),
+            'model': self.model_name,
+            'index_mode': self.index_mode,
+            # type → satır aralıkları (load'da metadata çözülmeden bölüm araması)
+            'partitions': [[kind, start, end] for kind, runs in self.partitions.items() for start, end in runs]
+        }, dtype=dtype, extra_files=index_files)
         
-        print(f"Veritabanı kaydedildi: {path}")
+        print(f"Veritabanı kaydedildi: {path} ({dtype})")
     
     def load(self, path='data/vector_db'):
-        """Veritabanını yükle"""
-        with open(os.path.join(path, 'documents.pkl'), 'rb') as f:
-            self.documents = pickle.load(f)
-        
-        with open(os.path.join(path, 'metadata.pkl'), 'rb') as f:
-            self.metadata = pickle.load(f)
+        """
+        Veritabanını yükle
+        Matris mmap ile açılır, dökümanlar erişildikçe okunur
+        """
+        self.documents, self.metadata, self.embeddings, manifest = open_store(path)
+        self.version = manifest['version']
         
-        self.embeddings = np.load(os.path.join(path, 'embeddings.npy'))
+        # Dosya listesi olmayan eski manifest'lerde indeks dosyası versiyonsuz
+        file_version = self.version if 'files' in manifest else None
+        index_class = get_index_class(self.index_mode)
+        self.index = index_class.load(
+            path, self.embeddings, version=file_version, **index_options(RAG_CONFIG)
+        )
+        if 'partitions' in manifest:
+            self.partitions = {}
+            for kind, start, end in manifest['partitions']:
+                self.partitions.setdefault(kind, []).append((start, end))
+        else:
+            # Eski manifest: aralıklar metadata'dan (tüm kayıtlar okunur, yeniden build önerilir)
+            print("Manifest'te bölüm aralıkları yok, metadata'dan hesaplanıyor")
+            self.partitions = self._partition_ranges()
+        self.lexical = BM25Index.load(path, version=file_version)
+        self.join_graph = JoinGraph.load(path, version=file_version)
         
-        print(f"Veritabanı yüklendi: {len(self.documents)} döküman")
+        print(f"Veritabanı yüklendi: {len(self.documents)} döküman ({self.index_mode})")
+
+
+def load_previous_embeddings(path, model_name):
+    """
+    Kayıtlı indeksteki embedding'leri hash ile eşle
+    Returns: {hash: embedding} (indeks yoksa veya model farklıysa boş)
+    """
+    if not store_exists(path):
+        return {}
+    
+    _, metadata, matrix, manifest = open_store(path)
+    if manifest.get('model') != model_name:
+        return {}
+    
+    previous = {}
+    for i, meta in enumerate(metadata):
+        if meta.get('hash'):
+            previous[meta['hash']] = np.array(matrix[i], dtype=np.float32)
+    return previous
 
 
-def build_vector_db():
-    """Schema dosyalarından vektör DB oluştur"""
+def build_lexical_index(db, raw_schema_path='schema/raw_schema.json'):
+    """
+    Tablo dökümanları için BM25 indeksi
+    raw_schema.json varsa kolon adları + açıklamalardan, yoksa döküman metninden
+    """
+    # Tablo adı → parça satırları
+    rows = {}
+    for i, meta in enumerate(db.metadata):
+        if meta.get('type') == 'table':
+            rows.setdefault(meta['name'], []).append(i)
     
+    if os.path.exists(raw_schema_path):
+        texts = {name: text for name, text in schema_table_texts(raw_schema_path).items()
+                 if name in rows}
+    else:
+        texts = {name: '\n'.join(db.documents[row] for row in table_rows)
+                 for name, table_rows in rows.items()}
+    
+    return BM25Index.build(texts, rows)
+
+
+def add_table_document(db, table_name, content):
+    """Tablo dökümanını ekle (RAG_CONFIG['chunking'] açıksa bölümlere ayırarak)"""
+    if RAG_CONFIG['chunking']:
+        # Kolon / ilişki bölümleri ayrı embedding (geniş tablolar kesilmez)
+        chunks = chunk_table_document(
+            table_name, content,
+            RAG_CONFIG['chunk_size'], RAG_CONFIG['chunk_overlap']
+        )
+        db.add_documents([c[0] for c in chunks], [c[1] for c in chunks])
+    else:
+        db.add_documents(
+            [content],
+            [{'type': 'table', 'name': table_name}]
+        )
+
+
+def build_vector_db(full=False):
+    """
+    Schema dosyalarından vektör DB oluştur
+    Varsayılan olarak artımlı: sadece yeni/değişen dökümanlar encode edilir
+    full=True: her şeyi sıfırdan encode et
+    """
+    path = RAG_CONFIG['vector_db_path']
     db = SchemaVectorDB()
     
     # 1. Tablo dökümanlarını yükle
     tables_dir = 'schema/tables'
     if os.path.exists(tables_dir):
-        for filename in os.listdir(tables_dir):
+        for filename in sorted(os.listdir(tables_dir)):
             if filename.endswith('.txt'):
                 table_name = filename.replace('.txt', '')
                 filepath = os.path.join(tables_dir, filename)
@@ -100,10 +349,7 @@ def build_vector_db():
                 with open(filepath, 'r', encoding='utf-8') as f:
                     content = f.read()
                 
-                db.add_documents(
-                    [content],
-                    [{'type': 'table', 'name': table_name}]
-                )
+                add_table_document(db, table_name, content)
     
     # 2. Sorgu kalıplarını yükle
     patterns_file = 'schema/query_patterns.txt'
@@ -120,12 +366,28 @@ def build_vector_db():
                     [{'type': 'pattern'}]
                 )
     
-    # 3. İndeks oluştur ve kaydet
-    db.build_index()
-    db.save()
+    # 3. Tablo adı / kolon adı / açıklamalar için BM25 indeksi
+    db.lexical = build_lexical_index(db)
+    
+    # 4. Foreign key'lerden JOIN grafiği (raw_schema.json yoksa atlanır)
+    db.join_graph = build_join_graph()
+    
+    # 5. Önceki indeksteki değişmemiş embedding'leri al
+    previous = {} if full else load_previous_embeddings(path, db.model_name)
+    
+    # 6. İndeks oluştur ve kaydet
+    db.build_index(previous=previous)
+    db.save(path)
+    
+    stats = db.build_stats
+    print(f"Yeniden kullanılan: {stats['reused']} | Yeniden embed edilen: {stats['embedded']} | "
+          f"Atılan eski embedding: {stats['dropped']}")
+    
+    # Bu süreçteki soru/sonuç cache'leri eski indekse ait
+    invalidate_all()
     
     return db
 
 
 if __name__ == '__main__':
-    build_vector_db()
+    build_vector_db(full='--full' in sys.argv)
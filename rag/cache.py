@@ -0,0 +1,109 @@
+"""
+RAG Önbelleği
+Soru embedding'leri ve arama sonuçları için thread-safe LRU + TTL cache
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Türkçe büyük/küçük harf eşlemesi (str.lower() 'I' → 'i' yapar, Türkçede 'ı' olmalı)
+_TURKISH_LOWER = str.maketrans({'I': 'ı', 'İ': 'i'})
+
+# Oluşturulan tüm cache'ler (yeni indeks yazılınca hepsi temizlenir)
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def turkish_lower(text):
+    """Türkçe kurallarıyla küçük harfe çevir"""
+    return text.translate(_TURKISH_LOWER).lower()
+
+
+def normalize_question(question):
+    """
+    Cache anahtarı için soruyu normalize et
+    Küçük harf (Türkçe), noktalama temizliği, tek boşluk
+    """
+    text = turkish_lower(question or '')
+    text = re.sub(r'[^\w\s]', ' ', text)
+    return ' '.join(text.split())
+
+
+class LRUCache:
+    """Boyut ve süre sınırlı, thread-safe LRU cache"""
+
+    def __init__(self, maxsize=512, ttl=3600, name=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        with _registry_lock:
+            _registry.append(self)
+
+    def get(self, key):
+        """Değeri getir, yoksa veya süresi dolduysa None"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = item
+            if self.ttl and expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """Değeri kaydet, limit aşılırsa en eski kaydı at"""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + (self.ttl or 0))
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """Tüm kayıtları sil (sayaçlar korunur)"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Hit/miss istatistikleri"""
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits / total * 100) if total > 0 else 0
+        }
+
+
+def invalidate_all():
+    """Tüm RAG cache'lerini temizle (build_vector_db yeni indeks yazdığında)"""
+    with _registry_lock:
+        caches = list(_registry)
+    for cache in caches:
+        cache.clear()
+
+
+def get_cache_stats():
+    """İsimli tüm cache'lerin istatistikleri"""
+    with _registry_lock:
+        caches = list(_registry)
+    return {cache.name: cache.stats() for cache in caches if cache.name}
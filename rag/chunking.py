@@ -0,0 +1,144 @@
+"""
+Tablo Dökümanlarını Bölümlere Ayırma
+create_table_document çıktısını kolon / ilişki / örnek değer parçalarına böler
+
+Geniş tablolarda tek embedding MiniLM'in token sınırında kesilir ve son kolonlar
+hiç temsil edilmez. Her parça tablo başlığını da taşır; prompt'a sadece eşleşen
+bölümler eklenir.
+"""
+
+# create_table_document bölüm başlıkları → metadata 'section'
+SECTION_NAMES = {
+    'Kolonlar': 'columns',
+    'İlişkiler': 'relations',
+    'Örnek Değerler': 'samples',
+}
+SECTION_ORDER = ['summary', 'columns', 'relations', 'samples']
+
+
+def parse_table_document(doc):
+    """
+    Dökümanı başlık + bölümler olarak ayır
+    Returns: (header, [(section, title, [satırlar]), ...])
+    """
+    parts = doc.split('\n## ')
+    header = parts[0].strip()
+
+    sections = []
+    for part in parts[1:]:
+        lines = part.split('\n')
+        title = lines[0].strip()
+        body = [line for line in lines[1:] if line.strip()]
+        sections.append((SECTION_NAMES.get(title, title.lower()), title, body))
+    return header, sections
+
+
+def _group_lines(lines, chunk_size, chunk_overlap):
+    """
+    Satırları chunk_size karakteri aşmayan gruplara böl (satır ortasından kesmeden)
+    Bir önceki grubun son chunk_overlap karakterlik satırları tekrar edilir
+    """
+    groups = []
+    current = []
+    size = 0
+    for line in lines:
+        if current and size + len(line) + 1 > chunk_size:
+            groups.append(current)
+
+            overlap = []
+            overlap_size = 0
+            for prev in reversed(current):
+                if overlap_size + len(prev) + 1 > chunk_overlap:
+                    break
+                overlap.insert(0, prev)
+                overlap_size += len(prev) + 1
+            current = overlap
+            size = overlap_size
+
+        current.append(line)
+        size += len(line) + 1
+
+    if current:
+        groups.append(current)
+    return groups
+
+
+def chunk_table_document(table_name, doc, chunk_size=500, chunk_overlap=50):
+    """
+    Tablo dökümanını embedding parçalarına böl
+    Returns: [(metin, metadata), ...] - metin = başlık + bölüm parçası
+    metadata['header'] başlığın karakter uzunluğu (prompt'ta başlık tekrarlanmasın diye)
+    """
+    header, sections = parse_table_document(doc)
+    prefix = header + '\n\n'
+
+    chunks = []
+    for section, title, lines in sections:
+        if not lines:
+            continue
+        for part, group in enumerate(_group_lines(lines, chunk_size, chunk_overlap)):
+            text = prefix + f"## {title}\n" + '\n'.join(group)
+            chunks.append((text, {
+                'type': 'table',
+                'name': table_name,
+                'section': section,
+                'part': part,
+                'header': len(prefix)
+            }))
+
+    if not chunks:
+        chunks.append((header, {
+            'type': 'table',
+            'name': table_name,
+            'section': 'summary',
+            'part': 0,
+            'header': len(header)
+        }))
+    return chunks
+
+
+def assemble_table_context(chunks):
+    """
+    Aynı tabloya ait eşleşen parçalardan prompt metni oluştur
+    Başlık bir kez yazılır, bölümler döküman sırasıyla, tekrar eden satırlar atlanır
+    chunks: [{'document': ..., 'metadata': ...}, ...]
+    """
+    if not chunks:
+        return ''
+
+    def order(chunk):
+        meta = chunk['metadata']
+        section = meta.get('section', 'summary')
+        rank = SECTION_ORDER.index(section) if section in SECTION_ORDER else len(SECTION_ORDER)
+        return rank, meta.get('part', 0)
+
+    chunks = sorted(chunks, key=order)
+    first = chunks[0]
+    header_len = first['metadata'].get('header')
+    if header_len is None:
+        # Parçalanmamış (eski) döküman
+        return first['document']
+
+    lines = [first['document'][:header_len].rstrip()]
+    seen = set()
+    current_title = None
+    for chunk in chunks:
+        body = chunk['document'][chunk['metadata'].get('header', 0):]
+        body_lines = body.split('\n')
+        title = body_lines[0] if body_lines and body_lines[0].startswith('## ') else None
+        if title and title != current_title:
+            lines.append('\n' + title)
+            current_title = title
+        for line in body_lines[1:] if title else body_lines:
+            if line and line not in seen:
+                seen.add(line)
+                lines.append(line)
+
+    return '\n'.join(lines)
+
+
+def aggregate_scores(scores, method='max'):
+    """Parça skorlarını tablo skoruna indir: max veya sum"""
+    if method == 'sum':
+        return sum(scores)
+    return max(scores)
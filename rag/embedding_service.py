@@ -0,0 +1,308 @@
+"""
+Paylaşılan Embedding Servisi
+Tek süreçte SentenceTransformer; API worker'ları Unix socket üzerinden bağlanır
+
+N gunicorn worker'ının her biri modeli ayrı yüklemek yerine bu servise encode
+isteği gönderir; arama worker'da, mmap ile açılan indekste yapılır. Eşzamanlı
+istekler kısa bir pencerede (micro-batch) tek encode çağrısında birleştirilir.
+Servis indeksi yüklemez (sadece model + manifest). Servis yoksa query_rag süreç
+içi moda döner.
+
+Mesaj formatı: >II (json uzunluğu, binary uzunluğu) + JSON başlık + binary veri
+Embedding'ler binary kısımda float32 satırlar olarak gönderilir.
+"""
+
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.db_config import RAG_CONFIG
+from rag.storage import read_manifest
+
+_FRAME = struct.Struct('>II')
+
+
+def service_available(path):
+    """Unix socket destekleniyor ve socket dosyası var mı?"""
+    return bool(path) and hasattr(socket, 'AF_UNIX') and os.path.exists(path)
+
+
+def _recv_exact(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Embedding servisi bağlantıyı kapattı")
+        data.extend(chunk)
+    return bytes(data)
+
+
+def send_message(sock, header, payload=b''):
+    """JSON başlık + binary veri gönder"""
+    body = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    sock.sendall(_FRAME.pack(len(body), len(payload)) + body + payload)
+
+
+def recv_message(sock):
+    """Returns: (başlık, binary veri)"""
+    header_len, payload_len = _FRAME.unpack(_recv_exact(sock, _FRAME.size))
+    header = json.loads(_recv_exact(sock, header_len).decode('utf-8'))
+    payload = _recv_exact(sock, payload_len) if payload_len else b''
+    return header, payload
+
+
+def _matrix_payload(matrix):
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    return {'shape': list(matrix.shape)}, matrix.tobytes()
+
+
+def _payload_matrix(header, payload):
+    return np.frombuffer(payload, dtype=np.float32).reshape(header['shape'])
+
+
+class MicroBatcher:
+    """
+    Farklı bağlantılardan gelen encode isteklerini birleştir
+    İlk istekten sonra max_wait saniye (veya max_batch metin) kadar toplanır
+    """
+
+    def __init__(self, encode, max_batch=64, max_wait=0.005):
+        self.encode = encode
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+        self.batches = 0
+        self.texts = 0
+        self._thread = threading.Thread(target=self._run, name='embedding-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, texts):
+        """Metinleri kuyruğa ekle, batch encode edilene kadar bekle"""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        item = {'texts': list(texts), 'done': threading.Event(), 'result': None, 'error': None}
+        self.queue.put(item)
+        item['done'].wait()
+        if item['error'] is not None:
+            raise item['error']
+        return item['result']
+
+    def _collect(self):
+        batch = [self.queue.get()]
+        count = len(batch[0]['texts'])
+        deadline = time.monotonic() + self.max_wait
+        while count < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            count += len(item['texts'])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            texts = [text for item in batch for text in item['texts']]
+            try:
+                vectors = np.asarray(self.encode(texts), dtype=np.float32)
+                start = 0
+                for item in batch:
+                    end = start + len(item['texts'])
+                    item['result'] = vectors[start:end]
+                    start = end
+                self.batches += 1
+                self.texts += len(texts)
+            except Exception as e:
+                for item in batch:
+                    item['error'] = e
+            finally:
+                for item in batch:
+                    item['done'].set()
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    """Bağlantı başına bir thread; bağlantı kapanana kadar istekleri işler"""
+
+    def handle(self):
+        while True:
+            try:
+                header, payload = recv_message(self.request)
+            except (ConnectionError, OSError):
+                return
+            try:
+                response, data = self.server.dispatch(header, payload)
+            except Exception as e:
+                response, data = {'error': str(e)}, b''
+            send_message(self.request, response, data)
+
+
+class EmbeddingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """encode / info isteklerini tek modelle yanıtlayan sunucu (indeks yüklenmez)"""
+
+    daemon_threads = True
+    # Çok sayıda worker thread'i aynı anda bağlanabilir (varsayılan 5 yetmez)
+    request_queue_size = 128
+
+    def __init__(self, path, max_batch=64, max_wait=0.005, model_name=None, model=None):
+        """model: Önceden yüklenmiş model (verilmezse model_name yüklenir)"""
+        from rag.build_vector_db import SchemaVectorDB
+
+        # Worker'lar SchemaVectorDB'nin varsayılan modeliyle bağlanır (connect model kontrolü)
+        self.model_name = model_name or SchemaVectorDB.DEFAULT_MODEL
+        if model is None:
+            from sentence_transformers import SentenceTransformer
+            print(f"Embedding modeli yükleniyor: {self.model_name}")
+            model = SentenceTransformer(self.model_name)
+        self.model = model
+        self.batcher = MicroBatcher(self.model.encode, max_batch=max_batch, max_wait=max_wait)
+
+        if os.path.exists(path):
+            os.remove(path)  # önceki çalışmadan kalan socket
+        super().__init__(path, _Handler)
+
+    def dispatch(self, header, payload):
+        op = header.get('op')
+
+        if op == 'info':
+            # İndeks versiyonu manifest'ten (indeks yeniden yazıldıysa güncel olan)
+            manifest = read_manifest(RAG_CONFIG['vector_db_path']) or {}
+            return {
+                'model': self.model_name,
+                'dim': self.model.get_sentence_embedding_dimension(),
+                'version': manifest.get('version'),
+                'batches': self.batcher.batches,
+                'texts': self.batcher.texts,
+            }, b''
+
+        if op == 'encode':
+            return _matrix_payload(self.batcher.submit(header['texts']))
+
+        raise ValueError(f"Bilinmeyen işlem: {op}")
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.remove(self.server_address)
+        except OSError:
+            pass
+
+
+class EmbeddingClient:
+    """
+    Servise bağlanan, SentenceTransformer yerine geçen istemci
+    SchemaVectorDB(model=EmbeddingClient(...)) ile kullanılır; thread başına bir bağlantı
+    Servis kapanırsa modeli süreç içinde yükleyip devam eder
+    """
+
+    def __init__(self, path, timeout=30):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._fallback = None
+        self._fallback_lock = threading.Lock()
+        self.info = self.request({'op': 'info'})[0]
+        self.model_name = self.info['model']
+
+    def _socket(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            self._local.sock = sock
+        return sock
+
+    def request(self, header, payload=b''):
+        """Tek istek gönder, Returns: (başlık, binary veri)"""
+        try:
+            sock = self._socket()
+            send_message(sock, header, payload)
+            response, data = recv_message(sock)
+        except (ConnectionError, OSError):
+            sock = getattr(self._local, 'sock', None)
+            if sock is not None:
+                sock.close()
+            self._local.sock = None
+            raise
+        if 'error' in response:
+            raise RuntimeError(f"Embedding servisi hatası: {response['error']}")
+        return response, data
+
+    def _local_model(self):
+        with self._fallback_lock:
+            if self._fallback is None:
+                from sentence_transformers import SentenceTransformer
+                print(f"Embedding servisine ulaşılamadı, model süreç içinde yükleniyor: {self.model_name}")
+                self._fallback = SentenceTransformer(self.model_name)
+        return self._fallback
+
+    def encode(self, texts, **kwargs):
+        """SentenceTransformer.encode ile aynı çıktı (float32 matris)"""
+        texts = list(texts)
+        # Kopan bağlantı bir kez yeniden denenir, sonra süreç içi modele geçilir
+        for _ in range(2):
+            if self._fallback is not None:
+                break
+            try:
+                return _payload_matrix(*self.request({'op': 'encode', 'texts': texts}))
+            except (ConnectionError, OSError):
+                continue
+        return np.asarray(self._local_model().encode(texts, **kwargs), dtype=np.float32)
+
+    def get_sentence_embedding_dimension(self):
+        return self.info['dim']
+
+
+def connect(path=None, model_name=None):
+    """
+    Servis varsa istemci döndür (yoksa / farklı model çalışıyorsa None)
+    """
+    path = RAG_CONFIG['embedding_socket'] if path is None else path
+    if not service_available(path):
+        return None
+    try:
+        client = EmbeddingClient(path)
+    except (ConnectionError, OSError, RuntimeError):
+        return None
+    if model_name and client.model_name != model_name:
+        print(f"Embedding servisi farklı model çalıştırıyor ({client.model_name}), kullanılmıyor")
+        return None
+    return client
+
+
+def serve(path=None):
+    """Servisi başlat (Ctrl+C ile durur)"""
+    if not hasattr(socket, 'AF_UNIX'):
+        raise RuntimeError("Bu platform Unix socket desteklemiyor")
+    path = path or RAG_CONFIG['embedding_socket']
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    server = EmbeddingServer(
+        path,
+        max_batch=RAG_CONFIG['embedding_batch'],
+        max_wait=RAG_CONFIG['embedding_wait_ms'] / 1000
+    )
+    print(f"✓ Embedding servisi dinliyor: {path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    serve()
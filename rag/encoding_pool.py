@@ -0,0 +1,122 @@
+"""
+Çok Süreçli Embedding
+Build sırasında dökümanları CPU çekirdeklerine dağıtan encode havuzu
+
+Her worker kendi model kopyasını yükler. Dökümanlar uzunluğa göre sıralanıp
+ardışık parçalara bölünür (aynı batch'teki metinler benzer uzunlukta → az padding),
+sonuçlar orijinal sıraya geri yerleştirilir.
+"""
+
+import os
+import time
+import multiprocessing
+import numpy as np
+
+# Bundan az dökümanda havuz kurmak (N kez model yükleme) tek süreçten yavaş
+MIN_PARALLEL_DOCS = 64
+
+# Worker başına bir seferde gönderilen döküman sayısı = batch_size * SHARD_BATCHES
+SHARD_BATCHES = 4
+
+# Worker süreçindeki model (initializer'da yüklenir)
+_worker_model = None
+
+
+def resolve_workers(workers):
+    """0 = CPU çekirdek sayısı, negatif / None = 1"""
+    if workers == 0:
+        return os.cpu_count() or 1
+    return max(1, workers or 1)
+
+
+def _init_worker(model_name, threads):
+    """Worker başlangıcı: modeli yükle, torch thread'lerini çekirdek payıyla sınırla"""
+    global _worker_model
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    from sentence_transformers import SentenceTransformer
+    _worker_model = SentenceTransformer(model_name)
+
+
+def _encode_shard(args):
+    """Tek parçayı encode et, Returns: (parça id, embedding matrisi)"""
+    shard_id, texts, batch_size = args
+    vectors = _worker_model.encode(texts, batch_size=batch_size, show_progress_bar=False)
+    return shard_id, np.asarray(vectors, dtype=np.float32)
+
+
+def length_sorted_shards(texts, shard_size):
+    """
+    Döküman indekslerini uzunluğa göre sırala ve ardışık parçalara böl
+    Returns: [[indeks, ...], ...]
+    """
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    return [order[start:start + shard_size] for start in range(0, len(order), shard_size)]
+
+
+def encode_parallel(model_name, texts, workers, batch_size=32):
+    """
+    Metinleri worker süreçleri havuzunda encode et
+    Returns: float32 embedding matrisi (texts sırasında, normalize edilmemiş)
+    """
+    workers = resolve_workers(workers)
+    shards = length_sorted_shards(texts, batch_size * SHARD_BATCHES)
+    threads = max(1, (os.cpu_count() or 1) // workers)
+
+    # spawn: torch'un thread havuzu fork sonrası kilitlenebilir (Windows'ta zaten varsayılan)
+    context = multiprocessing.get_context('spawn')
+    results = [None] * len(shards)
+    with context.Pool(workers, initializer=_init_worker, initargs=(model_name, threads)) as pool:
+        jobs = [(shard_id, [texts[i] for i in shard], batch_size) for shard_id, shard in enumerate(shards)]
+        for shard_id, vectors in pool.imap_unordered(_encode_shard, jobs):
+            results[shard_id] = vectors
+
+    dim = results[0].shape[1]
+    embeddings = np.empty((len(texts), dim), dtype=np.float32)
+    for shard, vectors in zip(shards, results):
+        embeddings[shard] = vectors
+    return embeddings
+
+
+def compare_with_single_process(model, model_name, texts, workers, atol=1e-5):
+    """
+    Paralel sonucun tek süreçli encode ile aynı olduğunu kontrol et
+    Returns: {'max_abs_diff': ..., 'match': ..., 'single_s': ..., 'parallel_s': ...}
+    """
+    start = time.perf_counter()
+    single = np.asarray(model.encode(texts, show_progress_bar=False), dtype=np.float32)
+    single_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parallel = encode_parallel(model_name, texts, workers)
+    parallel_s = time.perf_counter() - start
+
+    diff = float(np.abs(single - parallel).max()) if len(texts) else 0.0
+    return {
+        'max_abs_diff': diff,
+        'match': diff <= atol,
+        'single_s': single_s,
+        'parallel_s': parallel_s,
+    }
+
+
+if __name__ == '__main__':
+    # Kayıtlı vektör DB dökümanlarında tek süreç / paralel karşılaştırması
+    import sys
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    from config.db_config import RAG_CONFIG
+    from rag.build_vector_db import SchemaVectorDB
+
+    db = SchemaVectorDB()
+    db.load(RAG_CONFIG['vector_db_path'])
+    workers = resolve_workers(RAG_CONFIG['encode_workers'])
+
+    report = compare_with_single_process(db.model, db.model_name, list(db.documents), workers)
+    print(f"Döküman: {len(db.documents)} | Worker: {workers}")
+    print(f"Tek süreç: {report['single_s']:.2f} sn | Paralel: {report['parallel_s']:.2f} sn")
+    print(f"Maks. fark: {report['max_abs_diff']:.2e} ({'eşleşiyor' if report['match'] else 'FARKLI'})")
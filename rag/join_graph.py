@@ -0,0 +1,151 @@
+"""
+Foreign Key JOIN Grafiği
+extract_schema.get_foreign_keys çıktısından kompakt komşuluk indeksi
+
+RAG çoğu zaman JOIN'in sadece bir tarafını bulur (ör. TOHOM_SIPARIS ama
+TOHOM_PARTI_YAMASI değil). Bulunan tablolar arasındaki en kısa JOIN yolları
+sınırlı BFS ile çıkarılır ve prompt'a kısa JOIN ipuçları olarak eklenir.
+"""
+
+import json
+import os
+
+
+class JoinGraph:
+    """Tablolar int id, kenarlar (tablo, kolon, tablo, kolon) listesi"""
+
+    FILENAME = 'join_graph'
+
+    def __init__(self, names, edges):
+        self.names = names
+        self.ids = {name: i for i, name in enumerate(names)}
+        self.edges = edges  # [a_id, a_col, b_id, b_col]
+
+        # Yönsüz komşuluk: tablo id → [(komşu id, kenar id), ...]
+        self.adjacency = [[] for _ in names]
+        for edge_id, (a, _, b, _) in enumerate(edges):
+            self.adjacency[a].append((b, edge_id))
+            if a != b:
+                self.adjacency[b].append((a, edge_id))
+
+    @classmethod
+    def build(cls, tables):
+        """
+        tables: raw_schema.json['tables'] ({tablo: {'foreign_keys': [...]}})
+        """
+        names = sorted(
+            set(tables) | {
+                fk['references_table']
+                for info in tables.values() for fk in info.get('foreign_keys', [])
+            }
+        )
+        ids = {name: i for i, name in enumerate(names)}
+
+        edges = []
+        seen = set()
+        for table, info in tables.items():
+            for fk in info.get('foreign_keys', []):
+                edge = (ids[table], fk['column'], ids[fk['references_table']], fk['references_column'])
+                if edge not in seen:
+                    seen.add(edge)
+                    edges.append(list(edge))
+        return cls(names, edges)
+
+    def _bfs(self, start, max_depth):
+        """start'tan max_depth kenara kadar BFS, Returns: {tablo id: (önceki id, kenar id)}"""
+        parents = {start: None}
+        frontier = [start]
+        for _ in range(max_depth):
+            next_frontier = []
+            for node in frontier:
+                for neighbor, edge_id in self.adjacency[node]:
+                    if neighbor not in parents:
+                        parents[neighbor] = (node, edge_id)
+                        next_frontier.append(neighbor)
+            if not next_frontier:
+                break
+            frontier = next_frontier
+        return parents
+
+    @staticmethod
+    def _path(parents, goal):
+        """BFS ebeveynlerinden kenar id listesi (ulaşılamıyorsa None)"""
+        if goal not in parents:
+            return None
+        path = []
+        while parents[goal] is not None:
+            goal, edge_id = parents[goal]
+            path.append(edge_id)
+        return path[::-1]
+
+    def shortest_path(self, source, target, max_depth=3):
+        """
+        İki tablo arasındaki en kısa JOIN yolu (kenar id listesi)
+        max_depth kenardan uzun yollar aranmaz; yol yoksa None
+        """
+        start, goal = self.ids.get(source), self.ids.get(target)
+        if start is None or goal is None:
+            return None
+        return self._path(self._bfs(start, max_depth), goal)
+
+    def expand(self, tables, max_depth=3):
+        """
+        Bulunan tabloları aralarındaki JOIN yollarıyla genişlet
+        Her kaynak tablo için tek BFS; tüm hedeflerin yolları aynı ağaçtan çıkar
+        Returns: (ara tablolar, JOIN ipucu satırları)
+        """
+        known = [self.ids[name] for name in tables if name in self.ids]
+        edge_ids = []
+        for i, start in enumerate(known[:-1]):
+            parents = self._bfs(start, max_depth)
+            for goal in known[i + 1:]:
+                for edge_id in self._path(parents, goal) or []:
+                    if edge_id not in edge_ids:
+                        edge_ids.append(edge_id)
+
+        hints = []
+        extra_tables = []
+        for edge_id in edge_ids:
+            a, a_col, b, b_col = self.edges[edge_id]
+            hints.append(f"{self.names[a]}.{a_col} = {self.names[b]}.{b_col}")
+            for table_id in (a, b):
+                name = self.names[table_id]
+                if name not in tables and name not in extra_tables:
+                    extra_tables.append(name)
+        return extra_tables, hints
+
+    def save(self, path, version=None):
+        """JSON olarak kaydet, Returns: yazılan dosya adları"""
+        filename = f'{self.FILENAME}-{version}.json' if version else f'{self.FILENAME}.json'
+        with open(os.path.join(path, filename), 'w', encoding='utf-8') as f:
+            json.dump({'names': self.names, 'edges': self.edges}, f, ensure_ascii=False)
+        return [filename]
+
+    @classmethod
+    def load(cls, path, version=None):
+        """Kayıtlı grafiği yükle (yoksa None)"""
+        filename = f'{cls.FILENAME}-{version}.json' if version else f'{cls.FILENAME}.json'
+        filepath = os.path.join(path, filename)
+        if not os.path.exists(filepath):
+            return None
+        with open(filepath, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['names'], data['edges'])
+
+
+def build_join_graph(raw_schema_path='schema/raw_schema.json'):
+    """raw_schema.json'daki foreign key'lerden grafiği oluştur (dosya yoksa None)"""
+    if not os.path.exists(raw_schema_path):
+        return None
+    with open(raw_schema_path, 'r', encoding='utf-8') as f:
+        schema = json.load(f)
+    return JoinGraph.build(schema['tables'])
+
+
+def format_join_hints(hints):
+    """JOIN ipuçlarını prompt formatına çevir"""
+    if not hints:
+        return ""
+    lines = ["## JOIN İPUÇLARI (foreign key)"]
+    lines.extend(f"- {hint}" for hint in hints)
+    return '\n'.join(lines)
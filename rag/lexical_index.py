@@ -0,0 +1,181 @@
+"""
+Sözcüksel (BM25) İndeks
+Tablo adı, kolon adı ve açıklamalar üzerinde ters indeks
+
+TOHOM_SIPARIS_SATIRI, PARTI_YAMASI_ID gibi birebir tanımlayıcılar embedding'de
+iyi temsil edilmez; BM25 ile dense skorlar reciprocal rank fusion ile birleştirilir.
+"""
+
+import json
+import math
+import os
+import re
+from collections import Counter, defaultdict
+
+from rag.cache import turkish_lower
+
+# Türkçe karakterleri şema tanımlayıcılarındaki ASCII karşılıklarına indir
+_ASCII_FOLD = str.maketrans('çğıöşü', 'cgiosu')
+
+_TOKEN_RE = re.compile(r'[a-z0-9_]+')
+
+# Tablo adlarındaki ortak önek (SIPARIS_SATIRI → TOHOM_SIPARIS_SATIRI)
+TABLE_PREFIX = 'tohom_'
+
+# Sözcük köklerini bulmak için en kısa önek (siparişleri → siparis)
+MIN_PREFIX = 4
+
+
+def fold(text):
+    """Türkçe küçük harf + ASCII katlama"""
+    return turkish_lower(text).translate(_ASCII_FOLD)
+
+
+def tokenize(text):
+    """
+    Metni terimlere ayır
+    Alt çizgili tanımlayıcılar hem bütün hem parça olarak eklenir
+    """
+    tokens = []
+    for word in _TOKEN_RE.findall(fold(text)):
+        tokens.append(word)
+        if '_' in word:
+            tokens.extend(part for part in word.split('_') if len(part) > 1)
+    return tokens
+
+
+class BM25Index:
+    """Tablo bazında BM25 ters indeksi"""
+
+    FILENAME = 'lexical'
+
+    def __init__(self, names, rows, doc_lengths, postings, k1=1.5, b=0.75):
+        self.names = names              # doc_id → tablo adı
+        self.rows = rows                # tablo adı → vektör DB satırları (parçalar)
+        self.doc_lengths = doc_lengths
+        self.postings = postings        # terim → [[doc_id, tf], ...]
+        self.k1 = k1
+        self.b = b
+        self.avgdl = (sum(doc_lengths) / len(doc_lengths)) if doc_lengths else 0.0
+
+        # Birebir tablo adı araması: dict probe
+        self.table_lookup = {}
+        for name in names:
+            key = name.lower()
+            self.table_lookup[key] = name
+            if key.startswith(TABLE_PREFIX):
+                self.table_lookup.setdefault(key[len(TABLE_PREFIX):], name)
+
+    @classmethod
+    def build(cls, table_texts, rows, **kwargs):
+        """
+        table_texts: {tablo adı: indekslenecek metin}
+        rows: {tablo adı: [vektör DB satırları]}
+        """
+        names = sorted(table_texts)
+        doc_lengths = []
+        postings = defaultdict(list)
+
+        for doc_id, name in enumerate(names):
+            counts = Counter(tokenize(table_texts[name]))
+            doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings[term].append([doc_id, tf])
+
+        return cls(names, rows, doc_lengths, dict(postings), **kwargs)
+
+    def _resolve_term(self, term):
+        """Terim yoksa indekste bulunan en uzun öneki kullan (ek temizliği)"""
+        if term in self.postings:
+            return term
+        for length in range(len(term) - 1, MIN_PREFIX - 1, -1):
+            if term[:length] in self.postings:
+                return term[:length]
+        return None
+
+    def search(self, query_tokens, top_k=10):
+        """
+        BM25 skoruyla en iyi tabloları döndür
+        Sadece sorgu terimlerini içeren dökümanlar skorlanır (tam tarama yok)
+        Returns: [(tablo adı, skor), ...]
+        """
+        n = len(self.names)
+        scores = defaultdict(float)
+
+        for term in set(filter(None, (self._resolve_term(t) for t in query_tokens))):
+            postings = self.postings[term]
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / (self.avgdl or 1))
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda x: (-x[1], x[0]))[:top_k]
+        return [(self.names[doc_id], score) for doc_id, score in ranked]
+
+    def exact_tables(self, question):
+        """Soruda birebir geçen tablo adları (her terim için tek dict probe)"""
+        found = []
+        for word in _TOKEN_RE.findall(fold(question)):
+            name = self.table_lookup.get(word)
+            if name and name not in found:
+                found.append(name)
+        return found
+
+    def save(self, path, version=None):
+        """JSON olarak kaydet, Returns: yazılan dosya adları"""
+        filename = f'{self.FILENAME}-{version}.json' if version else f'{self.FILENAME}.json'
+        with open(os.path.join(path, filename), 'w', encoding='utf-8') as f:
+            json.dump({
+                'names': self.names,
+                'rows': self.rows,
+                'doc_lengths': self.doc_lengths,
+                'postings': self.postings,
+                'k1': self.k1,
+                'b': self.b
+            }, f, ensure_ascii=False)
+        return [filename]
+
+    @classmethod
+    def load(cls, path, version=None):
+        """Kayıtlı indeksi yükle (yoksa None)"""
+        filename = f'{cls.FILENAME}-{version}.json' if version else f'{cls.FILENAME}.json'
+        filepath = os.path.join(path, filename)
+        if not os.path.exists(filepath):
+            return None
+        with open(filepath, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['names'], data['rows'], data['doc_lengths'], data['postings'],
+                   k1=data['k1'], b=data['b'])
+
+
+def schema_table_texts(raw_schema_path='schema/raw_schema.json'):
+    """
+    raw_schema.json'dan tablo başına indekslenecek metin:
+    tablo adı + açıklama + kolon adları + kolon açıklamaları
+    """
+    from schema.clean_schema import TABLE_DESCRIPTIONS, COLUMN_DESCRIPTIONS
+
+    with open(raw_schema_path, 'r', encoding='utf-8') as f:
+        schema = json.load(f)
+
+    texts = {}
+    for table_name, table_info in schema['tables'].items():
+        parts = [table_name, TABLE_DESCRIPTIONS.get(table_name, '')]
+        for col in table_info['columns']:
+            parts.append(col['name'])
+            parts.append(COLUMN_DESCRIPTIONS.get(col['name'], ''))
+        texts[table_name] = ' '.join(parts)
+    return texts
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Sıralı listeleri birleştir: skor(d) = Σ 1 / (k + sıra)
+    rankings: [[anahtar, ...], ...]
+    Returns: [(anahtar, skor), ...] yüksekten düşüğe
+    """
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda x: -x[1])
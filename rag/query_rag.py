@@ -4,33 +4,315 @@ RAG Query - Kullanıcı sorusuna göre ilgili schema bilgilerini bul
 
 import os
 import sys
+import threading
+import time
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import numpy as np
+
 from rag.build_vector_db import SchemaVectorDB
+from rag.cache import LRUCache, normalize_question
+from rag.lexical_index import tokenize, reciprocal_rank_fusion
+from rag.chunking import assemble_table_context, aggregate_scores
+from rag.join_graph import format_join_hints
+from rag import embedding_service
+from rag.storage import MANIFEST_FILE
 from config.db_config import RAG_CONFIG
 
+# Dense aramada top_k başına aday sayısı (parçalar tabloya toplanınca azalır)
+CANDIDATE_FANOUT = 4
+
 # Global instance
 _vector_db = None
+_index_stamp = None
+_load_lock = threading.Lock()
+
+# Arka plan ısınma durumu (idle → loading → ready / error)
+_warmup_thread = None
+_warmup_status = {'state': 'idle', 'error': None, 'seconds': None}
+
+# Soru embedding'leri (normalize soru → vektör) ve arama sonuçları
+_embedding_cache = LRUCache(RAG_CONFIG['cache_size'], RAG_CONFIG['cache_ttl'], name='embeddings')
+_result_cache = LRUCache(RAG_CONFIG['cache_size'], RAG_CONFIG['cache_ttl'], name='results')
 
-def get_vector_db():
-    """Vektör DB singleton"""
-    global _vector_db
-    if _vector_db is None:
-        _vector_db = SchemaVectorDB()
-        _vector_db.load(RAG_CONFIG['vector_db_path'])
+def _read_index_stamp():
+    """Manifest değişim zamanı (başka süreç yeni indeks yazdı mı?)"""
+    try:
+        return os.path.getmtime(os.path.join(RAG_CONFIG['vector_db_path'], MANIFEST_FILE))
+    except OSError:
+        return None
+
+def get_vector_db(use_service=True):
+    """
+    Vektör DB singleton
+    Yükleme tek seferlik: eşzamanlı ilk istekler aynı yüklemeyi bekler
+    use_service: Embedding servisi çalışıyorsa model yerine servis istemcisi kullanılır
+    (indeks dosyaları yine mmap ile bu süreçte açılır)
+    """
+    global _vector_db, _index_stamp
+    if _vector_db is not None and _read_index_stamp() == _index_stamp:
+        return _vector_db
+    
+    with _load_lock:
+        stamp = _read_index_stamp()
+        if _vector_db is None:
+            client = embedding_service.connect(model_name=SchemaVectorDB.DEFAULT_MODEL) if use_service else None
+            if client is not None:
+                print(f"Embedding servisi kullanılıyor: {client.path}")
+            db = SchemaVectorDB(model=client)
+            db.load(RAG_CONFIG['vector_db_path'])
+            _index_stamp = stamp
+            _vector_db = db
+        elif stamp != _index_stamp:
+            # İndeks yeniden yazılmış: modeli koru, veriyi yeniden yükle
+            db = SchemaVectorDB(model=_vector_db.model)
+            db.load(RAG_CONFIG['vector_db_path'])
+            _index_stamp = stamp
+            _vector_db = db
     return _vector_db
 
+def _warmup():
+    """Model + indeksi yükle, kernel'leri ısıtmak için örnek bir encode çalıştır"""
+    start = time.perf_counter()
+    _warmup_status['state'] = 'loading'
+    try:
+        db = get_vector_db()
+        db.encode(['bugün kaç sipariş girildi'])
+        _warmup_status['state'] = 'ready'
+        print(f"✓ RAG hazır ({time.perf_counter() - start:.1f} sn)")
+    except Exception as e:
+        _warmup_status['state'] = 'error'
+        _warmup_status['error'] = str(e)
+        print(f"✗ RAG ısınma hatası: {e}")
+    finally:
+        _warmup_status['seconds'] = round(time.perf_counter() - start, 2)
+
+def start_warmup():
+    """Arka planda ısınmayı başlat (süreç başına bir kez)"""
+    global _warmup_thread
+    with _load_lock:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(target=_warmup, name='rag-warmup', daemon=True)
+            _warmup_thread.start()
+    return _warmup_thread
+
+def is_ready():
+    """Model ve indeks yüklendi mi? (ısınma yoksa ilk istekte yüklenmiş olabilir)"""
+    state = _warmup_status['state']
+    return state == 'ready' or (state == 'idle' and _vector_db is not None)
+
+def get_warmup_status():
+    """Isınma durumu (health endpoint için)"""
+    return dict(_warmup_status, ready=is_ready())
+
+def embed_questions(db, questions):
+    """
+    Soruları embedding'e çevir (cache'li)
+    Cache'te olmayanlar tek batch'te encode edilir
+    """
+    keys = [normalize_question(q) for q in questions]
+    vectors = [_embedding_cache.get((db.model_name, key)) for key in keys]
+    
+    missing = sorted({key for key, vec in zip(keys, vectors) if vec is None})
+    if missing:
+        encoded = dict(zip(missing, db.encode(missing)))
+        for key, vec in encoded.items():
+            _embedding_cache.set((db.model_name, key), vec)
+        vectors = [encoded[key] if vec is None else vec for key, vec in zip(keys, vectors)]
+    
+    return np.vstack(vectors)
+
 def get_relevant_context(question, top_k=None):
     """
     Kullanıcı sorusuna göre ilgili tablo ve kalıp bilgilerini getir
     """
+    return get_relevant_context_many([question], top_k=top_k)[0]
+
+def get_relevant_context_many(questions, top_k=None):
+    """
+    Birden fazla soru için context getir (tek batch encode + tek matris çarpımı)
+    Her soru için get_relevant_context ile aynı formatta sonuç döner
+    """
     if top_k is None:
         top_k = RAG_CONFIG['top_k']
+    if not questions:
+        return []
     
     db = get_vector_db()
-    results = db.search(question, top_k=top_k)
+    keys = [(db.version, normalize_question(q), top_k) for q in questions]
+    contexts = [_result_cache.get(key) for key in keys]
+    
+    join_graph = db.join_graph if RAG_CONFIG['join_expansion'] else None
+    pending = [i for i, ctx in enumerate(contexts) if ctx is None]
+    if pending:
+        all_results = retrieve(db, [questions[i] for i in pending], top_k)
+        for i, results in zip(pending, all_results):
+            contexts[i] = build_context(results, join_graph)
+            _result_cache.set(keys[i], contexts[i])
+    
+    return contexts
+
+def retrieve(db, questions, top_k):
+    """
+    Dense arama + BM25 (RAG_CONFIG['hybrid']) sonuçlarını birleştir
+    Parça (chunk) sonuçları tabloya toplanır; her tablo tek sonuç olarak döner
+    Soruda birebir geçen tablo adları dict probe ile bulunur; slotların hepsini
+    dolduruyorsa tablo bölümü hiç taranmaz
+    RAG_CONFIG['pattern_top_k'] > 0 ise tablolar (top_k) ve kalıplar ayrı bölümlerden,
+    ayrı kotalarla aranır (kalıplar tablo slotlarını doldurmaz)
+    """
+    pattern_k = RAG_CONFIG['pattern_top_k']
+    lexical = db.lexical if RAG_CONFIG['hybrid'] else None
+    exact = [lexical.exact_tables(q) if lexical else [] for q in questions]
+    tables_needed = [len(names) < top_k for names in exact]
+    dense_needed = [i for i, needed in enumerate(tables_needed) if needed or pattern_k > 0]
     
+    dense_results = {}
+    query_vectors = {}
+    if dense_needed:
+        embeddings = embed_questions(db, [questions[i] for i in dense_needed])
+        # Tablo başına birden fazla parça + füzyon için geniş aday havuzu
+        if pattern_k <= 0:
+            all_results = db.search_vectors(embeddings, top_k=top_k * CANDIDATE_FANOUT)
+        else:
+            all_results = [None] * len(dense_needed)
+            for with_tables in (True, False):
+                group = [j for j, i in enumerate(dense_needed) if tables_needed[i] == with_tables]
+                if not group:
+                    continue
+                quotas = {'pattern': pattern_k}
+                if with_tables:
+                    quotas['table'] = top_k * CANDIDATE_FANOUT
+                for j, results in zip(group, db.search_vectors(embeddings[group], quotas=quotas)):
+                    all_results[j] = results
+        for i, vec, results in zip(dense_needed, embeddings, all_results):
+            dense_results[i] = results
+            query_vectors[i] = vec
+    
+    fused = []
+    for i, question in enumerate(questions):
+        lexical_hits = []
+        if lexical is not None:
+            tokens = tokenize(' '.join(extract_keywords(question)))
+            lexical_hits = lexical.search(tokens, top_k=top_k * 2)
+        fused.append(fuse_results(
+            db, exact[i], dense_results.get(i, []), lexical_hits, query_vectors.get(i), top_k,
+            pattern_k=pattern_k
+        ))
+    return fused
+
+def group_by_table(dense_results):
+    """
+    Dense parça sonuçlarını tabloya grupla (kalıplar tek başına kalır)
+    Tablo skoru = parça skorlarının max / sum'ı (RAG_CONFIG['chunk_aggregation'])
+    Returns: (gruplar, skorlar, skora göre sıralı anahtarlar)
+    """
+    groups = {}
+    for result in dense_results:
+        meta = result['metadata']
+        if meta.get('type') == 'table':
+            key = ('table', meta.get('name'))
+        else:
+            key = ('row', result['id'])
+        groups.setdefault(key, []).append(result)
+    
+    method = RAG_CONFIG['chunk_aggregation']
+    scores = {
+        key: aggregate_scores([r['score'] for r in hits], method)
+        for key, hits in groups.items()
+    }
+    ranking = sorted(groups, key=lambda key: -scores[key])
+    return groups, scores, ranking
+
+def _table_chunks(db, table_name, query_vector):
+    """Sadece sözcüksel bulunan tablo: her bölümün ilk parçası"""
+    rows = db.lexical.rows.get(table_name, [])
+    if not isinstance(rows, list):
+        rows = [rows]
+    
+    chunks = []
+    for row in rows:
+        meta = db.metadata[row]
+        if meta.get('part', 0) != 0:
+            continue
+        score = 0.0
+        if query_vector is not None:
+            score = float(np.asarray(db.embeddings[row], dtype=np.float32) @ query_vector)
+        chunks.append({'id': row, 'document': db.documents[row], 'score': score, 'metadata': meta})
+    return chunks
+
+def fuse_results(db, exact_names, dense_results, lexical_hits, query_vector, top_k, pattern_k=0):
+    """
+    Reciprocal rank fusion: birebir tablo adları önce, sonra dense + BM25 sıralaması
+    Her sonuçta 'match': exact | hybrid | lexical | dense
+    Tablo sonuçlarının dökümanı sadece eşleşen bölümleri içerir
+    pattern_k > 0: tablolar top_k, kalıplar pattern_k ayrı kotayla sayılır
+    """
+    groups, scores, dense_ranking = group_by_table(dense_results)
+    exact_keys = [('table', name) for name in exact_names]
+    lexical_keys = [('table', name) for name, _ in lexical_hits]
+    
+    fused = reciprocal_rank_fusion([dense_ranking, lexical_keys])
+    rrf_scores = dict(fused)
+    order = exact_keys + [key for key, _ in fused if key not in exact_keys]
+    
+    limits = {'table': top_k, 'row': pattern_k} if pattern_k > 0 else None
+    counts = {'table': 0, 'row': 0}
+    
+    results = []
+    for key in order:
+        if limits is None and len(results) >= top_k:
+            break
+        if limits is not None:
+            if all(counts[kind] >= limit for kind, limit in limits.items()):
+                break
+            if counts[key[0]] >= limits[key[0]]:
+                continue
+        
+        hits = groups.get(key)
+        if hits is not None:
+            score = scores[key]
+        else:
+            hits = _table_chunks(db, key[1], query_vector)
+            if not hits:
+                continue
+            score = 1.0 if key in exact_keys else max(h['score'] for h in hits)
+        
+        if key in exact_keys:
+            match = 'exact'
+        elif key in groups:
+            match = 'hybrid' if key in lexical_keys else 'dense'
+        else:
+            match = 'lexical'
+        
+        if key[0] == 'table':
+            result = {
+                'id': hits[0]['id'],
+                'document': assemble_table_context(hits),
+                'score': score,
+                'metadata': {'type': 'table', 'name': key[1]},
+                'chunks': [
+                    dict(section=h['metadata'].get('section'), part=h['metadata'].get('part'),
+                         score=h['score'])
+                    for h in hits
+                ]
+            }
+        else:
+            result = dict(hits[0])
+        
+        counts[key[0]] += 1
+        results.append(dict(result, rrf_score=rrf_scores.get(key, 0.0), match=match))
+    
+    return results
+
+def build_context(results, join_graph=None):
+    """
+    Arama sonuçlarından prompt context'i oluştur
+    join_graph: Bulunan tablolar arasındaki en kısa FK yolları JOIN ipucu olarak eklenir
+    (ara tablolar tam döküman olarak değil, sadece ipucu satırlarında yer alır)
+    """
     context_parts = []
+    documents = []
     tables_found = set()
     
     for result in results:
@@ -39,27 +321,39 @@ def get_relevant_context(question, top_k=None):
         meta = result['metadata']
         
         # Sadece yeterince ilgili olanları al (score > 0.3)
-        if score > 0.3:
+        # Sözcüksel eşleşmeler (tablo/kolon adı) dense skordan bağımsız alınır
+        if score > 0.3 or result.get('match', 'dense') != 'dense':
             if meta.get('type') == 'table':
                 tables_found.add(meta.get('name'))
             context_parts.append(doc)
+            documents.append({'text': doc, 'score': score, 'type': meta.get('type'), 'name': meta.get('name')})
+    
+    join_tables, join_hints = [], []
+    if join_graph is not None and len(tables_found) > 1:
+        join_tables, join_hints = join_graph.expand(
+            sorted(tables_found), max_depth=RAG_CONFIG['join_max_depth']
+        )
+        if join_hints:
+            context_parts.append(format_join_hints(join_hints))
     
     context = '\n\n---\n\n'.join(context_parts)
     
     return {
         'context': context,
-        'tables': list(tables_found),
+        'tables': list(tables_found) + join_tables,
+        'join_hints': join_hints,
+        'documents': documents,  # context'e giren dökümanlar (prompt bütçesi için, sıra = öncelik)
         'results': results
     }
 
 def extract_keywords(question):
-    """Sorudan anahtar kelimeleri çıkar"""
+    """Sorudan anahtar kelimeleri çıkar (BM25 sorgusu için)"""
     # Türkçe stop words
     stop_words = {'bir', 'bu', 'şu', 'o', 'de', 'da', 've', 'ile', 'için', 
                   'mi', 'mı', 'mu', 'mü', 'ne', 'kaç', 'nasıl', 'neden',
                   'hangi', 'kim', 'nerede', 'gibi', 'daha', 'en'}
     
-    words = question.lower().split()
+    words = normalize_question(question).split()
     keywords = [w for w in words if w not in stop_words and len(w) > 2]
     
     return keywords
@@ -0,0 +1,188 @@
+"""
+Vektör DB Disk Formatı
+Pickle kullanmayan, memory-mapped okunan versiyonlu format
+
+Dosyalar (<v> = indeks versiyonu):
+- manifest.json            → format versiyonu, indeks versiyonu, dtype, dosya listesi
+- embeddings-<v>.npy       → normalize embedding matrisi (float32 / float16), mmap ile açılır
+- documents-<v>.bin/.idx   → UTF-8 döküman metinleri + offset tablosu
+- metadata-<v>.bin/.idx    → JSON metadata kayıtları + offset tablosu
+
+Aynı dosyaları açan tüm worker süreçleri sayfaları OS page cache üzerinden paylaşır.
+Her build yeni versiyonlu dosyalar yazar ve manifest.json'u atomik olarak değiştirir;
+okuyucular hiçbir zaman yarım yazılmış bir indeks görmez.
+"""
+
+import json
+import mmap
+import os
+import numpy as np
+
+FORMAT_VERSION = 2
+MANIFEST_FILE = 'manifest.json'
+
+# Manifest'te dosya listesi olmayan (ilk v2) indekslerin sabit dosya adları
+DEFAULT_FILES = {
+    'embeddings': 'embeddings.npy',
+    'documents': 'documents',
+    'metadata': 'metadata',
+}
+SUPPORTED_DTYPES = ('float32', 'float16')
+
+# Eski format (güvenilmeyen pickle) dosyaları
+LEGACY_FILES = ('documents.pkl', 'metadata.pkl')
+
+
+def write_records(path, name, records, encode):
+    """
+    Kayıtları tek dosyaya yaz, başlangıç offset'lerini ayrı tabloda tut
+    Kayıt i = bin[offsets[i]:offsets[i+1]]
+    Returns: yazılan dosya adları
+    """
+    offsets = np.zeros(len(records) + 1, dtype=np.int64)
+    with open(os.path.join(path, f'{name}.bin'), 'wb') as f:
+        for i, record in enumerate(records):
+            data = encode(record)
+            f.write(data)
+            offsets[i + 1] = offsets[i] + len(data)
+    np.save(os.path.join(path, f'{name}.idx.npy'), offsets)
+    return [f'{name}.bin', f'{name}.idx.npy']
+
+
+class LazyRecords:
+    """
+    Sadece erişilen kaydı okuyan liste benzeri görünüm
+    Dosya mmap ile açılır, tüm içerik belleğe alınmaz
+    """
+
+    def __init__(self, path, name, decode):
+        self.decode = decode
+        self.offsets = np.load(os.path.join(path, f'{name}.idx.npy'), mmap_mode='r')
+
+        with open(os.path.join(path, f'{name}.bin'), 'rb') as f:
+            if os.fstat(f.fileno()).st_size > 0:
+                self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self._data = b''
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return self.decode(self._data[start:end])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def _encode_text(text):
+    return text.encode('utf-8')
+
+
+def _decode_text(data):
+    return data.decode('utf-8')
+
+
+def _encode_json(obj):
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+
+def _decode_json(data):
+    return json.loads(data.decode('utf-8'))
+
+
+def write_store(path, documents, metadata, matrix, manifest, dtype='float32', extra_files=()):
+    """
+    Dökümanları, metadata'yı ve normalize matrisi versiyonlu dosyalara yaz
+    manifest['version'] dosya adlarına eklenir; manifest en son, atomik yazılır
+    extra_files: Aynı versiyona ait diğer dosyalar (ör. IVF indeksi)
+    """
+    if dtype not in SUPPORTED_DTYPES:
+        raise ValueError(f"Desteklenmeyen embedding dtype: {dtype}")
+
+    os.makedirs(path, exist_ok=True)
+    version = manifest['version']
+
+    files = {
+        'embeddings': f'embeddings-{version}.npy',
+        'documents': f'documents-{version}',
+        'metadata': f'metadata-{version}',
+    }
+    written = list(extra_files)
+    written += write_records(path, files['documents'], documents, _encode_text)
+    written += write_records(path, files['metadata'], metadata, _encode_json)
+    np.save(os.path.join(path, files['embeddings']), np.asarray(matrix, dtype=dtype))
+    written.append(files['embeddings'])
+
+    manifest = dict(manifest, format_version=FORMAT_VERSION, dtype=dtype,
+                    documents=len(documents), files=files, all_files=written)
+
+    # Geçici dosyaya yaz, sonra tek adımda değiştir (os.replace atomik)
+    tmp_path = os.path.join(path, MANIFEST_FILE + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(path, MANIFEST_FILE))
+
+    remove_stale_files(path, keep=written)
+    return manifest
+
+
+def remove_stale_files(path, keep):
+    """
+    Eski versiyonlara ve pickle formatına ait dosyaları sil
+    Başka bir süreç hâlâ mmap ile açık tutuyorsa (Windows) sonraki build'e bırakılır
+    """
+    keep = set(keep) | {MANIFEST_FILE}
+    for filename in os.listdir(path):
+        if filename in keep or not filename.endswith(('.npy', '.npz', '.bin', '.json', '.pkl')):
+            continue
+        try:
+            os.remove(os.path.join(path, filename))
+        except OSError:
+            pass
+
+
+def read_manifest(path):
+    """Manifest'i oku (yoksa None)"""
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def store_exists(path):
+    """Güncel formatta kayıtlı vektör DB var mı?"""
+    manifest = read_manifest(path)
+    return manifest is not None and manifest.get('format_version') == FORMAT_VERSION
+
+
+def open_store(path):
+    """
+    Kayıtlı vektör DB'yi aç
+    Returns: (documents, metadata, matrix, manifest) - hepsi lazy / mmap
+    """
+    if not store_exists(path):
+        if any(os.path.exists(os.path.join(path, f)) for f in LEGACY_FILES):
+            raise FileNotFoundError(
+                f"Eski (pickle) vektör DB formatı: {path}. "
+                "Yeniden oluşturmak için: python main.py setup"
+            )
+        raise FileNotFoundError(f"Vektör DB bulunamadı: {path}")
+
+    manifest = read_manifest(path)
+    files = manifest.get('files', DEFAULT_FILES)
+    documents = LazyRecords(path, files['documents'], _decode_text)
+    metadata = LazyRecords(path, files['metadata'], _decode_json)
+    matrix = np.load(os.path.join(path, files['embeddings']), mmap_mode='r')
+
+    return documents, metadata, matrix, manifest
@@ -0,0 +1,470 @@
+"""
+Vektör İndeksleri
+SchemaVectorDB.search için değiştirilebilir arama indeksleri
+
+- exact: Önceden normalize edilmiş float32 matris + argpartition (kesin sonuç)
+- ivf:   K-means kümeleri üzerinde ters dosya (IVF) yaklaşık arama
+- int8:  Boyut başına ölçekli int8 kodlar üzerinde aday arama + exact re-scoring
+- binary: İşaret bitleri (Hamming mesafesi) üzerinde aday arama + exact re-scoring
+
+Kuantize modlarda float matris sadece küçük aday kümesini yeniden skorlamak için
+okunur (mmap); worker başına bellekte kalan kısım kompakt kodlardır.
+"""
+
+import os
+import time
+import numpy as np
+
+
+def normalize_rows(vectors):
+    """Satırları birim uzunluğa getir (cosine similarity = dot product)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k_indices(scores, top_k):
+    """Skor vektöründen en yüksek top_k indeksi sıralı döndür (tam sort yok)"""
+    n = scores.shape[0]
+    if top_k >= n:
+        return np.argsort(-scores, kind='stable')
+    part = np.argpartition(-scores, top_k - 1)[:top_k]
+    return part[np.argsort(-scores[part], kind='stable')]
+
+
+# float32 skorlarda yuvarlama farkı olan komşular için ek aday sayısı
+RERANK_MARGIN = 8
+
+
+def exact_rerank(matrix, candidates, query_vector, top_k):
+    """
+    Adayları float64 ile yeniden skorla, eşitlikte küçük indeks önce
+    Tekli ve batch arama aynı sıralamayı verir (BLAS gemv/gemm farkından bağımsız)
+    """
+    scores = matrix[candidates].astype(np.float64) @ query_vector.astype(np.float64)
+    order = np.lexsort((candidates, -scores))[:top_k]
+    return candidates[order], scores[order].astype(np.float32)
+
+
+# Popcount tablosu (bayt → set bit sayısı)
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def _empty_result():
+    return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+
+def _offset_results(results, start):
+    """Alt aralıkta bulunan yerel indeksleri global satır indeksine çevir"""
+    return [(ids + start, scores) for ids, scores in results]
+
+
+class ExactIndex:
+    """Kesin arama: normalize float32 matris üzerinde tek dot product"""
+
+    mode = 'exact'
+    # float16 matris float32'ye bloklar halinde açılır (sorgu başına tam kopya yok)
+    BLOCK_ROWS = 4096
+
+    def __init__(self, matrix):
+        self.matrix = matrix
+
+    @classmethod
+    def build(cls, matrix, **kwargs):
+        return cls(matrix)
+
+    def search(self, query_vector, top_k):
+        """Normalize sorgu vektörü için (indeksler, skorlar) döndür"""
+        return self.search_many(query_vector[None, :], top_k)[0]
+
+    def search_many(self, query_matrix, top_k):
+        """Birden fazla sorgu: tek matris-matris çarpımı, her satır için top_k"""
+        if top_k <= 0 or len(self.matrix) == 0:
+            return [_empty_result() for _ in range(len(query_matrix))]
+        scores = self._scores(query_matrix)
+        results = []
+        for query_vector, row in zip(query_matrix, scores):
+            candidates = top_k_indices(row, top_k + RERANK_MARGIN)
+            results.append(exact_rerank(self.matrix, candidates, query_vector, top_k))
+        return results
+
+    def _scores(self, query_matrix):
+        if self.matrix.dtype == np.float32:
+            return query_matrix @ self.matrix.T
+        scores = np.empty((len(query_matrix), len(self.matrix)), dtype=np.float32)
+        for start in range(0, len(self.matrix), self.BLOCK_ROWS):
+            block = self.matrix[start:start + self.BLOCK_ROWS].astype(np.float32)
+            scores[:, start:start + len(block)] = query_matrix @ block.T
+        return scores
+
+    def search_range(self, query_matrix, top_k, start, end):
+        """Sadece [start, end) satırlarında ara (matris view'ı, kopya yok)"""
+        return _offset_results(ExactIndex(self.matrix[start:end]).search_many(query_matrix, top_k), start)
+
+    @property
+    def nbytes(self):
+        """Aramada taranan bellek (tüm matris)"""
+        return self.matrix.nbytes
+
+    def save(self, path, version=None):
+        """Exact indeks ek dosya gerektirmez (embedding matrisi yeterli)"""
+        return []
+
+    @classmethod
+    def load(cls, path, matrix, version=None, **kwargs):
+        return cls(matrix)
+
+
+class IVFIndex:
+    """
+    Ters dosya (IVF) indeksi
+    Vektörler nlist kümeye ayrılır, sorguda sadece en yakın nprobe küme taranır
+    """
+
+    mode = 'ivf'
+
+    def __init__(self, matrix, centroids, list_offsets, list_ids, nprobe=8):
+        self.matrix = matrix
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_ids = list_ids
+        self.nprobe = nprobe
+
+    @classmethod
+    def build(cls, matrix, nlist=None, nprobe=8, iterations=10, seed=42, **kwargs):
+        """Spherical k-means ile kümeleri oluştur"""
+        n = len(matrix)
+        if n == 0:
+            # Boş matris: küme yok, arama boş sonuç döner
+            dim = matrix.shape[1] if np.ndim(matrix) == 2 else 0
+            return cls(matrix, np.empty((0, dim), dtype=np.float32), np.zeros(1, dtype=np.int64),
+                       np.empty(0, dtype=np.int64), nprobe=nprobe)
+        if nlist is None or nlist <= 0:
+            nlist = int(np.sqrt(n))
+        nlist = max(1, min(nlist, n))
+
+        rng = np.random.default_rng(seed)
+        centroids = np.array(matrix[rng.choice(n, nlist, replace=False)], dtype=np.float32)
+
+        assignments = np.zeros(n, dtype=np.int64)
+        for _ in range(iterations):
+            assignments = np.argmax(matrix @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = matrix[assignments == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids = normalize_rows(centroids)
+
+        # CSR düzeni: küme c'nin üyeleri list_ids[list_offsets[c]:list_offsets[c+1]]
+        order = np.argsort(assignments, kind='stable')
+        counts = np.bincount(assignments, minlength=nlist)
+        list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+        return cls(matrix, centroids, list_offsets, order.astype(np.int64), nprobe=nprobe)
+
+    def search(self, query_vector, top_k):
+        """En yakın nprobe kümedeki adayları tam skorla"""
+        return self.search_many(query_vector[None, :], top_k)[0]
+
+    def search_many(self, query_matrix, top_k):
+        """Küme skorları tek çarpımda, aday skorlama her sorgu için ayrı"""
+        if top_k <= 0 or len(self.matrix) == 0:
+            return [_empty_result() for _ in range(len(query_matrix))]
+
+        nprobe = min(self.nprobe, len(self.centroids))
+        centroid_scores = query_matrix @ self.centroids.T
+
+        results = []
+        for query_vector, row in zip(query_matrix, centroid_scores):
+            probes = top_k_indices(row, nprobe)
+            candidates = np.concatenate([
+                self.list_ids[self.list_offsets[c]:self.list_offsets[c + 1]] for c in probes
+            ])
+            if len(candidates) == 0:
+                results.append(_empty_result())
+                continue
+
+            results.append(exact_rerank(self.matrix, candidates, query_vector, top_k))
+        return results
+
+    def search_range(self, query_matrix, top_k, start, end):
+        """
+        Sadece [start, end) satırlarında ara (ayrı bölüm indeksi kurmadan)
+        Kümeler skor sırasıyla taranır; en az nprobe küme ve aralıkta top_k aday
+        bulunana kadar devam edilir (küçük bölümlerde recall düşmesin)
+        """
+        if top_k <= 0 or end <= start:
+            return [_empty_result() for _ in range(len(query_matrix))]
+
+        nprobe = min(self.nprobe, len(self.centroids))
+        wanted = top_k + RERANK_MARGIN
+        centroid_scores = query_matrix @ self.centroids.T
+
+        results = []
+        for query_vector, row in zip(query_matrix, centroid_scores):
+            found, count = [], 0
+            for probed, c in enumerate(np.argsort(-row, kind='stable'), start=1):
+                ids = self.list_ids[self.list_offsets[c]:self.list_offsets[c + 1]]
+                ids = ids[(ids >= start) & (ids < end)]
+                found.append(ids)
+                count += len(ids)
+                if probed >= nprobe and count >= wanted:
+                    break
+            candidates = np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+            if len(candidates) == 0:
+                results.append(_empty_result())
+                continue
+            results.append(exact_rerank(self.matrix, candidates, query_vector, top_k))
+        return results
+
+    @property
+    def nbytes(self):
+        """Matris + küme yapıları"""
+        return self.matrix.nbytes + self.centroids.nbytes + self.list_offsets.nbytes + self.list_ids.nbytes
+
+    @staticmethod
+    def filename(version=None):
+        """İndeks dosya adı (versiyon embedding dosyalarıyla aynı)"""
+        return f'index_ivf-{version}.npz' if version else 'index_ivf.npz'
+
+    def save(self, path, version=None):
+        """Returns: yazılan dosya adları"""
+        filename = self.filename(version)
+        np.savez(
+            os.path.join(path, filename),
+            centroids=self.centroids,
+            list_offsets=self.list_offsets,
+            list_ids=self.list_ids
+        )
+        return [filename]
+
+    @classmethod
+    def load(cls, path, matrix, version=None, nprobe=8, **kwargs):
+        filepath = os.path.join(path, cls.filename(version))
+        if not os.path.exists(filepath):
+            print("IVF indeksi bulunamadı, yeniden oluşturuluyor...")
+            return cls.build(matrix, nprobe=nprobe, **kwargs)
+
+        with np.load(filepath) as data:
+            return cls(
+                matrix,
+                data['centroids'],
+                data['list_offsets'],
+                data['list_ids'],
+                nprobe=nprobe
+            )
+
+
+class QuantizedIndex:
+    """
+    Kompakt kodlar üzerinde aday arama, float matriste exact re-scoring
+    Alt sınıflar encode() ve candidate_scores() tanımlar
+    """
+
+    mode = None
+    default_rerank_factor = 10
+
+    def __init__(self, matrix, codes, params=None, rerank_factor=None):
+        self.matrix = matrix
+        self.codes = codes
+        self.params = params or {}
+        # 0 / None = modun varsayılanı
+        self.rerank_factor = rerank_factor or self.default_rerank_factor
+
+    @classmethod
+    def build(cls, matrix, rerank_factor=None, **kwargs):
+        codes, params = cls.encode(np.asarray(matrix, dtype=np.float32))
+        return cls(matrix, codes, params, rerank_factor=rerank_factor)
+
+    def search(self, query_vector, top_k):
+        """Kodlarla top_k * rerank_factor aday, sonra kesin skor"""
+        return self.search_many(query_vector[None, :], top_k)[0]
+
+    def search_many(self, query_matrix, top_k):
+        """Aday skorları tüm sorgular için tek seferde, re-scoring her sorgu için ayrı"""
+        if top_k <= 0 or len(self.matrix) == 0:
+            return [_empty_result() for _ in range(len(query_matrix))]
+
+        scores = self.candidate_scores(np.asarray(query_matrix, dtype=np.float32))
+        n_candidates = max(top_k + RERANK_MARGIN, top_k * self.rerank_factor)
+        results = []
+        for query_vector, row in zip(query_matrix, scores):
+            candidates = np.sort(top_k_indices(row, n_candidates))
+            results.append(exact_rerank(self.matrix, candidates, query_vector, top_k))
+        return results
+
+    def search_range(self, query_matrix, top_k, start, end):
+        """Sadece [start, end) satırlarında ara: kod ve matris view'ları, parametreler ortak"""
+        part = type(self)(self.matrix[start:end], self.codes[start:end], self.params, self.rerank_factor)
+        return _offset_results(part.search_many(query_matrix, top_k), start)
+
+    @property
+    def nbytes(self):
+        """Bellekte tutulan kod + parametre boyutu"""
+        return self.codes.nbytes + sum(v.nbytes for v in self.params.values())
+
+    @classmethod
+    def filename(cls, version=None):
+        """İndeks dosya adı (versiyon embedding dosyalarıyla aynı)"""
+        return f'index_{cls.mode}-{version}.npz' if version else f'index_{cls.mode}.npz'
+
+    def save(self, path, version=None):
+        """Returns: yazılan dosya adları"""
+        filename = self.filename(version)
+        np.savez(os.path.join(path, filename), codes=self.codes, **self.params)
+        return [filename]
+
+    @classmethod
+    def load(cls, path, matrix, version=None, rerank_factor=None, **kwargs):
+        filepath = os.path.join(path, cls.filename(version))
+        if not os.path.exists(filepath):
+            print(f"{cls.mode} indeksi bulunamadı, yeniden oluşturuluyor...")
+            return cls.build(matrix, rerank_factor=rerank_factor)
+
+        with np.load(filepath) as data:
+            params = {key: data[key] for key in data.files if key != 'codes'}
+            return cls(matrix, data['codes'], params, rerank_factor=rerank_factor)
+
+
+class Int8Index(QuantizedIndex):
+    """
+    Skaler kuantizasyon: her boyut max |değer| / 127 ile ölçeklenir
+    Bellek float32'nin 1/4'ü
+    """
+
+    mode = 'int8'
+    default_rerank_factor = 4
+
+    @staticmethod
+    def encode(matrix):
+        scale = np.abs(matrix).max(axis=0) / 127.0 if len(matrix) else np.ones(matrix.shape[1])
+        scale = scale.astype(np.float32)
+        scale[scale == 0] = 1.0
+        codes = np.clip(np.rint(matrix / scale), -127, 127).astype(np.int8)
+        return codes, {'scale': scale}
+
+    # float32'ye bloklar halinde açılır (tüm matrisin kopyası oluşmaz)
+    BLOCK_ROWS = 4096
+
+    def candidate_scores(self, query_matrix):
+        # q · (codes * scale) = (q * scale) · codes
+        scaled = query_matrix * self.params['scale']
+        scores = np.empty((len(query_matrix), len(self.codes)), dtype=np.float32)
+        for start in range(0, len(self.codes), self.BLOCK_ROWS):
+            block = self.codes[start:start + self.BLOCK_ROWS].astype(np.float32)
+            scores[:, start:start + len(block)] = scaled @ block.T
+        return scores
+
+
+class BinaryIndex(QuantizedIndex):
+    """
+    İşaret biti kuantizasyonu: boyut başına 1 bit, Hamming mesafesiyle aday
+    Bellek float32'nin 1/32'si
+    """
+
+    mode = 'binary'
+    default_rerank_factor = 50
+
+    @staticmethod
+    def encode(matrix):
+        return np.packbits(matrix > 0, axis=1), {}
+
+    def candidate_scores(self, query_matrix):
+        # Düşük Hamming mesafesi = yüksek skor
+        query_codes = np.packbits(query_matrix > 0, axis=1)
+        scores = np.empty((len(query_codes), len(self.codes)), dtype=np.float32)
+        for i, query_code in enumerate(query_codes):
+            distance = _POPCOUNT[np.bitwise_xor(self.codes, query_code)].sum(axis=1, dtype=np.int32)
+            scores[i] = -distance
+        return scores
+
+
+INDEX_TYPES = {
+    'exact': ExactIndex,
+    'ivf': IVFIndex,
+    'int8': Int8Index,
+    'binary': BinaryIndex,
+}
+
+
+def get_index_class(mode):
+    """Mod adına göre indeks sınıfı"""
+    if mode not in INDEX_TYPES:
+        raise ValueError(
+            f"Bilinmeyen indeks modu: {mode} (geçerli: {', '.join(INDEX_TYPES)})"
+        )
+    return INDEX_TYPES[mode]
+
+
+def index_options(config):
+    """RAG_CONFIG içinden indeks parametrelerini al"""
+    return {
+        'nlist': config.get('ivf_nlist'),
+        'nprobe': config.get('ivf_nprobe', 8),
+        'rerank_factor': config.get('rerank_factor'),
+    }
+
+
+def compare_indexes(matrix, query_vectors, modes, top_k=5, **options):
+    """
+    İndeks modlarını exact aramaya karşı karşılaştır
+    Returns: {mode: {'recall': ..., 'avg_ms': ..., 'build_s': ..., 'memory_mb': ...}}
+    memory_mb: aramada bellekte tutulan yapı (kuantize modlarda sadece kodlar)
+    """
+    exact = ExactIndex(matrix)
+    truth = [set(exact.search(q, top_k)[0].tolist()) for q in query_vectors]
+
+    report = {}
+    for mode in modes:
+        start = time.perf_counter()
+        index = get_index_class(mode).build(matrix, **options)
+        build_s = time.perf_counter() - start
+
+        hits = 0
+        start = time.perf_counter()
+        for q, expected in zip(query_vectors, truth):
+            found = index.search(q, top_k)[0]
+            hits += len(expected & set(found.tolist()))
+        elapsed = time.perf_counter() - start
+
+        report[mode] = {
+            'recall': hits / max(1, sum(len(t) for t in truth)),
+            'avg_ms': elapsed / max(1, len(query_vectors)) * 1000,
+            'build_s': build_s,
+            'memory_mb': index.nbytes / (1024 * 1024),
+        }
+    return report
+
+
+def print_report(report, top_k=5):
+    """Karşılaştırma raporunu yazdır"""
+    print(f"{'Mod':<10} {'Recall@' + str(top_k):>10} {'Ort. ms':>10} {'Build s':>10} {'Bellek MB':>10}")
+    print('-' * 55)
+    for mode, row in report.items():
+        print(f"{mode:<10} {row['recall']:>10.3f} {row['avg_ms']:>10.3f} {row['build_s']:>10.2f} "
+              f"{row['memory_mb']:>10.3f}")
+
+
+if __name__ == '__main__':
+    # Kayıtlı vektör DB üzerinde recall / gecikme raporu
+    import sys
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    from config.db_config import RAG_CONFIG
+    from rag.build_vector_db import SchemaVectorDB
+    from finetuning.prepare_data import SEED_EXAMPLES
+
+    db = SchemaVectorDB()
+    db.load(RAG_CONFIG['vector_db_path'])
+
+    questions = [ex['question'] for ex in SEED_EXAMPLES]
+    queries = normalize_rows(db.model.encode(questions))
+    top_k = RAG_CONFIG['top_k']
+    report = compare_indexes(
+        db.index.matrix, queries, list(INDEX_TYPES), top_k=top_k,
+        **index_options(RAG_CONFIG)
+    )
+    print_report(report, top_k=top_k)
@@ -0,0 +1,375 @@
+"""
+Şablonlu Soru Hızlı Yolu (LLM'siz)
+SEED_EXAMPLES'taki kalıplara uyan sorular (dönem + adet / toplam / firma sıralaması /
+liste, opsiyonel firma filtresi, satınalma / satış) kural tabanlı tanınır ve SQL
+doğrudan BASE_PATTERNS'taki JOIN / tutar kalıplarından oluşturulur
+
+Güven = sorudaki kelimelerin tanınan kısmının oranı. Tanınmayan kelime varsa
+(ör. "proje", "ortalama", "özeti") güven düşer ve soru LLM'e gider. "firma" ve
+bağlaçlar ancak bir slot onları kullandıysa tanınmış sayılır ("2024'te kaç firma"
+sipariş adedi değildir); şablonun cevaplamadığı ikinci bir metrik ("kaç sipariş
+ve toplam tutarı") ve karşılaştırma dışındaki bağlaçlar güveni ayrıca düşürür.
+Düzeltmesi kaydedilmiş sorular her zaman LLM'e gider (düzeltme prompt'ta kullanılır).
+"""
+
+import os
+import re
+import sys
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.db_config import FAST_PATH_CONFIG
+from rag.cache import normalize_question
+from learning.feedback_system import load_json, CORRECTIONS_FILE
+
+# ---------- BASE_PATTERNS kalıpları (S = TOHOM_SIPARIS) ----------
+
+PURCHASE_FILTER = "S.TIP=0 AND S.EVRAK_KONUSU_ID IN (1,22,23,61)"
+SALES_FILTER = "S.TIP=2"
+FIRM_JOIN = (
+    "INNER JOIN TOHOM_PARTI_YAMASI PY ON PY.PARTI_YAMASI_ID=S.PARTI_YAMASI_ID "
+    "INNER JOIN TOHOM_PARTI P ON P.PARTI_ID=PY.PARTI_ID"
+)
+AMOUNT_JOIN = (
+    "INNER JOIN (SELECT SIPARIS_ID, SUM(TUTAR*KDV_ORANI/100+KDVSIZ_TUTAR-ISKONTO) AS TUTAR "
+    "FROM TOHOM_SIPARIS_SATIRI GROUP BY SIPARIS_ID) SS ON SS.SIPARIS_ID=S.SIPARIS_ID"
+)
+PERIOD_FILTERS = {
+    'today': "CAST(S.TARIH AS DATE)=CAST(GETDATE() AS DATE)",
+    'yesterday': "CAST(S.TARIH AS DATE)=CAST(GETDATE()-1 AS DATE)",
+    'this_week': "S.TARIH>=DATEADD(day,-7,GETDATE())",
+    'this_month': "YEAR(S.TARIH)=YEAR(GETDATE()) AND MONTH(S.TARIH)=MONTH(GETDATE())",
+    'last_month': (
+        "YEAR(S.TARIH)=YEAR(DATEADD(month,-1,GETDATE())) "
+        "AND MONTH(S.TARIH)=MONTH(DATEADD(month,-1,GETDATE()))"
+    ),
+    'this_year': "YEAR(S.TARIH)=YEAR(GETDATE())",
+}
+
+# ---------- Slot kalıpları (normalize metin üzerinde) ----------
+
+PERIOD_PATTERNS = [
+    ('last_month', r'\bgeçen ay(?:ki|ın|da)?\b'),
+    ('this_week', r'\bbu hafta(?:ki|nın|da)?\b|\bson 7 gün(?:ün|de|lük)?\b'),
+    ('this_month', r'\bbu ay(?:ki|ın|da)?\b'),
+    ('this_year', r'\bbu (?:yıl|sene)(?:ki|ın|da)?\b'),
+    ('today', r'\bbugün(?:kü|ün)?\b'),
+    ('yesterday', r'\bdün(?:kü|ün)?\b'),
+]
+YEAR_PATTERN = r'\b(20\d{2})(?: (?:yıl|sene)\w*)?\b'
+
+METRIC_PATTERNS = [
+    ('firms', r'\bhangi firma\w*|\ben (?:çok|fazla) (?:\w+ ){0,3}firma\w*|\b\d+ firma\w*'),
+    ('total', r'\btoplam\w*|\btutar\w*|\bne kadar\b'),
+    ('count', r'\bkaç\b|\bsayı\w*|\badet\w*'),
+    ('list', r'\blistele\w*|\bgöster\w*'),
+]
+COMPARE_PATTERN = r'\bkarşılaştır\w*'
+SALES_PATTERN = r'\bsatış\w*|\bsattı\w*'
+DOMAIN_PATTERN = r'\bkarşılaştır\w*|\bsipariş\w*|\bsatınalma\w*|\balım\w*|\bsatış\w*|\bsattı\w*|\bödedi\w*|\bödeme\w*|\bfirma\w*'
+
+# Firma adı orijinal metinden: "Daikin firmasına", "Bosch'a"
+FIRM_PATTERNS = [
+    re.compile(r"([A-ZÇĞİÖŞÜ][\w&.'’\-]*(?:\s+[A-ZÇĞİÖŞÜ0-9][\w&.'’\-]*)*)\s+firma(?:s[ıi]\w*|ya|dan|nın)?\b"),
+    re.compile(r"\b([A-ZÇĞİÖŞÜ][\w&.\-]*)['’][a-zçğıöşü]+\b"),
+]
+
+# Anlamı olmayan / zaten slotla karşılanan kelimeler
+FILLER_WORDS = {
+    'sipariş', 'siparişi', 'siparişler', 'siparişleri', 'siparişlerin', 'siparişlerini', 'siparişe',
+    'satınalma', 'satın', 'alım', 'alımı', 'alımlar', 'satış', 'satışlar', 'satışları', 'sattık',
+    'girildi', 'girilen', 'verildi', 'verilen', 'verdik', 'var', 'vardı', 'yapıldı', 'yapılan',
+    'yaptık', 'ödedik', 'ödeme', 'ödenen', 'oldu', 'olan', 'ne', 'kadar', 'hangi', 'en', 'çok',
+    'fazla', 'tane',
+    'toplam', 'toplamı', 'tutar', 'tutarı', 'tutarları', 'kaç', 'adet', 'sayısı', 'sayıları',
+    'sayılarını', 'mı', 'mi', 'mu', 'mü', 'acaba', 'lütfen', 'bize', 'biz', 'yılı',
+    'yılının', 'yıllarını', 'yılları', 'yılında', 'yıl', 'yapılmış', 'girilmiş', 'tutarlı'
+}
+
+# Sorunun anlamını şablonun dışına çıkaran kelimeler: oran ne olursa olsun LLM'e gider
+# "en az / en düşük": şablon sıralaması hep DESC, ters soruyu cevaplar
+BLOCKING_PATTERN = (
+    r'\b(?:ortalama|hariç|değil|olmayan|iptal|proje|ürün|stok|fatura|teslim|bekleyen|'
+    r'onay|açık|kapalı|birim|miktar|kalem|dahil|fark|oran|yüzde|artış|azalış)\w*'
+    r'|\baz\b|\ben (?:düşük|küçük)\w*'
+)
+
+# Firma adından önce büyük harfle yazılmış olabilecek kelimeler
+LEADING_WORDS = FILLER_WORDS | {'bugün', 'bugünkü', 'dün', 'dünkü', 'bu', 'geçen', 'son'}
+
+# Kişi hitapları: "Mehmet Bey'in" firma değil kişi
+HONORIFICS = {'bey', 'hanım', 'bay', 'bayan', 'beyefendi', 'hanımefendi'}
+
+# Hızlı yoldan geçmemesi gereken sorular (__main__ kontrolü: hiçbiri eşikten geçmemeli)
+FAST_PATH_NEGATIVES = [
+    {"question": "2024 yılında kaç firma", "reason": "firma sayısı, sipariş adedi değil"},
+    {"question": "bugün kaç firmadan sipariş verdik", "reason": "firma sayısı, sipariş adedi değil"},
+    {"question": "bu ay kaç sipariş girildi ve toplam tutarı ne", "reason": "iki metrik"},
+    {"question": "dün kaç sipariş girildi ve ne kadar ödedik", "reason": "iki metrik"},
+    {"question": "Mehmet Bey'in bu ay kaç siparişi var", "reason": "kişi, firma değil"},
+    {"question": "Ayşe Hanım'ın dün kaç siparişi var", "reason": "kişi, firma değil"},
+    {"question": "Daikin ve Bosch firmalarına bu yıl ne kadar ödedik", "reason": "iki firma"},
+    {"question": "bu yıl en az hangi firmadan alım yaptık", "reason": "artan sıralama (şablon DESC)"},
+    {"question": "bu ay en düşük tutarlı 5 firma", "reason": "artan sıralama (şablon DESC)"},
+]
+
+CONJUNCTION_PATTERN = r'\b(?:ve|ile|veya|ayrıca)\b'
+CONJUNCTION_PENALTY = 0.2
+# Şablonun cevaplamadığı her istenen metrik için
+UNANSWERED_PENALTY = 0.25
+
+
+def _find_period(text):
+    """Returns: (dönem, yıllar, tüketilen parçalar) - birden fazla dönem varsa dönem='ambiguous'"""
+    found, spans = set(), []
+    for name, pattern in PERIOD_PATTERNS:
+        for m in re.finditer(pattern, text):
+            found.add(name)
+            spans.append(m.group(0))
+    years = []
+    for m in re.finditer(YEAR_PATTERN, text):
+        years.append(int(m.group(1)))
+        spans.append(m.group(0))
+    if years:
+        found.add('year')
+    if len(found) > 1:
+        return 'ambiguous', years, spans
+    return (found.pop() if found else None), years, spans
+
+
+def _find_firm(question):
+    """Orijinal sorudan firma adı (LIKE için temizlenmiş), Returns: (ad, eşleşen metin)"""
+    for pattern in FIRM_PATTERNS:
+        m = pattern.search(question)
+        if not m:
+            continue
+        words = m.group(1).split()
+        if HONORIFICS & set(normalize_question(' '.join(words)).split()):
+            continue
+        # Cümle başındaki "Bugün", "Bu" gibi büyük harfli kelimeleri at
+        while words and normalize_question(words[0]) in LEADING_WORDS:
+            words = words[1:]
+        # "... 10 firma": sayı adet sınırıdır, adın parçası değil
+        while words and words[-1].isdigit():
+            words = words[:-1]
+        # LIKE joker karakterleri atılır, tırnak SQL için ikilenir
+        name = re.sub(r"[^\w &.'\-]|_", '', ' '.join(words).replace('’', "'")).strip()
+        if len(name) >= 2:
+            return name, m.group(0)
+    return None, None
+
+
+def _coverage(text, consumed):
+    """Tanınan kelime oranı: slot parçaları çıkarıldıktan sonra kalanlar FILLER_WORDS'te mi"""
+    tokens = text.split()
+    if not tokens:
+        return 0.0
+    rest = f" {text} "
+    for part in sorted(consumed, key=len, reverse=True):
+        part = normalize_question(part)
+        if part:
+            rest = rest.replace(f" {part} ", ' ', 1)
+    unknown = [w for w in rest.split() if w not in FILLER_WORDS]
+    return 1.0 - len(unknown) / len(tokens)
+
+
+def _answered_metrics(metric, firm):
+    """Oluşan SQL'in döndürdüğü metrikler (build_sql ile aynı dallar)"""
+    if metric in ('firms', 'compare') or (metric == 'total' and firm):
+        return {'count', 'total'}
+    if metric in ('count', 'total'):
+        return {metric}
+    return set()
+
+
+def recognise(question):
+    """
+    Soruyu slotlara ayır
+    Returns: {'period', 'years', 'metric', 'firm', 'sales', 'limit', 'ranked', 'by_count', 'confidence'} veya None
+    """
+    text = normalize_question(question)
+    if not text or not re.search(DOMAIN_PATTERN, text) or re.search(BLOCKING_PATTERN, text):
+        return None
+
+    period, years, consumed = _find_period(text)
+    if period == 'ambiguous':
+        return None
+
+    if len(years) >= 2:
+        metric, compare = 'compare', re.search(COMPARE_PATTERN, text)
+        if not compare:
+            return None
+        consumed.append(compare.group(0))
+        # "2024 ve 2025": bağlaç karşılaştırılan yılları bağlar
+        consumed += re.findall(CONJUNCTION_PATTERN, text)
+    else:
+        metric = None
+        for name, pattern in METRIC_PATTERNS:
+            m = re.search(pattern, text)
+            if m:
+                metric = name
+                consumed.append(m.group(0))
+                break
+        if metric is None:
+            return None
+
+    firm, firm_text = _find_firm(question)
+    if firm_text:
+        consumed.append(firm_text)
+    if period is None and firm is None and metric != 'firms':
+        return None
+
+    limit = None
+    m = re.search(r'\b(\d{1,3}) (?:firma|sipariş)\w*', text)
+    if m:
+        limit = int(m.group(1))
+        consumed.append(m.group(0))
+
+    # Sorulan ama şablonun cevaplamadığı metrik ("kaç sipariş ... ve toplam tutarı")
+    asked = {name for name, pattern in METRIC_PATTERNS if name in ('count', 'total') and re.search(pattern, text)}
+    penalty = UNANSWERED_PENALTY * len(asked - _answered_metrics(metric, firm))
+    if metric != 'compare' and re.search(CONJUNCTION_PATTERN, text):
+        penalty += CONJUNCTION_PENALTY
+
+    return {
+        'period': period,
+        'years': years,
+        'metric': metric,
+        'firm': firm,
+        'sales': bool(re.search(SALES_PATTERN, text)),
+        'limit': limit,
+        'ranked': bool(limit or re.search(r'\ben (?:çok|fazla)\b', text)),
+        'by_count': bool(re.search(r'\bsipariş veril\w*|\bsayı\w*|\bkaç\b', text)),
+        'confidence': round(max(0.0, _coverage(text, consumed) - penalty), 3)
+    }
+
+
+def build_sql(slots):
+    """Slotlardan SQL (SEED_EXAMPLES ile aynı biçim)"""
+    where = [SALES_FILTER if slots['sales'] else PURCHASE_FILTER]
+    metric = slots['metric']
+    period = slots['period']
+
+    if metric == 'compare':
+        years = ','.join(str(y) for y in sorted(set(slots['years'])))
+        where.insert(0, f"YEAR(S.TARIH) IN ({years})")
+    elif period == 'year':
+        where.insert(0, f"YEAR(S.TARIH)={slots['years'][0]}")
+    elif period:
+        where.insert(0, PERIOD_FILTERS[period])
+    elif metric == 'firms':
+        # SEED_EXAMPLES: dönemsiz firma sıralaması bu yıl içindir
+        where.insert(0, PERIOD_FILTERS['this_year'])
+
+    firm = slots['firm']
+    if firm:
+        where.append(f"P.UNVAN LIKE '%{firm.replace(chr(39), chr(39) * 2)}%'")
+    where_sql = ' AND '.join(where)
+
+    if metric == 'compare':
+        return (f"SELECT YEAR(S.TARIH) AS Yil, COUNT(*) AS SiparisAdedi, SUM(SS.TUTAR) AS ToplamTutar "
+                f"FROM TOHOM_SIPARIS S {AMOUNT_JOIN} WHERE {where_sql} GROUP BY YEAR(S.TARIH) ORDER BY Yil")
+
+    if metric == 'count' and not firm:
+        return f"SELECT COUNT(*) AS SiparisAdedi FROM TOHOM_SIPARIS S WHERE {where_sql}"
+    if metric == 'count':
+        return (f"SELECT P.UNVAN AS FirmaAdi, COUNT(*) AS SiparisAdedi FROM TOHOM_SIPARIS S {FIRM_JOIN} "
+                f"WHERE {where_sql} GROUP BY P.UNVAN")
+
+    if metric == 'total' and not firm:
+        return f"SELECT SUM(SS.TUTAR) AS ToplamTutar FROM TOHOM_SIPARIS S {AMOUNT_JOIN} WHERE {where_sql}"
+
+    if metric in ('total', 'firms'):
+        top = f"TOP {slots['limit'] or 10} " if metric == 'firms' and slots['ranked'] else ''
+        order = 'SiparisAdedi' if slots['by_count'] else 'ToplamTutar'
+        return (f"SELECT {top}P.UNVAN AS FirmaAdi, COUNT(*) AS SiparisAdedi, SUM(SS.TUTAR) AS ToplamTutar "
+                f"FROM TOHOM_SIPARIS S {AMOUNT_JOIN} {FIRM_JOIN} WHERE {where_sql} "
+                f"GROUP BY P.UNVAN ORDER BY {order} DESC")
+
+    # list
+    return (f"SELECT TOP 100 S.SIPARIS_NO, P.UNVAN AS FirmaAdi, S.TARIH, SS.TUTAR FROM TOHOM_SIPARIS S "
+            f"{AMOUNT_JOIN} {FIRM_JOIN} WHERE {where_sql} ORDER BY S.TARIH DESC")
+
+
+# ---------- Düzeltilmiş sorular ----------
+
+_corrected = (None, frozenset())
+_corrected_lock = threading.Lock()
+
+
+def corrected_questions():
+    """Düzeltmesi olan soruların normalize metni (dosya değişince yeniden okunur)"""
+    global _corrected
+    try:
+        stamp = os.path.getmtime(CORRECTIONS_FILE)
+    except OSError:
+        return frozenset()
+    if _corrected[0] != stamp:
+        with _corrected_lock:
+            questions = frozenset(normalize_question(c['question']) for c in load_json(CORRECTIONS_FILE))
+            _corrected = (stamp, questions)
+    return _corrected[1]
+
+
+# ---------- Metrikler ----------
+
+_stats = {'requests': 0, 'hits': 0, 'low_confidence': 0, 'no_match': 0, 'corrected': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _stats_lock:
+        _stats['requests'] += 1
+        _stats[name] += 1
+
+
+def get_fast_path_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['hit_rate'] = round(stats['hits'] / stats['requests'], 3) if stats['requests'] else 0.0
+    return stats
+
+
+def match_intent(question):
+    """
+    Soru şablonlara uyuyorsa SQL'i döndür, güven eşiğin altındaysa None (LLM'e gider)
+    Returns: {'sql', 'confidence', 'slots'} veya None
+    """
+    if not FAST_PATH_CONFIG['enabled']:
+        return None
+    if normalize_question(question) in corrected_questions():
+        _count('corrected')
+        return None
+
+    slots = recognise(question)
+    if slots is None:
+        _count('no_match')
+        return None
+    if slots['confidence'] < FAST_PATH_CONFIG['min_confidence']:
+        _count('low_confidence')
+        return None
+
+    _count('hits')
+    return {'sql': build_sql(slots), 'confidence': slots['confidence'], 'slots': slots}
+
+
+if __name__ == '__main__':
+    # SEED_EXAMPLES üzerinde tanıma oranı, FAST_PATH_NEGATIVES hiçbiri eşleşmemeli
+    from finetuning.prepare_data import SEED_EXAMPLES
+
+    for ex in SEED_EXAMPLES:
+        slots = recognise(ex['question'])
+        ok = slots is not None and slots['confidence'] >= FAST_PATH_CONFIG['min_confidence']
+        print(f"{'✓' if ok else '·'} {ex['question']:<55} {slots and slots['confidence']}")
+        if ok:
+            print(f"    {build_sql(slots)}")
+
+    print("\nNegatif örnekler (LLM'e gitmeli):")
+    leaked = 0
+    for ex in FAST_PATH_NEGATIVES:
+        slots = recognise(ex['question'])
+        ok = slots is not None and slots['confidence'] >= FAST_PATH_CONFIG['min_confidence']
+        leaked += ok
+        print(f"{'✗' if ok else '✓'} {ex['question']:<55} {slots and slots['confidence']}  ({ex['reason']})")
+    sys.exit(1 if leaked else 0)
@@ -0,0 +1,103 @@
+"""
+Ollama HTTP İstemcisi
+Tüm Ollama çağrıları için paylaşılan, keep-alive bağlantı havuzlu requests.Session
+
+Her çağrıda yeni TCP bağlantısı açmak yerine havuzdaki bağlantılar yeniden kullanılır.
+Bağlantı (connect) ve okuma (read) timeout'ları ayrıdır; bağlantı kopmalarında
+jitter'lı üstel bekleme ile yeniden denenir.
+"""
+
+import os
+import random
+import sys
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.db_config import LLM_CONFIG
+
+# Sağlık kontrolleri için kısa okuma timeout'u (saniye)
+HEALTH_READ_TIMEOUT = 5
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Süreç başına tek Session (thread-safe oluşturma)"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=LLM_CONFIG['pool_size'],
+                    pool_block=False
+                )
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+    return _session
+
+
+def _timeout(read_timeout=None):
+    """(connect, read) timeout çifti"""
+    return (LLM_CONFIG['connect_timeout'], read_timeout or LLM_CONFIG['timeout'])
+
+
+def request(method, path, read_timeout=None, **kwargs):
+    """
+    Ollama'ya istek gönder
+    Bağlantı hatalarında (reset, refused) LLM_CONFIG['retries'] kez yeniden dener;
+    okuma timeout'u yeniden denenmez (model zaten çalışıyor olabilir)
+    """
+    url = f"{LLM_CONFIG['base_url']}{path}"
+    attempts = LLM_CONFIG['retries'] + 1
+    for attempt in range(attempts):
+        try:
+            return get_session().request(method, url, timeout=_timeout(read_timeout), **kwargs)
+        except requests.ConnectionError:
+            if attempt == attempts - 1:
+                raise
+            # Üstel bekleme + full jitter (eşzamanlı istekler aynı anda tekrar denemesin)
+            delay = LLM_CONFIG['retry_backoff'] * (2 ** attempt)
+            time.sleep(random.uniform(0, delay))
+
+
+def _keep_alive():
+    """Ollama keep_alive: süre metni ('30m') veya saniye sayısı (-1 = süresiz)"""
+    value = str(LLM_CONFIG['keep_alive']).strip()
+    return int(value) if value.lstrip('-').isdigit() else value
+
+
+def generate(prompt, options=None, stream=False, read_timeout=None):
+    """/api/generate çağrısı, Returns: requests.Response"""
+    return request('POST', '/api/generate', read_timeout=read_timeout, json={
+        'model': LLM_CONFIG['model'],
+        'prompt': prompt,
+        'stream': stream,
+        # Model bellekte kalsın: yeniden yükleme ve prompt önek cache'i kaybı olmaz
+        'keep_alive': _keep_alive(),
+        'options': options or {}
+    }, stream=stream)
+
+
+def list_models():
+    """Yüklü model adları (Ollama'ya ulaşılamazsa None)"""
+    try:
+        response = request('GET', '/api/tags', read_timeout=HEALTH_READ_TIMEOUT)
+    except requests.RequestException:
+        return None
+    if response.status_code != 200:
+        return None
+    return [m['name'] for m in response.json().get('models', [])]
+
+
+def is_available():
+    """Ollama çalışıyor mu?"""
+    return list_models() is not None
@@ -0,0 +1,146 @@
+"""
+LLM Dağıtıcısı - Sınırlı Eşzamanlılık ve Geri Basınç
+Tek Ollama örneği sınırlı sayıda paralel üretim yapabilir. SQL üretimleri en fazla
+LLM_CONFIG['max_concurrent'] slotla çalışır; fazlası sıraya (FIFO) girer.
+
+Sıra doluysa (LLM_CONFIG['max_queue']) veya istek LLM_CONFIG['queue_timeout'] saniye
+içinde slot alamazsa LLMBusy fırlatılır; API bunu 503 + Retry-After olarak döner,
+worker thread iki dakika boyunca timeout beklemez.
+"""
+
+import math
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.db_config import LLM_CONFIG
+
+
+class LLMBusy(Exception):
+    """LLM kapasitesi dolu, retry_after saniye sonra tekrar denenmeli"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LLMDispatcher:
+    """Ağırlıklı semafor + derinliği sınırlı FIFO bekleme sırası"""
+
+    def __init__(self, max_concurrent=None, max_queue=None, queue_timeout=None):
+        self.max_concurrent = max(1, max_concurrent or LLM_CONFIG['max_concurrent'])
+        self.max_queue = LLM_CONFIG['max_queue'] if max_queue is None else max_queue
+        self.queue_timeout = queue_timeout or LLM_CONFIG['queue_timeout']
+        self._cond = threading.Condition()
+        self._in_use = 0
+        self._waiters = deque()
+        # Metrikler
+        self._waits = deque(maxlen=500)  # saniye
+        self._service = deque(maxlen=100)  # slot tutma süresi, saniye
+        self.served = 0
+        self.rejected_full = 0
+        self.rejected_timeout = 0
+        self.max_depth = 0
+
+    def _retry_after(self, depth):
+        """Sıradakilerin bitmesi için tahmini süre (saniye)"""
+        avg = sum(self._service) / len(self._service) if self._service else 5.0
+        return max(1, math.ceil(avg * (depth + 1) / self.max_concurrent))
+
+    def acquire(self, weight=1, deadline=None):
+        """
+        weight slot al (çok adaylı üretim birden fazla slot kullanır)
+        deadline: time.monotonic() cinsinden son an (varsayılan şimdi + queue_timeout)
+        Returns: bekleme süresi (saniye)
+        """
+        weight = min(max(1, weight), self.max_concurrent)
+        start = time.monotonic()
+        deadline = deadline or start + self.queue_timeout
+
+        with self._cond:
+            # Boş slot ve bekleyen yoksa sıraya girmeden al
+            if not self._waiters and self._in_use + weight <= self.max_concurrent:
+                self._in_use += weight
+                self._waits.append(0.0)
+                return 0.0
+
+            if len(self._waiters) >= self.max_queue:
+                self.rejected_full += 1
+                raise LLMBusy('LLM sırası dolu', self._retry_after(len(self._waiters)))
+
+            ticket = object()
+            self._waiters.append(ticket)
+            self.max_depth = max(self.max_depth, len(self._waiters))
+            try:
+                while self._waiters[0] is not ticket or self._in_use + weight > self.max_concurrent:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected_timeout += 1
+                        raise LLMBusy('LLM sırasında bekleme süresi doldu',
+                                      self._retry_after(len(self._waiters)))
+                    self._cond.wait(remaining)
+                self._in_use += weight
+            finally:
+                self._waiters.remove(ticket)
+                # Sıradaki bekleyen artık başta olabilir
+                self._cond.notify_all()
+
+            waited = time.monotonic() - start
+            self._waits.append(waited)
+            return waited
+
+    def release(self, weight=1, held=None):
+        weight = min(max(1, weight), self.max_concurrent)
+        with self._cond:
+            self._in_use -= weight
+            self.served += 1
+            if held is not None:
+                self._service.append(held)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, weight=1, deadline=None):
+        """with dispatcher.slot(): ... - slot alınamazsa LLMBusy"""
+        waited = self.acquire(weight, deadline)
+        if waited > 0.05:
+            print(f"LLM sırasında {waited:.1f} sn beklendi")
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(weight, time.monotonic() - start)
+
+    def stats(self):
+        with self._cond:
+            waits = sorted(self._waits)
+            return {
+                'max_concurrent': self.max_concurrent,
+                'in_use': self._in_use,
+                'queue_depth': len(self._waiters),
+                'max_queue_depth': self.max_depth,
+                'max_queue': self.max_queue,
+                'served': self.served,
+                'rejected_full': self.rejected_full,
+                'rejected_timeout': self.rejected_timeout,
+                'avg_wait_ms': round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+                'p95_wait_ms': round(waits[int(len(waits) * 0.95)] * 1000, 1) if waits else 0.0
+            }
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    """Süreç başına tek dağıtıcı"""
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = LLMDispatcher()
+    return _dispatcher
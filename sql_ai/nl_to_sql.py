@@ -3,21 +3,38 @@ Türkçe Doğal Dil → SQL Dönüştürücü
 RAG context + Öğrenme sistemi ile zenginleştirilmiş
 """
 
-import requests
+import json
+import queue
 import re
 import os
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, as_completed, wait
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config.db_config import LLM_CONFIG
-from rag.query_rag import get_relevant_context
+from sql_ai import llm_client
+from sql_ai.sql_cache import get_sql_cache
+from sql_ai.intent_templates import match_intent
+from sql_ai.sql_validator import prepare_sql
+from sql_ai.sql_parser import TOKEN_PATTERN
+from sql_ai.llm_dispatcher import get_dispatcher
+from sql_ai.prompt_budget import (
+    assemble_sections,
+    count_tokens,
+    record_usage,
+    static_prefix_budget
+)
+from rag.query_rag import get_relevant_context, get_warmup_status
 from learning.feedback_system import (
     get_similar_corrections, 
     format_corrections_for_prompt,
     get_learned_examples,
     format_examples_for_prompt,
     save_correction,
-    add_learned_example
+    add_learned_example,
+    EXAMPLES_FILE
 )
 
 # Temel sorgu kalıpları (her zaman dahil edilir)
@@ -62,36 +79,256 @@ def generate_sql(question):
     Türkçe soruyu SQL'e çevir
     RAG + Öğrenme sistemi ile zenginleştirilmiş
     """
+    sql = None
+    for event, value in stream_sql(question):
+        if event == 'sql':
+            sql = value
+    return sql
+
+def stream_sql(question):
+    """
+    generate_sql'in akış versiyonu
+    Yields: ('token', metin) parçaları, en sonda ('sql', temizlenmiş SQL veya None)
+    Şablonlu sorular (intent_templates) ve SQL cache'teki sorular için LLM çağrılmaz
+    LLM çağrısı dağıtıcı slotu içinde yapılır; kapasite dolu ise LLMBusy fırlatılır
+    (sıra bekleme süresi prompt hazırlandıktan sonra, slot istenirken başlar)
+    """
+    intent = match_intent(question)
+    if intent:
+        print(f"Şablon eşleşmesi ({intent['slots']['metric']}, {intent['slots']['period']}, güven {intent['confidence']})")
+        yield ('token', intent['sql'])
+        yield ('sql', intent['sql'])
+        return
     
-    # 1. RAG ile ilgili schema bilgilerini bul
-    rag_result = get_relevant_context(question, top_k=5)
-    context = rag_result['context']
+    cached = lookup_cached_sql(question)
+    if cached:
+        yield ('token', cached)
+        yield ('sql', cached)
+        return
     
-    print(f"RAG bulduğu tablolar: {rag_result['tables']}")
+    prompt = build_prompt(question)
+    if LLM_CONFIG['candidates'] > 1:
+        # Çok adaylı mod: adaylar paralel üretilir, token akışı yerine kazanan tek parça gelir
+        with get_dispatcher().slot(weight=LLM_CONFIG['candidates']):
+            sql = generate_candidates(prompt)
+        if sql:
+            yield ('token', sql)
+        yield ('sql', sql)
+        return
+    yield from stream_in_slot(prompt)
+
+def stream_in_slot(prompt):
+    """
+    stream_completion'ı dağıtıcı slotu içinde ayrı thread'de çalıştır
+    Slot üretim bitince bırakılır, tüketicinin (yavaş SSE istemcisi) okumasını beklemez.
+    Bekleme süresi slot istenirken başlar (prompt hazırlığı sıra süresinden yemez).
+    Tüketici ayrılırsa üretim bir sonraki token'da durdurulur.
+    """
+    events = queue.Queue()
+    stop = threading.Event()
     
-    # 2. Öğrenilmiş örnekleri al
-    learned_examples = get_learned_examples(limit=5)
-    examples_text = format_examples_for_prompt(learned_examples)
+    def produce():
+        try:
+            with get_dispatcher().slot():
+                completion = stream_completion(prompt)
+                try:
+                    for item in completion:
+                        events.put(item)
+                        if stop.is_set():
+                            break
+                finally:
+                    completion.close()
+        except Exception as e:
+            # LLMBusy dahil: tüketici thread'inde fırlatılır
+            events.put(('error', e))
+        finally:
+            events.put(None)
     
-    # 3. Benzer düzeltmeleri al (ÖNEMLİ!)
-    similar_corrections = get_similar_corrections(question, limit=3)
-    corrections_text = format_corrections_for_prompt(similar_corrections)
+    threading.Thread(target=produce, name='llm-stream', daemon=True).start()
+    try:
+        while True:
+            item = events.get()
+            if item is None:
+                return
+            if item[0] == 'error':
+                raise item[1]
+            yield item
+    finally:
+        stop.set()
+
+def lookup_cached_sql(question):
+    """Daha önce doğrulanmış SQL (cache kapalıysa veya yoksa None)"""
+    cache = get_sql_cache()
+    if cache is None:
+        return None
+    hit = cache.lookup(question)
+    if hit is None:
+        return None
+    print(f"SQL cache hit ({hit['match']}, {hit['score']}): {hit['question']}")
+    return hit['sql']
+
+def remember_sql(question, sql):
+    """Doğrulanmış ve hatasız çalışmış SQL'i cache'e ekle"""
+    cache = get_sql_cache()
+    if cache is None:
+        return
+    try:
+        cache.store(question, sql)
+    except OSError as e:
+        print(f"SQL cache yazma hatası: {e}")
+
+SYSTEM_PROMPT = "Sen bir MSSQL veritabanı uzmanısın. Kullanıcının Türkçe sorusunu SQL sorgusuna çevireceksin."
+
+# Sabit önek cache'i: (örnek dosyası değişim zamanı, önek metni)
+_static_prefix = (None, None)
+
+def _render_prefix(examples):
+    return f"""{SYSTEM_PROMPT}
+
+{BASE_PATTERNS}
+
+{format_examples_for_prompt(examples)}
+"""
+
+def static_prefix():
+    """
+    Her istekte byte-byte aynı kalan prompt öneki: sistem rolü, kurallar, öğrenilmiş örnekler
+    Ollama önceki isteğin KV cache'ini bu önek için yeniden kullanır (prefill tekrar yapılmaz)
+    Örnek dosyası değişene kadar aynı metin döner
+    Önek bütçenin STATIC_PREFIX_SHARE kadarını aşarsa en az başarılı örnekler çıkarılır
+    """
+    global _static_prefix
+    try:
+        stamp = os.path.getmtime(EXAMPLES_FILE)
+    except OSError:
+        stamp = None
     
-    if similar_corrections:
-        print(f"Benzer düzeltmeler bulundu: {len(similar_corrections)}")
+    if _static_prefix[1] is None or _static_prefix[0] != stamp:
+        examples = get_learned_examples(limit=5)
+        while True:
+            prefix = _render_prefix(examples)
+            if not examples or count_tokens(prefix) <= static_prefix_budget():
+                break
+            examples = examples[:-1]
+        _static_prefix = (stamp, prefix)
+    return _static_prefix[1]
+
+# ---------- Context toplama (LLM öncesi) ----------
+
+EMPTY_RAG_RESULT = {'context': '', 'tables': [], 'join_hints': [], 'documents': [], 'results': []}
+
+_context_pool = None
+_context_pool_lock = threading.Lock()
+
+def _get_context_pool():
+    """Context aşamaları için paylaşılan thread havuzu"""
+    global _context_pool
+    if _context_pool is None:
+        with _context_pool_lock:
+            if _context_pool is None:
+                _context_pool = ThreadPoolExecutor(
+                    max_workers=LLM_CONFIG['context_workers'], thread_name_prefix='sql-context'
+                )
+    return _context_pool
+
+# Zaman aşımına uğramış ama hâlâ çalışan aşama: bitene kadar o aşama yeniden
+# gönderilmez (takılan kaynak havuzu işgal eden işlerle doldurmaz)
+_stalled_stages = {}  # aşama → süresi dolan future
+_stalled_lock = threading.Lock()
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    value = func(*args, **kwargs)
+    return value, time.perf_counter() - start
+
+def _stage_fallbacks():
+    """
+    Zaman aşımı / hata durumunda kullanılacak değerler
+    Önek: son başarılı sabit önek (KV cache korunur), o da yoksa örneksiz önek
+    """
+    return {
+        'rag': EMPTY_RAG_RESULT,
+        'prefix': _static_prefix[1] or _render_prefix([]),
+        'corrections': []
+    }
+
+def prompt_parts(question):
+    """
+    Soruya göre değişen bölümler + sabit önek, birbirinden bağımsız üç aşama eşzamanlı:
+    RAG araması, öğrenilmiş örnekler (önek), benzer düzeltmeler
+    Her aşamanın kendi timeout'u var (LLM_CONFIG['*_timeout']); süresi dolan veya hata
+    veren aşama boş / önceki değerle devam eder, istek beklemez. Süresi dolan çalışma
+    bitene kadar o aşama gönderilmez, doğrudan boş / önceki değer kullanılır.
+    Isınma sürerken RAG aşamasının timeout'u yoktur (istekler tek yüklemeyi bekler)
+    Returns: {'rag', 'corrections', 'prefix', 'timings'}
+    """
+    start = time.perf_counter()
+    pool = _get_context_pool()
+    stages = {
+        'rag': (get_relevant_context, (question,), {'top_k': 5}),
+        'prefix': (static_prefix, (), {}),
+        'corrections': (get_similar_corrections, (question,), {'limit': 3})
+    }
+    with _stalled_lock:
+        stalled = [stage for stage, future in _stalled_stages.items() if not future.done()]
+    futures = {
+        stage: pool.submit(_timed, func, *args, **kwargs)
+        for stage, (func, args, kwargs) in stages.items() if stage not in stalled
+    }
+    # Model / indeks ilk kez yükleniyorsa (ısınma) RAG aşaması tek yüklemeyi bekler:
+    # timeout'a düşüp şemasız prompt üretmez, sonraki istekleri de 'stalled' yapmaz
+    warmup = get_warmup_status()
+    rag_loading = not warmup['ready'] and warmup['state'] != 'error'
+    timeouts = {
+        'rag': None if rag_loading else LLM_CONFIG['rag_timeout'],
+        'prefix': LLM_CONFIG['examples_timeout'],
+        'corrections': LLM_CONFIG['corrections_timeout']
+    }
+    
+    values = {}
+    timings = {'degraded': [f"{stage}: stalled" for stage in stalled]}
+    for stage, future in futures.items():
+        remaining = None if timeouts[stage] is None else max(0.0, start + timeouts[stage] - time.perf_counter())
+        try:
+            values[stage], seconds = future.result(timeout=remaining)
+            timings[stage] = round(seconds * 1000, 1)
+        except FutureTimeout:
+            print(f"Context aşaması zaman aşımı: {stage} ({timeouts[stage]} sn)")
+            timings['degraded'].append(f"{stage}: timeout")
+            # Kuyrukta bekliyorsa iptal, çalışıyorsa bitene kadar aşama atlanır
+            if not future.cancel():
+                with _stalled_lock:
+                    _stalled_stages[stage] = future
+        except Exception as e:
+            print(f"Context aşaması hatası: {stage}: {e}")
+            timings['degraded'].append(f"{stage}: {type(e).__name__}")
+    
+    fallbacks = _stage_fallbacks()
+    for stage in stages:
+        if stage not in values:
+            values[stage] = fallbacks[stage]
+            timings[stage] = None
+    timings['total'] = round((time.perf_counter() - start) * 1000, 1)
+    
+    print(f"RAG bulduğu tablolar: {values['rag']['tables']}")
+    if values['corrections']:
+        print(f"Benzer düzeltmeler bulundu: {len(values['corrections'])}")
     
-    # 4. Prompt oluştur
-    prompt = f"""Sen bir MSSQL veritabanı uzmanısın. Kullanıcının Türkçe sorusunu SQL sorgusuna çevireceksin.
+    return {
+        'rag': values['rag'],
+        'corrections': values['corrections'],
+        'prefix': values['prefix'],
+        'timings': timings
+    }
+
+PROMPT_TEMPLATE = """{prefix}
+---
 
 ## VERİTABANI BİLGİLERİ
 
 {context}
 
-{BASE_PATTERNS}
-
-{examples_text}
-
-{corrections_text}
+{corrections}
 
 ---
 
@@ -103,42 +340,360 @@ Yukarıdaki bilgileri ve özellikle DÜZELTMELER bölümünü dikkate alarak SQL
 SADECE SQL kodunu yaz. Açıklama yapma, markdown kullanma.
 SELECT ile başla:"""
 
-    # 5. LLM'e gönder
-    try:
-        response = requests.post(
-            f"{LLM_CONFIG['base_url']}/api/generate",
-            json={
-                "model": LLM_CONFIG['model'],
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "temperature": LLM_CONFIG['temperature'],
-                    "num_predict": 800,
-                    "num_ctx": 8192
-                }
-            },
-            timeout=LLM_CONFIG['timeout']
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            raw_sql = result.get('response', '').strip()
-            return clean_sql(raw_sql)
+def build_prompt(question):
+    """
+    LLM prompt'unu oluştur
+    Sabit önek (static_prefix) önce, soruya özel bölümler sonra gelir
+    Soruya özel bölümler token bütçesine göre seçilir / kesilir (prompt_budget)
+    """
+    parts = prompt_parts(question)
+    prefix = parts['prefix']
+    
+    fixed = count_tokens(PROMPT_TEMPLATE.format(prefix=prefix, context='', corrections='', question=question))
+    context, corrections, usage = assemble_sections(
+        parts['rag'], parts['corrections'], fixed, format_corrections_for_prompt
+    )
+    prompt = PROMPT_TEMPLATE.format(prefix=prefix, context=context, corrections=corrections, question=question)
+    
+    usage['total'] = count_tokens(prompt)
+    usage['stages_ms'] = parts['timings']
+    record_usage(usage)
+    return prompt
+
+
+class SqlStreamParser:
+    """
+    Akan LLM çıktısında SELECT ifadesinin bittiği yeri bul
+    Bitiş: kapanan code fence, ';', açıklama satırı veya boş satırdan sonra
+    SQL ile devam etmeyen bir satır
+    
+    Metin sql_parser'ın token deseniyle, son kontrol edilen konumdan devam ederek
+    taranır: string / köşeli parantez / yorum içindeki ';', ``` ve satır sonları
+    bitiş sayılmaz, her parçada sadece yeni metin işlenir (buffer baştan taranmaz)
+    """
+    
+    STOP_PREFIXES = ('bu sorgu', 'açıklama', 'not:', 'explanation', 'this query', 'note:')
+    CONTINUATION_WORDS = {
+        'SELECT', 'FROM', 'WHERE', 'AND', 'OR', 'NOT', 'INNER', 'LEFT', 'RIGHT', 'FULL',
+        'CROSS', 'OUTER', 'JOIN', 'ON', 'GROUP', 'ORDER', 'HAVING', 'UNION', 'CASE', 'WHEN',
+        'THEN', 'ELSE', 'END', 'AS', 'TOP', 'WITH', 'OFFSET', 'FETCH', 'IN', 'EXISTS'
+    }
+    _SELECT_RE = re.compile(r'\bSELECT\b', re.IGNORECASE)
+    # Yazılmakta olan satırın kararı için bakılan baş kısım (ilk iki kelime + önek)
+    LINE_HEAD = 64
+    
+    def __init__(self):
+        self.text = ''
+        self.end = None
+        self.start = None        # SELECT'in konumu
+        self.pos = 0             # Sıradaki token'ın aranacağı konum (tırnak dışında)
+        self.line_start = 0      # Tırnak dışındaki mevcut satırın başı
+        self.blank_before = False
+    
+    @property
+    def done(self):
+        return self.end is not None
+    
+    @property
+    def sql_text(self):
+        """Bitiş noktasına kadar olan metin (sonrası atılır)"""
+        return self.text if self.end is None else self.text[:self.end]
+    
+    def feed(self, chunk):
+        """Yeni parçayı ekle, Returns: SQL tamamlandı mı?"""
+        if self.end is None:
+            searched = len(self.text)
+            self.text += chunk
+            if self.start is None:
+                self._find_select(searched)
+            if self.start is not None:
+                self._check()
+        return self.done
+    
+    def _find_select(self, searched):
+        # Önceki parçanın sonunda yarım kalmış SELECT için 6 karakter geri
+        match = self._SELECT_RE.search(self.text, max(0, searched - 6))
+        if match:
+            self.start = self.pos = self.line_start = match.start()
+    
+    def _continues_sql(self, line):
+        word = line.split()[0].upper() if line.split() else ''
+        return line[0] in '(),' or word in self.CONTINUATION_WORDS or '=' in line
+    
+    def _line_stops(self, line, complete):
+        """
+        line_start'taki satır SQL'i bitiriyor mu
+        complete=False: son satır henüz yazılıyor, ilk kelimesi bitmeden karar verilmez
+        """
+        stripped = line.strip()
+        if self.line_start > self.start and stripped.lower().startswith(self.STOP_PREFIXES):
+            return True
+        if not complete and len(stripped[:self.LINE_HEAD].split()) < 2:
+            return False
+        if not stripped:
+            self.blank_before = True
+        elif self.blank_before:
+            if not self._continues_sql(stripped):
+                return True
+            # İlk kelime ve '=' sonradan değişmez: devam kararı kesin
+            self.blank_before = False
+        return False
+    
+    def _close_lines(self, upto):
+        """[pos, upto) boşluğundaki satır sonlarıyla biten satırları değerlendir"""
+        text = self.text
+        nl = text.find('\n', self.pos, upto)
+        while nl != -1:
+            if self._line_stops(text[self.line_start:nl], complete=True):
+                self.end = self.line_start
+                return True
+            self.line_start = nl + 1
+            nl = text.find('\n', nl + 1, upto)
+        return False
+    
+    def _check(self):
+        text = self.text
+        length = len(text)
+        for m in TOKEN_PATTERN.finditer(text, self.pos):
+            kind = m.lastgroup
+            token_start = m.start(kind)
+            if self._close_lines(token_start):
+                return
+            self.pos = token_start
+            # Metnin sonuna değen token (yarım kelime, '-' → '--', kapanmamış
+            # string / yorum) bir sonraki parçada yeniden okunur
+            if m.end() == length or (kind == 'other' and m.group(kind) == '`' and length - token_start < 3):
+                break
+            if kind == 'op' and m.group(kind) == ';':
+                self.end = m.end()
+            elif kind == 'other' and text.startswith('```', token_start):
+                self.end = token_start
+            if self.end is not None:
+                # Aynı satırın başı daha önce bitiriyorsa o geçerli
+                if self._line_stops(text[self.line_start:token_start], complete=False):
+                    self.end = self.line_start
+                return
+            self.pos = m.end()
         else:
-            print(f"LLM HTTP Error: {response.status_code}")
-            return None
+            # Sondaki boşluk: satır sonlarını şimdi işle
+            if text[self.pos:].isspace():
+                if self._close_lines(length):
+                    return
+                self.pos = length
+        
+        # Boş satırdan sonra değilse kararı sadece satırın başı belirler (uzun tek
+        # satırlık SQL'de her parçada tüm satır kopyalanmaz)
+        limit = length if self.blank_before else self.line_start + self.LINE_HEAD
+        line_end = text.find('\n', self.line_start, limit)
+        line = text[self.line_start:limit if line_end == -1 else line_end]
+        if self._line_stops(line, complete=False):
+            self.end = self.line_start
+
+
+def stream_completion(prompt):
+    """
+    Ollama'dan akışlı üretim, SQL tamamlanınca bağlantıyı kapatıp üretimi durdur
+    Yields: ('token', metin) parçaları, en sonda ('sql', temizlenmiş SQL veya None)
+    """
+    parser = SqlStreamParser()
+    try:
+        response = llm_client.generate(prompt, stream=True, options={
+            "temperature": LLM_CONFIG['temperature'],
+            "num_predict": LLM_CONFIG['num_predict'],
+            "num_ctx": LLM_CONFIG['num_ctx']
+        })
+        try:
+            if response.status_code != 200:
+                print(f"LLM HTTP Error: {response.status_code}")
+                yield ('sql', None)
+                return
             
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                text = chunk.get('response', '')
+                if text:
+                    yield ('token', text)
+                if parser.feed(text) or chunk.get('done'):
+                    break
+        finally:
+            # Erken durdurma: bağlantı kapanınca Ollama üretimi keser
+            response.close()
+    
     except Exception as e:
         print(f"LLM Error: {e}")
+        yield ('sql', None)
+        return
+    
+    yield ('sql', clean_sql(parser.sql_text.strip()))
+
+
+_candidate_pool = None
+_candidate_pool_lock = threading.Lock()
+
+def _get_candidate_pool():
+    """Aday üretimleri için paylaşılan thread havuzu (HTTP havuzu kadar)"""
+    global _candidate_pool
+    if _candidate_pool is None:
+        with _candidate_pool_lock:
+            if _candidate_pool is None:
+                _candidate_pool = ThreadPoolExecutor(
+                    max_workers=LLM_CONFIG['pool_size'], thread_name_prefix='sql-candidate'
+                )
+    return _candidate_pool
+
+def check_candidate(sql, checked=None, conn=None):
+    """
+    Güvenlik doğrulaması + sunucuda derleme, Returns: hata mesajı veya None
+    checked: fingerprint → sonuç; aynı sorguyu üreten adaylar tekrar derlenmez
+    conn: açık bağlantı verilirse derleme onunla yapılır (adaylar tek bağlantı kullanır)
+    """
+    query = prepare_sql(sql)
+    if not query.is_valid:
+        return query.error
+    if LLM_CONFIG['compile_check'] == 'off':
         return None
+    if checked is not None and query.fingerprint in checked:
+        return checked[query.fingerprint]
+    from sql_ai.run_sql import compile_check
+    ok, error = compile_check(query, conn=conn)
+    error = None if ok else error
+    if checked is not None:
+        checked[query.fingerprint] = error
+    return error
+
+class CandidateSet:
+    """Devam eden aday üretimlerinin HTTP yanıtları; cancel() hepsini kapatır"""
+    
+    def __init__(self):
+        self.cancelled = threading.Event()
+        self._responses = {}
+        self._lock = threading.Lock()
+    
+    def register(self, index, response):
+        """Returns: False ise iptal edilmiş, yanıt kapatıldı"""
+        with self._lock:
+            if not self.cancelled.is_set():
+                self._responses[index] = response
+                return True
+        response.close()
+        return False
+    
+    def unregister(self, index):
+        with self._lock:
+            self._responses.pop(index, None)
+    
+    def cancel(self):
+        """Bağlantıları kapat: iter_lines hemen sonlanır, Ollama üretimi keser"""
+        with self._lock:
+            self.cancelled.set()
+            responses = list(self._responses.values())
+        for response in responses:
+            try:
+                response.close()
+            except Exception:
+                pass
+
+def _run_candidate(prompt, index, candidates):
+    """
+    Tek aday: farklı sıcaklık / seed ile akışlı üretim + güvenlik doğrulaması
+    candidates.cancel() yanıtı kapatır, üretim bir sonraki satırı beklemeden durur
+    Derleme kontrolü burada değil, seçimde sırayla yapılır
+    Returns: (sql veya None, hata veya None)
+    """
+    parser = SqlStreamParser()
+    options = {
+        "temperature": LLM_CONFIG['temperature'] + index * LLM_CONFIG['temperature_step'],
+        "seed": index + 1,
+        "num_predict": LLM_CONFIG['num_predict'],
+        "num_ctx": LLM_CONFIG['num_ctx']
+    }
+    try:
+        response = llm_client.generate(prompt, stream=True, options=options)
+        if not candidates.register(index, response):
+            return None, 'iptal'
+        try:
+            if response.status_code != 200:
+                return None, f"LLM HTTP {response.status_code}"
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if parser.feed(chunk.get('response', '')) or chunk.get('done'):
+                    break
+        finally:
+            candidates.unregister(index)
+            response.close()
+    except Exception as e:
+        return None, 'iptal' if candidates.cancelled.is_set() else str(e)
+    
+    if candidates.cancelled.is_set():
+        return None, 'iptal'
+    sql = clean_sql(parser.sql_text.strip())
+    if not sql:
+        return None, 'SQL bulunamadı'
+    query = prepare_sql(sql)
+    return sql, query.error
 
+def generate_candidates(prompt, count=None, budget=None):
+    """
+    count adet adayı eşzamanlı üret, doğrulama + derleme kontrolünü ilk geçeni döndür
+    Kalan adayların bağlantısı kapatılır; tümü durana kadar dönülmez (dağıtıcı slotu
+    gerçek Ollama yükünü gösterir). Derleme kontrolleri tamamlanma sırasıyla, tek
+    veritabanı bağlantısı üzerinden yapılır. Hiçbiri geçmezse (veya budget saniye
+    dolarsa) ilk tamamlanan aday döner; hata normal akıştaki gibi çalıştırmada görünür
+    """
+    count = count or LLM_CONFIG['candidates']
+    budget = budget or LLM_CONFIG['candidate_budget']
+    start = time.perf_counter()
+    candidates = CandidateSet()
+    pool = _get_candidate_pool()
+    futures = {pool.submit(_run_candidate, prompt, i, candidates): i for i in range(count)}
+    
+    checked = {}
+    conn = None
+    fallback = None
+    try:
+        for future in as_completed(futures, timeout=budget):
+            sql, error = future.result()
+            if sql and error is None and LLM_CONFIG['compile_check'] != 'off':
+                if conn is None:
+                    from sql_ai.run_sql import get_connection
+                    conn = get_connection() or False
+                error = check_candidate(sql, checked, conn) if conn else "Veritabanına bağlanılamadı"
+            if sql and error is None:
+                print(f"Aday {futures[future] + 1}/{count} kazandı ({time.perf_counter() - start:.1f} sn)")
+                return sql
+            print(f"Aday {futures[future] + 1}/{count} elendi: {error}")
+            fallback = fallback or sql
+    except FutureTimeout:
+        print(f"Aday süresi doldu ({budget} sn)")
+    finally:
+        candidates.cancel()
+        wait(futures)
+        if conn:
+            conn.close()
+    return fallback
 
 def learn_from_correction(question, wrong_sql, correct_sql):
-    """Kullanıcı düzeltmesinden öğren"""
+    """
+    Kullanıcı düzeltmesinden öğren
+    Soru, embedding komşuları ve yanlış SQL'i döndüren kayıtlar SQL cache'ten silinir
+    """
     save_correction(question, wrong_sql, correct_sql)
     add_learned_example(question, correct_sql)
+    forget_sql(question, wrong_sql)
     print(f"✓ Düzeltme öğrenildi: {question[:50]}...")
 
+def forget_sql(question, wrong_sql=None):
+    """Yanlış bulunan soruyu ve komşularını SQL cache'ten sil"""
+    cache = get_sql_cache()
+    if cache is not None:
+        removed = cache.invalidate(question, wrong_sql)
+        if removed:
+            print(f"SQL cache: {removed} kayıt geçersiz kılındı")
+
 def clean_sql(sql):
     """SQL'i temizle ve doğrula"""
     if not sql:
@@ -164,17 +719,18 @@ def clean_sql(sql):
             if line:
                 lines.append(line)
     
-    if not lines:
+    if lines:
+        text = ' '.join(lines)
+    else:
         # Alternatif: regex ile bul
         match = re.search(r'SELECT\s+.+', sql, re.IGNORECASE | re.DOTALL)
-        if match:
-            return re.sub(r'\s+', ' ', match.group(0)).strip().rstrip(';')
-        return None
-    
-    result = ' '.join(lines)
-    result = re.sub(r'\s+', ' ', result).strip().rstrip(';')
+        if not match:
+            return None
+        text = match.group(0)
     
-    return result if result.upper().startswith('SELECT') else None
+    # Tek ayrıştırma: kanonik metin döner, doğrulama / çalıştırma aynı sonucu cache'ten alır
+    query = prepare_sql(text)
+    return query.sql if query.tokens and query.tokens[0].upper == 'SELECT' else None
 
 
 if __name__ == '__main__':
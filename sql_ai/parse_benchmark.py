@@ -0,0 +1,212 @@
+"""
+SQL Ayrıştırma Ölçümü
+Eski yol (clean_sql regex'leri + /api/chat validate_sql + run_query validate_sql
++ sanitize_sql, her biri metni ayrı tarar) ile tek ayrıştırmalı yolu karşılaştır
+
+Girdi: örnek soruların SQL'leri, LLM çıktısı gibi markdown ve açıklama satırıyla.
+'tek (soğuk)' her turda cache'i boşaltır (ilk kez görülen sorgu), 'tek (sıcak)'
+cache'i korur (aynı sorgu tekrar geldiğinde).
+
+Ölçümden önce güvenlik eşleşmesi kontrol edilir: eski doğrulayıcının reddettiği
+her girdi (örnek SQL'ler + SECURITY_CASES) yeni yolda da reddedilmeli. Ayrıca her
+girdinin (ve kanonik metninin) sonucu daha önce ne doğrulandığından bağımsız
+olmalı (cache). Fark varsa çıkış kodu 1.
+
+Kullanım:
+    python sql_ai/parse_benchmark.py [tur sayısı]
+"""
+
+import os
+import re
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.db_config import SECURITY_CONFIG
+from sql_ai.nl_to_sql import clean_sql
+from sql_ai.sql_parser import parse_sql
+from sql_ai.sql_validator import prepare_sql, validate_sql, _parsed_cache
+
+
+# Önceki config'teki yasaklı kelimeler (OPENQUERY / OPENROWSET / OPENDATASOURCE sonradan eklendi)
+LEGACY_BLOCKED = ['DROP', 'DELETE', 'UPDATE', 'INSERT', 'TRUNCATE', 'ALTER', 'CREATE', 'EXEC']
+
+# Sınır durumları: string / köşeli parantez içi, sondaki ; ve boşluk, kapanmamış tırnak
+SECURITY_CASES = [
+    "SELECT * FROM T; DROP TABLE T",
+    "SELECT * FROM T WHERE A = 'a--b'",
+    "SELECT * FROM T WHERE A = 'x;y'",
+    "SELECT 'DROP' AS X",
+    "SELECT [DROP] FROM T",
+    "SELECT 1; \n",
+    "SELECT 1;;",
+    "SELECT 'a",
+    "SELECT [a",
+    "SELECT 1 /* x */",
+    "SELECT 1 -- x",
+    "SELECT * FROM OPENQUERY(LS, 'DELETE FROM T')",
+    "SELECT * FROM OPENQUERY(LS, 'SELECT 1')",
+    "SELECT * FROM OPENROWSET('SQLNCLI','x','EXEC xp_cmdshell ''dir''')",
+    "SELECT * FROM OPENDATASOURCE('SQLNCLI','x').db.dbo.T",
+    "SELECT * FROM master..xp_cmdshell",
+    "select 1 execute('x')",
+    "SELECT sp_executesql",
+    "SELECT* FROM T",
+    "select a from t",
+    "WITH x AS (SELECT 1) SELECT * FROM x",
+    "SELECT 1\x00; DROP",
+    "SELECT * FROM TOHOM_SIPARIS;  ",
+    "SELECT * FROM TOHOM_SIPARIS",
+    "   ",
+    "",
+]
+
+# Yeni yolda bilerek reddedilen (eskide geçen) girdiler bu kelimelerden birini içermeli
+NEWLY_BLOCKED = ('OPENQUERY', 'OPENROWSET', 'OPENDATASOURCE')
+
+
+def legacy_clean_sql(sql):
+    """Önceki clean_sql: satır döngüsü + regex ile boşluk temizliği"""
+    sql = sql.replace('```sql', '').replace('```', '')
+    lines = []
+    started = False
+    for line in sql.split('\n'):
+        line = line.strip()
+        if line.upper().startswith('SELECT'):
+            started = True
+        if started:
+            if line.startswith('--') or line.startswith('#'):
+                continue
+            if line.lower().startswith(('bu sorgu', 'açıklama', 'not:')):
+                break
+            if line:
+                lines.append(line)
+    result = re.sub(r'\s+', ' ', ' '.join(lines)).strip().rstrip(';')
+    return result if result.upper().startswith('SELECT') else None
+
+
+def legacy_validate(sql):
+    """Önceki SQLValidator.validate: büyük harf kopyası + anahtar kelime başına regex"""
+    if not sql:
+        return False
+    sql_upper = sql.upper().strip()
+    first_word = sql_upper.split()[0] if sql_upper.split() else ''
+    if first_word not in SECURITY_CONFIG['allowed_operations']:
+        return False
+    for keyword in LEGACY_BLOCKED:
+        if re.search(r'\b' + keyword + r'\b', sql_upper):
+            return False
+    if ';' in sql and sql.rstrip(';').count(';') > 0:
+        return False
+    if '--' in sql or '/*' in sql:
+        return False
+    for func in ['xp_cmdshell', 'sp_execute', 'exec(', 'execute(']:
+        if func.lower() in sql.lower():
+            return False
+    return True
+
+
+def legacy_sanitize(sql):
+    return re.sub(r'\s+', ' ', sql.rstrip(';').strip())
+
+
+def legacy_path(output):
+    sql = legacy_clean_sql(output)
+    legacy_validate(sql)  # /api/chat
+    legacy_validate(sql)  # run_query
+    return legacy_sanitize(sql)
+
+
+def parse_once_path(output):
+    sql = clean_sql(output)
+    query = prepare_sql(sql)  # /api/chat (clean_sql'in ayrıştırması cache'ten)
+    return query.sql          # run_query aynı nesneyi alır
+
+
+def cold_path(output):
+    _parsed_cache.clear()
+    return parse_once_path(output)
+
+
+def check_security_parity(inputs):
+    """
+    Eski doğrulayıcının reddettiği her girdi yeni yolda da reddedilmeli
+    Returns: (gevşeyen girdiler, beklenmeyen yeni retler)
+    """
+    loosened, tightened = [], []
+    for sql in inputs:
+        old_ok = legacy_validate(sql)
+        new_ok, _ = validate_sql(sql)
+        if new_ok and not old_ok:
+            loosened.append(sql)
+        elif old_ok and not new_ok and not any(k in sql.upper() for k in NEWLY_BLOCKED):
+            tightened.append(sql)
+    return loosened, tightened
+
+
+def check_cache_independence(inputs):
+    """
+    Aynı girdi, önce hangi girdiler doğrulanmış olursa olsun aynı sonucu almalı
+    Girdilerin kanonik metinleri de ayrı girdi olarak denenir (ileri ve geri sırayla)
+    Returns: sonucu cache'e göre değişen girdiler
+    """
+    inputs = list(dict.fromkeys(list(inputs) + [parse_sql(sql).sql for sql in inputs]))
+    fresh = {}
+    for sql in inputs:
+        _parsed_cache.clear()
+        fresh[sql] = validate_sql(sql)
+
+    differ = set()
+    for order in (inputs, inputs[::-1]):
+        _parsed_cache.clear()
+        for sql in order:
+            if validate_sql(sql) != fresh[sql]:
+                differ.add(sql)
+    _parsed_cache.clear()
+    return sorted(differ)
+
+
+def measure(path, outputs, rounds):
+    """Returns: sorgu başına ortalama mikrosaniye"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for output in outputs:
+            path(output)
+    return (time.perf_counter() - start) / (rounds * len(outputs)) * 1e6
+
+
+if __name__ == '__main__':
+    from finetuning.prepare_data import SEED_EXAMPLES
+
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    outputs = [f"```sql\n{ex['sql']};\n```\nBu sorgu {ex['question']}" for ex in SEED_EXAMPLES]
+
+    inputs = SECURITY_CASES + [ex['sql'] for ex in SEED_EXAMPLES]
+    loosened, tightened = check_security_parity(inputs)
+    print(f"Güvenlik eşleşmesi: {len(inputs)} girdi, gevşeyen {len(loosened)}, beklenmeyen ret {len(tightened)}")
+    for sql in loosened + tightened:
+        print(f"   ✗ {sql!r}")
+    if loosened or tightened:
+        sys.exit(1)
+
+    cache_dependent = check_cache_independence(inputs)
+    print(f"Cache bağımsızlığı: cache'e göre değişen sonuç {len(cache_dependent)}")
+    for sql in cache_dependent:
+        print(f"   ✗ {sql!r}")
+    if cache_dependent:
+        sys.exit(1)
+
+    # Aynı kanonik metni üretiyorlar mı (string içi boşluklar hariç)
+    differ = sum(1 for o in outputs if legacy_path(o) != parse_once_path(o))
+    print(f"{len(outputs)} sorgu, {rounds} tur, farklı çıktı: {differ}")
+
+    results = {
+        'eski': measure(legacy_path, outputs, rounds),
+        'tek (soğuk)': measure(cold_path, outputs, rounds),
+        'tek (sıcak)': measure(parse_once_path, outputs, rounds),
+    }
+    print(f"{'Yol':<14} {'µs / sorgu':>12}")
+    print('-' * 27)
+    for name, us in results.items():
+        print(f"{name:<14} {us:>12.1f}")
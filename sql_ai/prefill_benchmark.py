@@ -0,0 +1,112 @@
+"""
+Prompt Önek Cache Ölçümü
+Eski düzen (RAG context önce) ile sabit önekli düzeni Ollama'nın
+prompt_eval_count / prompt_eval_duration değerleriyle karşılaştır
+
+Her düzen için sorular sırayla gönderilir (num_predict=1, sadece prefill ölçülür).
+Sabit önekli düzende ilk sorudan sonraki istekler öneki KV cache'ten kullanır.
+
+Kullanım:
+    python sql_ai/prefill_benchmark.py [soru sayısı]
+    python sql_ai/prefill_benchmark.py --calibrate [soru sayısı]   # ERP_LLM_CHARS_PER_TOKEN önerisi
+"""
+
+import os
+import sys
+import uuid
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.db_config import LLM_CONFIG
+from sql_ai import llm_client
+from sql_ai.nl_to_sql import BASE_PATTERNS, SYSTEM_PROMPT, build_prompt, prompt_parts
+from learning.feedback_system import (
+    get_learned_examples,
+    format_examples_for_prompt,
+    format_corrections_for_prompt
+)
+
+
+def legacy_prompt(question):
+    """Önceki düzen: soruya özel context sabit bölümlerden önce (token bütçesi yok)"""
+    parts = prompt_parts(question)
+    examples_text = format_examples_for_prompt(get_learned_examples(limit=5))
+    return f"""{SYSTEM_PROMPT}
+
+## VERİTABANI BİLGİLERİ
+
+{parts['rag']['context']}
+
+{BASE_PATTERNS}
+
+{examples_text}
+
+{format_corrections_for_prompt(parts['corrections'])}
+
+---
+
+KULLANICI SORUSU: {question}
+
+---
+
+Yukarıdaki bilgileri ve özellikle DÜZELTMELER bölümünü dikkate alarak SQL sorgusu yaz.
+SADECE SQL kodunu yaz. Açıklama yapma, markdown kullanma.
+SELECT ile başla:"""
+
+
+def measure(build, questions):
+    """
+    Returns: [{'prompt_eval_count': ..., 'prompt_eval_ms': ...}, ...]
+    """
+    rows = []
+    for question in questions:
+        response = llm_client.generate(build(question), options={'num_predict': 1, 'num_ctx': LLM_CONFIG['num_ctx']})
+        response.raise_for_status()
+        data = response.json()
+        rows.append({
+            'prompt_eval_count': data.get('prompt_eval_count', 0),
+            'prompt_eval_ms': data.get('prompt_eval_duration', 0) / 1e6,
+        })
+    return rows
+
+
+def calibrate(questions):
+    """
+    Karakter / token oranını Ollama'nın kendi sayımından hesapla
+    Her prompt'un başına benzersiz bir satır eklenir: KV cache'ten gelen önek sayılmasın
+    """
+    prompts = [f"{uuid.uuid4().hex}\n{build_prompt(q)}" for q in questions]
+    rows = measure(lambda prompt: prompt, prompts)
+    chars = sum(len(p) for p in prompts)
+    tokens = sum(r['prompt_eval_count'] for r in rows)
+    return chars / tokens if tokens else None
+
+
+def print_comparison(results):
+    """Düzen başına ortalama (ilk istek hariç: cache henüz dolmadı)"""
+    print(f"{'Düzen':<10} {'Ort. token':>12} {'Ort. prefill ms':>16} {'İlk istek ms':>14}")
+    print('-' * 55)
+    for name, rows in results.items():
+        warm = rows[1:] or rows
+        avg_count = sum(r['prompt_eval_count'] for r in warm) / len(warm)
+        avg_ms = sum(r['prompt_eval_ms'] for r in warm) / len(warm)
+        print(f"{name:<10} {avg_count:>12.0f} {avg_ms:>16.1f} {rows[0]['prompt_eval_ms']:>14.1f}")
+
+
+if __name__ == '__main__':
+    from finetuning.prepare_data import SEED_EXAMPLES
+
+    args = [a for a in sys.argv[1:] if a != '--calibrate']
+    count = int(args[0]) if args else 10
+    questions = [ex['question'] for ex in SEED_EXAMPLES[:count]]
+
+    if '--calibrate' in sys.argv:
+        ratio = calibrate(questions)
+        print(f"Karakter / token: {ratio:.2f}  (mevcut ERP_LLM_CHARS_PER_TOKEN={LLM_CONFIG['chars_per_token']})")
+        sys.exit(0)
+
+    results = {
+        'eski': measure(legacy_prompt, questions),
+        'önek': measure(build_prompt, questions),
+    }
+    print_comparison(results)
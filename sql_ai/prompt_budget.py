@@ -0,0 +1,223 @@
+"""
+Token Bütçeli Prompt Oluşturma
+Soruya özel bölümler (düzeltmeler, JOIN ipuçları, tablo / kalıp dökümanları) öncelik
+ve ilgi sırasıyla LLM_CONFIG['prompt_budget'] token'a kadar doldurulur
+
+Token sayımı: LLM_CONFIG['tokenizer'] (HuggingFace tokenizer.json yolu) verilmişse
+yerel tokenizer, yoksa Ollama'nın prompt_eval_count değerine göre kalibre edilen
+karakter / token oranı (python sql_ai/prefill_benchmark.py --calibrate).
+Sığmayan tablo dökümanları satır ortasından değil kolon kolon kesilir.
+"""
+
+import math
+import os
+import sys
+import threading
+from collections import deque
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.db_config import LLM_CONFIG
+from rag.chunking import parse_table_document, SECTION_NAMES
+from rag.join_graph import format_join_hints
+
+# Sabit önek (sistem rolü, kurallar, örnekler) bütçenin en fazla bu kadarını kullanır
+STATIC_PREFIX_SHARE = 0.4
+
+# Bölüm öncelikleri (küçük = önce doldurulur)
+PRIORITY_CORRECTIONS = 0
+PRIORITY_JOIN_HINTS = 1
+PRIORITY_DOCUMENTS = 2
+
+# Kesilen tablolarda bölümlerin korunma sırası (örnek değerler ilk feda edilir)
+TRUNCATE_ORDER = ['columns', 'relations', 'samples']
+TRUNCATION_NOTE = "(... {dropped} satır bütçe nedeniyle çıkarıldı)"
+
+_tokenizer = None
+_tokenizer_lock = threading.Lock()
+
+
+def _load_tokenizer():
+    """tokenizer.json varsa yükle (tokenizers paketi opsiyonel), yoksa False"""
+    global _tokenizer
+    if _tokenizer is None:
+        with _tokenizer_lock:
+            if _tokenizer is None:
+                path = LLM_CONFIG['tokenizer']
+                tokenizer = False
+                if path:
+                    try:
+                        from tokenizers import Tokenizer
+                        tokenizer = Tokenizer.from_file(path)
+                    except Exception as e:
+                        print(f"Tokenizer yüklenemedi ({e}), tahmini sayım kullanılıyor")
+                _tokenizer = tokenizer
+    return _tokenizer
+
+
+def count_tokens(text):
+    """Metnin token sayısı (yerel tokenizer veya kalibre tahmin)"""
+    if not text:
+        return 0
+    tokenizer = _load_tokenizer()
+    if tokenizer:
+        return len(tokenizer.encode(text, add_special_tokens=False).ids)
+    return math.ceil(len(text) / LLM_CONFIG['chars_per_token'])
+
+
+def prompt_budget():
+    """Prompt için token bütçesi (0 = num_ctx - num_predict)"""
+    budget = LLM_CONFIG['prompt_budget']
+    if budget <= 0:
+        budget = LLM_CONFIG['num_ctx'] - LLM_CONFIG['num_predict']
+    return budget
+
+
+def static_prefix_budget():
+    return int(prompt_budget() * STATIC_PREFIX_SHARE)
+
+
+def truncate_table_document(doc, max_tokens):
+    """
+    Tablo dökümanını max_tokens'a sığdır: başlık korunur, bölümler TRUNCATE_ORDER
+    sırasıyla satır satır (kolon kolon) eklenir, atılan satır sayısı not edilir
+    Returns: (metin veya None, atılan satır sayısı) - başlık bile sığmıyorsa None
+    """
+    header, sections = parse_table_document(doc)
+    # Kesme notu için yer ayır
+    max_tokens -= count_tokens(TRUNCATION_NOTE.format(dropped=999))
+    used = count_tokens(header)
+    if used > max_tokens:
+        return None, sum(len(lines) for _, _, lines in sections)
+
+    rank = {name: i for i, name in enumerate(TRUNCATE_ORDER)}
+    kept = {}
+    dropped = 0
+    full = False
+    for section, title, lines in sorted(sections, key=lambda s: rank.get(s[0], len(rank))):
+        for line in lines:
+            cost = count_tokens(line) + 1
+            if full or used + cost > max_tokens:
+                full = True
+                dropped += 1
+                continue
+            kept.setdefault(title, []).append(line)
+            used += cost
+
+    parts = [header]
+    for section, title, lines in sections:
+        if title in kept:
+            parts.append(f"\n## {title}\n" + '\n'.join(kept[title]))
+    if dropped:
+        parts.append(TRUNCATION_NOTE.format(dropped=dropped))
+    return '\n'.join(parts), dropped
+
+
+def _is_table_document(doc):
+    return any(f"\n## {title}" in doc for title in SECTION_NAMES)
+
+
+def assemble_sections(rag_result, corrections, fixed_tokens, format_corrections):
+    """
+    Soruya özel bölümleri bütçeye göre seç
+    fixed_tokens: sabit önek + soru + talimatların token sayısı
+    format_corrections: düzeltme listesini prompt metnine çeviren fonksiyon
+    Returns: (context metni, düzeltme metni, kullanım)
+    """
+    budget = prompt_budget()
+    remaining = budget - fixed_tokens
+    usage = {'budget': budget, 'fixed': fixed_tokens, 'corrections': 0, 'join_hints': 0,
+             'documents': 0, 'dropped': [], 'truncated': []}
+
+    # Öncelik, ilgi sırası (liste sırası), içerik
+    items = [(PRIORITY_CORRECTIONS, i, 'corrections', corr) for i, corr in enumerate(corrections)]
+    if rag_result.get('join_hints'):
+        items.append((PRIORITY_JOIN_HINTS, 0, 'join_hints', rag_result['join_hints']))
+    items += [(PRIORITY_DOCUMENTS, i, 'documents', doc) for i, doc in enumerate(rag_result.get('documents', []))]
+    items.sort(key=lambda item: item[:2])
+
+    chosen_corrections, hints_text, documents = [], '', []
+    for _, _, section, item in items:
+        if section == 'corrections':
+            text = format_corrections([item])
+            cost = count_tokens(text)
+            if chosen_corrections:
+                # Bölüm başlığı bir kez yazılır
+                cost -= count_tokens(text.split('\n', 1)[0])
+            if cost <= remaining:
+                chosen_corrections.append(item)
+            else:
+                usage['dropped'].append(f"düzeltme: {item['question'][:40]}")
+                continue
+        elif section == 'join_hints':
+            text = format_join_hints(item)
+            cost = count_tokens(text)
+            if cost > remaining:
+                usage['dropped'].append('join_hints')
+                continue
+            hints_text = text
+        else:
+            text = item['text']
+            cost = count_tokens(text)
+            label = item.get('name') or item.get('type') or 'döküman'
+            if cost > remaining:
+                if not _is_table_document(text):
+                    usage['dropped'].append(label)
+                    continue
+                text, removed = truncate_table_document(text, remaining)
+                if text is None:
+                    usage['dropped'].append(label)
+                    continue
+                cost = count_tokens(text)
+                usage['truncated'].append(f"{label} (-{removed} satır)")
+            documents.append(text)
+        usage[section] += cost
+        remaining -= cost
+
+    context_parts = documents + ([hints_text] if hints_text else [])
+    context = '\n\n---\n\n'.join(context_parts)
+    return context, format_corrections(chosen_corrections), usage
+
+
+# ---------- Kullanım kaydı ----------
+
+_recent_usage = deque(maxlen=200)
+_usage_lock = threading.Lock()
+
+
+def record_usage(usage):
+    """İstek başına bölüm token kullanımını kaydet ve logla"""
+    with _usage_lock:
+        _recent_usage.append(usage)
+    line = ', '.join(f"{k}={usage[k]}" for k in ('fixed', 'corrections', 'join_hints', 'documents', 'total'))
+    print(f"Prompt token: {line} / bütçe {usage['budget']}")
+    stages = usage.get('stages_ms')
+    if stages:
+        line = ', '.join(f"{k}={stages[k]}" for k in ('rag', 'prefix', 'corrections', 'total'))
+        print(f"Context aşamaları (ms): {line}" + (f"  Eksik: {stages['degraded']}" if stages['degraded'] else ''))
+    if usage['truncated'] or usage['dropped']:
+        print(f"  Kesilen: {usage['truncated']}  Çıkarılan: {usage['dropped']}")
+
+
+def get_usage_stats():
+    """Son isteklerin bölüm başına ortalama token kullanımı ve context aşama süreleri (/api/stats için)"""
+    with _usage_lock:
+        rows = list(_recent_usage)
+    if not rows:
+        return {'requests': 0}
+    keys = ('fixed', 'corrections', 'join_hints', 'documents', 'total')
+    stages = [r['stages_ms'] for r in rows if r.get('stages_ms')]
+    stage_avg = {}
+    for k in ('rag', 'prefix', 'corrections', 'total'):
+        values = [st[k] for st in stages if st.get(k) is not None]
+        stage_avg[k] = round(sum(values) / len(values), 1) if values else None
+    return {
+        'requests': len(rows),
+        'budget': rows[-1]['budget'],
+        'avg': {k: round(sum(r[k] for r in rows) / len(rows), 1) for k in keys},
+        'max_total': max(r['total'] for r in rows),
+        'truncated_requests': sum(1 for r in rows if r['truncated'] or r['dropped']),
+        'avg_stage_ms': stage_avg,
+        'degraded_requests': sum(1 for st in stages if st['degraded']),
+        'last': rows[-1]
+    }
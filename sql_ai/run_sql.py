@@ -7,8 +7,8 @@ import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from config.db_config import get_connection_string, SECURITY_CONFIG
-from sql_ai.sql_validator import validate_sql, sanitize_sql
+from config.db_config import get_connection_string, SECURITY_CONFIG, LLM_CONFIG
+from sql_ai.sql_validator import prepare_sql
 
 def get_connection():
     """Veritabanı bağlantısı"""
@@ -21,16 +21,17 @@ def get_connection():
 def run_query(sql):
     """
     SQL sorgusunu çalıştır
+    sql: metin veya prepare_sql sonucu (ParsedQuery, tekrar ayrıştırılmaz)
     Returns: (results, columns, error)
     """
     
     # 1. Güvenlik kontrolü
-    is_valid, error = validate_sql(sql)
-    if not is_valid:
-        return None, None, error
+    query = prepare_sql(sql)
+    if not query.is_valid:
+        return None, None, query.error
     
-    # 2. SQL'i temizle
-    sql = sanitize_sql(sql)
+    # 2. Temizlenmiş (kanonik) metin
+    sql = query.sql
     
     # 3. Bağlantı kur
     conn = get_connection()
@@ -59,6 +60,43 @@ def run_query(sql):
         conn.close()
         return None, None, str(e)
 
+def compile_check(sql, mode=None, conn=None):
+    """
+    Sorguyu çalıştırmadan sunucuda derle
+    mode: 'noexec' (SET NOEXEC ON: sözdizimi + derleme) veya
+          'describe' (sp_describe_first_result_set: tablo / kolon adları da çözülür)
+    conn: verilirse bu bağlantı kullanılır ve kapatılmaz (art arda kontroller için)
+    Returns: (ok, error)
+    """
+    mode = mode or LLM_CONFIG['compile_check']
+    query = prepare_sql(sql)
+    if not query.is_valid:
+        return False, query.error
+    sql = query.sql
+    
+    owned = conn is None
+    if owned:
+        conn = get_connection()
+    if not conn:
+        return False, "Veritabanına bağlanılamadı"
+    
+    try:
+        cursor = conn.cursor()
+        if mode == 'describe':
+            cursor.execute("EXEC sp_describe_first_result_set @tsql = ?", sql)
+        else:
+            cursor.execute("SET NOEXEC ON")
+            try:
+                cursor.execute(sql)
+            finally:
+                cursor.execute("SET NOEXEC OFF")
+        return True, None
+    except Exception as e:
+        return False, str(e)
+    finally:
+        if owned:
+            conn.close()
+
 def format_results(results, columns):
     """Sonuçları tablo formatında göster"""
     if not results:
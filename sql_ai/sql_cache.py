@@ -0,0 +1,378 @@
+"""
+Soru → SQL Cache
+Doğrulanmış ve hatasız çalışmış SQL'leri kalıcı olarak saklar; hit olursa LLM hiç çağrılmaz
+
+İki arama:
+1. Birebir: normalize edilmiş soru metni (dict araması)
+2. Semantik: soru embedding'leri arasında en yakın komşu, benzerlik >= eşik
+
+Semantik eşleşmede sorudaki sayılar, tarih kelimeleri ("bugün" / "dün", "2024") ve
+firma / özel adlar ("Daikin" / "Bosch") aynı olmalıdır; bunlar embedding'de birbirine
+çok yakın düşer ama farklı SQL üretir.
+Düzeltme kaydedilince soru ve eşik üstü komşuları cache'ten silinir.
+"""
+
+import json
+import os
+import re
+import sys
+import threading
+from datetime import datetime
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.db_config import SQL_CACHE_CONFIG
+from rag.cache import normalize_question
+from sql_ai.intent_templates import LEADING_WORDS, _find_firm
+
+# Semantik eşleşmede birebir aynı olması gereken kelimeler
+DATE_WORDS = {
+    'bugün', 'bugünkü', 'dün', 'dünkü', 'yarın', 'hafta', 'haftaki', 'haftalık',
+    'ay', 'ayki', 'aylık', 'yıl', 'yılki', 'yıllık', 'sene', 'geçen', 'önceki',
+    'bu', 'son', 'ilk', 'en', 'çok', 'az', 'fazla', 'yüksek', 'düşük'
+}
+
+
+def question_entities(question):
+    """
+    Sorudaki firma / özel adlar (normalize kelimeler)
+    Büyük harfli firma adı (intent_templates), cümle başı dışında büyük harfle başlayan
+    kelimeler ve küçük harfle yazılmış "x firması"
+    """
+    key = normalize_question(question)
+    names = {w for w in re.findall(r'(\w+) firma\w*', key) if w not in LEADING_WORDS and not w.isdigit()}
+    firm, _ = _find_firm(question)
+    if firm:
+        names.update(normalize_question(firm).split())
+    for word in (question or '').split()[1:]:
+        if word[:1].isupper():
+            names.update(w for w in normalize_question(word).split()[:1] if w not in LEADING_WORDS)
+    return names
+
+
+def question_signature(question):
+    """Normalize sorudaki sayılar, tarih / sıralama kelimeleri ve firma / özel adlar"""
+    key = normalize_question(question)
+    words = sorted(w for w in key.split() if w in DATE_WORDS or re.fullmatch(r'\d+', w))
+    return words, sorted(question_entities(question))
+
+
+def _default_embedder(keys):
+    """RAG modeliyle normalize soruları embed et (embedding cache'i paylaşılır)"""
+    from rag.query_rag import get_vector_db, embed_questions
+    db = get_vector_db()
+    return db.model_name, embed_questions(db, keys)
+
+
+class SqlCache:
+    """Thread-safe, JSON satır günlüğüne yazılan soru → SQL cache'i"""
+
+    def __init__(self, path=None, threshold=None, max_entries=None, embedder=None):
+        self.path = path or SQL_CACHE_CONFIG['path']
+        self.threshold = SQL_CACHE_CONFIG['threshold'] if threshold is None else threshold
+        self.max_entries = max_entries or SQL_CACHE_CONFIG['max_entries']
+        self.embedder = embedder or _default_embedder
+        self._lock = threading.Lock()
+        self._entries = None  # key → kayıt (ekleme sırasıyla)
+        self._inode = None  # okunan dosya (compaction sonrası değişir)
+        self._offset = 0  # okunan bayt sayısı (sonrası başka worker'ların ekledikleri)
+        self._records = 0  # dosyadaki kayıt satırı sayısı
+        self._model = None
+        self._reembedding = False  # model değişimi sonrası yeniden embed sürüyor
+        self._keys = []
+        self._matrix = None
+        self.hits = {'exact': 0, 'semantic': 0}
+        self.misses = 0
+
+    # ---------- Kalıcılık ----------
+    # Dosya satır satır JSON kayıt günlüğüdür: ilk satır tam görüntü
+    # {'model', 'entries'} (eski tek nesnelik dosya biçimiyle aynı), sonrakiler
+    # {'set': kayıt} / {'del': [anahtarlar]}. Her store / invalidate sadece kendi
+    # satırını ekler (dosya yeniden yazılmaz); worker'lar dosyanın sadece yeni
+    # kısmını okur. Eskimiş satırlar kayıt sayısını geçince görüntü yeniden yazılır.
+
+    def _reset(self):
+        self._entries = {}
+        self._model = None
+        self._inode = None
+        self._offset = 0
+        self._records = 0
+        self._matrix = None
+
+    def _apply(self, record):
+        if 'entries' in record:
+            self._model = record.get('model')
+            self._entries = {e['key']: e for e in record['entries']}
+        elif 'set' in record:
+            entry = record['set']
+            self._entries.pop(entry['key'], None)
+            self._entries[entry['key']] = entry
+        else:
+            for key in record.get('del', []):
+                self._entries.pop(key, None)
+        self._records += 1
+
+    def _load(self):
+        """Dosyada yeni satır varsa uygula; dosya değiştirildiyse (compaction) baştan oku"""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            if self._entries is None or self._inode is not None:
+                self._reset()
+            return
+        if self._entries is not None and st.st_ino == self._inode and st.st_size == self._offset:
+            return
+        if self._entries is None or st.st_ino != self._inode or st.st_size < self._offset:
+            self._reset()
+
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        lines = data[:end].splitlines()
+        legacy = False
+        rest = data[end:]
+        if rest.strip():
+            # Satır sonu olmayan son kayıt: eski biçimli dosya veya yazılmakta olan satır
+            try:
+                json.loads(rest)
+                lines.append(rest)
+                end = len(data)
+                legacy = True
+            except ValueError:
+                pass
+        for line in lines:
+            if line.strip():
+                self._apply(json.loads(line))
+        self._inode = st.st_ino
+        self._offset += end
+        self._matrix = None
+        if legacy:
+            # Eski biçim: ekleme yapılmadan önce satır sonlu görüntüye çevrilir
+            self._save()
+
+    def _append(self, *records):
+        """Kayıtları tek write ile dosya sonuna ekle (O_APPEND: worker'lar arası satırlar karışmaz)"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        data = ''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in records).encode('utf-8')
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+        # Kendi satırlarımız bellekte uygulandı; sonraki _load onları yeniden (aynı
+        # sonuçla) okur ve sayar. Compaction sırasında başka worker'ın eklediği satır
+        # kaybolabilir (cache: en kötü ihtimalle bir kayıt eksik kalır)
+        if self._records + len(records) > 2 * len(self._entries) + 64:
+            self._load()
+            self._save()
+
+    def _save(self):
+        """Tam görüntüyü geçici dosyaya yaz, atomik olarak değiştir (yarım dosya okunmaz)"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'model': self._model, 'entries': list(self._entries.values())}, f, ensure_ascii=False)
+            f.write('\n')
+        os.replace(tmp, self.path)
+        st = os.stat(self.path)
+        self._inode, self._offset, self._records = st.st_ino, st.st_size, 1
+
+    # ---------- Embedding ----------
+    # Embedding'ler lock dışında hesaplanır; lock sadece kayıtları okurken /
+    # değiştirirken tutulur (yavaş model çağrısı diğer lookup'ları bekletmez)
+
+    def _embed(self, key):
+        """
+        Embedding alınamazsa (indeks yok, model yüklenemedi) vektör None: sadece birebir arama
+        Returns: (model, vektör)
+        """
+        try:
+            model, vectors = self.embedder([key])
+            return model, vectors[0]
+        except Exception as e:
+            print(f"SQL cache embedding hatası: {e}")
+            return None, None
+
+    def _refresh_model(self, model):
+        """
+        Model değiştiyse eski vektörler karşılaştırılamaz: kayıtlar lock dışında
+        yeniden embed edilir, vektörler tek seferde değiştirilir
+        """
+        with self._lock:
+            self._load()
+            if model == self._model or self._reembedding:
+                return
+            self._reembedding = True
+            stale = list(self._entries)
+        try:
+            fresh = self.embedder(stale)[1] if stale else []
+        except Exception as e:
+            print(f"SQL cache embedding hatası: {e}")
+            fresh = None
+        with self._lock:
+            self._reembedding = False
+            if fresh is None:
+                return
+            self._load()
+            for key, vec in zip(stale, fresh):
+                # Arada silinen kayıt atlanır; arada eklenenler zaten yeni modelle
+                if key in self._entries:
+                    self._entries[key]['vector'] = vec.tolist()
+            self._model = model
+            self._matrix = None
+            self._save()
+
+    def _embed_current(self, key):
+        """Vektörü al, model değiştiyse önce kayıtları güncelle, Returns: (model, vektör)"""
+        model, vector = self._embed(key)
+        if vector is not None:
+            self._refresh_model(model)
+        return model, vector
+
+    def _neighbour_matrix(self):
+        if self._matrix is None:
+            self._keys = [k for k, e in self._entries.items() if e.get('vector')]
+            self._matrix = (np.asarray([self._entries[k]['vector'] for k in self._keys], dtype=np.float32)
+                            if self._keys else None)
+        return self._matrix
+
+    def _neighbours(self, vector, threshold):
+        """Benzerliği eşik üstü kayıtlar, Returns: [(key, skor), ...] azalan"""
+        matrix = self._neighbour_matrix()
+        if matrix is None:
+            return []
+        scores = matrix @ np.asarray(vector, dtype=np.float32)
+        order = np.argsort(-scores)
+        return [(self._keys[i], float(scores[i])) for i in order if scores[i] >= threshold]
+
+    # ---------- API ----------
+
+    def lookup(self, question):
+        """
+        Returns: {'sql', 'question', 'match': 'exact' | 'semantic', 'score'} veya None
+        """
+        key = normalize_question(question)
+        if not key:
+            return None
+        with self._lock:
+            self._load()
+            hit = self._exact(key)
+            if hit is not None:
+                return hit
+            semantic = bool(self._entries) and self.threshold > 0
+
+        model, vector = self._embed_current(key) if semantic else (None, None)
+        with self._lock:
+            self._load()
+            hit = self._exact(key)
+            if hit is not None:
+                return hit
+            if vector is not None and model == self._model:
+                signature = question_signature(question)
+                for other, score in self._neighbours(vector, self.threshold):
+                    entry = self._entries[other]
+                    if question_signature(entry['question']) == signature:
+                        self.hits['semantic'] += 1
+                        return {'sql': entry['sql'], 'question': entry['question'],
+                                'match': 'semantic', 'score': round(score, 4)}
+
+            self.misses += 1
+            return None
+
+    def _exact(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self.hits['exact'] += 1
+        return {'sql': entry['sql'], 'question': entry['question'], 'match': 'exact', 'score': 1.0}
+
+    def store(self, question, sql):
+        """Doğrulanmış ve hatasız çalışmış SQL'i kaydet"""
+        key = normalize_question(question)
+        if not key or not sql:
+            return
+        with self._lock:
+            self._load()
+            current = self._entries.get(key)
+            if current is not None and current['sql'] == sql and current.get('vector'):
+                return
+
+        model, vector = self._embed_current(key)
+        with self._lock:
+            self._load()
+            # Arada model yine değiştiyse vektör yazılmaz (sonraki store tamamlar)
+            if model != self._model:
+                vector = None
+            entry = {
+                'key': key,
+                'question': question,
+                'sql': sql,
+                'created_at': datetime.now().isoformat(),
+                'vector': None if vector is None else [round(float(v), 6) for v in vector]
+            }
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            # Limit aşılırsa en eski kayıtları at
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                evicted.append(next(iter(self._entries)))
+                del self._entries[evicted[-1]]
+            self._matrix = None
+            self._append({'set': entry}, *([{'del': evicted}] if evicted else []))
+
+    def invalidate(self, question, sql=None):
+        """
+        Soruyu ve embedding komşularını sil (aynı eşikle)
+        sql verilirse bu SQL'i döndüren diğer kayıtlar da silinir (yanlış SQL)
+        Returns: silinen kayıt sayısı
+        """
+        key = normalize_question(question)
+        with self._lock:
+            self._load()
+            if not self._entries:
+                return 0
+
+        model, vector = self._embed_current(key) if key and self.threshold > 0 else (None, None)
+        with self._lock:
+            self._load()
+            doomed = {key} & set(self._entries)
+            if sql:
+                doomed |= {k for k, e in self._entries.items() if e['sql'] == sql}
+            if vector is not None and model == self._model:
+                doomed |= {k for k, _ in self._neighbours(vector, self.threshold)}
+            for k in doomed:
+                del self._entries[k]
+            if doomed:
+                self._matrix = None
+                self._append({'del': sorted(doomed)})
+            return len(doomed)
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+            self._matrix = None
+            self._save()
+
+    def stats(self):
+        with self._lock:
+            self._load()
+            return {'entries': len(self._entries), 'hits': dict(self.hits), 'misses': self.misses}
+
+
+_sql_cache = None
+_sql_cache_lock = threading.Lock()
+
+
+def get_sql_cache():
+    """Süreç başına tek SqlCache, kapalıysa None"""
+    global _sql_cache
+    if not SQL_CACHE_CONFIG['enabled']:
+        return None
+    if _sql_cache is None:
+        with _sql_cache_lock:
+            if _sql_cache is None:
+                _sql_cache = SqlCache()
+    return _sql_cache
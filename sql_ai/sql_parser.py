@@ -0,0 +1,252 @@
+"""
+T-SQL Ayrıştırıcı
+Sorgu metni tek geçişte token'lara ayrılır; temizleme, güvenlik kontrolü ve
+çalıştırma aynı ParsedQuery nesnesini kullanır (her adım metni yeniden taramaz)
+
+ParsedQuery:
+    sql          → kanonik metin (boşluklar tek, sondaki ; yok, string içleri korunur)
+    tokens       → anlamlı token'lar (boşluk hariç)
+    tables       → FROM / JOIN ile başvurulan tablolar (büyük harf)
+    columns      → başvurulan kolonlar, alias'lar tabloya çözülür (yaklaşık)
+    fingerprint  → büyük/küçük harf ve boşluktan bağımsız sorgu özeti
+    error        → güvenlik hatası (sql_validator doldurur), geçerliyse None
+"""
+
+import hashlib
+import re
+from collections import namedtuple
+
+Token = namedtuple('Token', ['kind', 'value', 'upper'])
+
+# Boşluklar ayrı token olmaz: her eşleşme önündeki boşluğu da yutar (kanonik metin
+# için start(lastgroup) > start() ile bilinir). Sık görülen türler önce denenir.
+TOKEN_PATTERN = re.compile(r"""
+    \s*(?:
+        (?P<word>(?![Nn]')\#{0,2}[^\W\d]\w*)
+      | (?P<op><>|!=|>=|<=|!<|!>|[+*%=<>(),.;~&|^]|-(?!-)|/(?!\*))
+      | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+      | (?P<string>[Nn]?'(?:[^']|'')*')
+      | (?P<bracket>\[(?:[^\]]|\]\])*\])
+      | (?P<quoted>"(?:[^"]|"")*")
+      | (?P<line_comment>--[^\n]*)
+      | (?P<block_comment>/\*.*?(?:\*/|\Z))
+      | (?P<variable>@@?\w+)
+      | (?P<bad_string>[Nn]?'.*)
+      | (?P<bad_ident>[\["].*)
+      | (?P<other>\S)
+    )
+""", re.VERBOSE | re.DOTALL)
+
+COMMENT_KINDS = ('line_comment', 'block_comment')
+IDENT_KINDS = ('word', 'bracket', 'quoted')
+
+# Tablo / kolon adı olamayan kelimeler (kolon tespiti için)
+KEYWORDS = frozenset("""
+    ADD ALL AND ANY APPLY AS ASC BETWEEN BY CASE CROSS CURRENT_DATE CURRENT_TIMESTAMP
+    DESC DISTINCT ELSE END ESCAPE EXCEPT EXISTS FETCH FIRST FOR FROM FULL GROUP HAVING
+    IN INNER INTERSECT INTO IS JOIN LEFT LIKE NEXT NOT NULL OFFSET ON ONLY OPTION OR
+    ORDER OUTER OVER PARTITION PERCENT RIGHT ROW ROWS SELECT SET SOME THEN TIES TOP
+    UNION UNBOUNDED PRECEDING FOLLOWING VALUES WHEN WHERE WITH NOLOCK READUNCOMMITTED
+    INT BIGINT SMALLINT TINYINT BIT DECIMAL NUMERIC FLOAT REAL MONEY DATE DATETIME
+    DATETIME2 TIME CHAR VARCHAR NCHAR NVARCHAR MAX
+    YEAR MONTH DAY QUARTER WEEK HOUR MINUTE SECOND DAYOFYEAR WEEKDAY ISO_WEEK
+    YY YYYY QQ MM DD DY WK HH MI SS
+""".split())
+
+# Bu kelimeler FROM listesini bitirir
+FROM_END = frozenset(['WHERE', 'GROUP', 'ORDER', 'HAVING', 'UNION', 'EXCEPT', 'INTERSECT', 'OPTION', 'ON'])
+
+
+class ParsedQuery:
+    """
+    Bir kez ayrıştırılmış sorgu (doğrulanıp cache'e girdikten sonra değiştirilmez)
+    tables / columns / fingerprint ilk erişimde hesaplanır, sonra saklanır
+    """
+
+    __slots__ = ('source', 'sql', 'tokens', 'error', '_references', '_fingerprint')
+
+    def __init__(self, source, sql, tokens, error=None):
+        self.source = source
+        self.sql = sql
+        self.tokens = tokens
+        self.error = error
+        self._references = None
+        self._fingerprint = None
+
+    @property
+    def is_valid(self):
+        return self.error is None
+
+    @property
+    def tables(self):
+        if self._references is None:
+            self._references = _references(self.tokens)
+        return self._references[0]
+
+    @property
+    def columns(self):
+        if self._references is None:
+            self._references = _references(self.tokens)
+        return self._references[1]
+
+    @property
+    def fingerprint(self):
+        if self._fingerprint is None:
+            self._fingerprint = _fingerprint(self.tokens)
+        return self._fingerprint
+
+    def __repr__(self):
+        status = 'geçerli' if self.error is None else self.error
+        return f"<ParsedQuery {self.fingerprint} {status}: {self.sql[:60]}>"
+
+
+def tokenize(sql):
+    """
+    Tek geçişte token listesi
+    Returns: (token'lar, önünde boşluk olanların konumları)
+    """
+    new = tuple.__new__  # Token(...) çağrısından hızlı
+    tokens, spaced = [], []
+    for m in TOKEN_PATTERN.finditer(sql):
+        kind = m.lastgroup
+        value = m.group(kind)
+        if m.start(kind) > m.start():
+            spaced.append(len(tokens))
+        tokens.append(new(Token, (kind, value, value.upper() if kind == 'word' else value)))
+    return tokens, spaced
+
+
+def ident_name(token):
+    """[ad] / "ad" / ad → AD"""
+    if token.kind == 'bracket':
+        return token.value[1:-1].replace(']]', ']').upper()
+    if token.kind == 'quoted':
+        return token.value[1:-1].replace('""', '"').upper()
+    return token.upper
+
+
+def _is_name(token):
+    return token.kind in ('bracket', 'quoted') or (token.kind == 'word' and token.upper not in KEYWORDS)
+
+
+def _read_name(tokens, i):
+    """
+    i konumundan çok parçalı adı oku (dbo.TABLO, S.TARIH, [dbo].[X], T.*)
+    Returns: (parçalar, sonraki konum)
+    """
+    parts = [ident_name(tokens[i])]
+    i += 1
+    while i + 1 < len(tokens) and tokens[i].value == '.':
+        nxt = tokens[i + 1]
+        if nxt.kind in IDENT_KINDS or nxt.value == '*':
+            parts.append(ident_name(nxt))
+            i += 2
+        elif nxt.value == '.':
+            # master..tablo (varsayılan şema)
+            i += 1
+        else:
+            break
+    return parts, i
+
+
+def _references(tokens):
+    """
+    Tablo ve kolon başvuruları (yaklaşık, sorgu planı için değil bilgi için)
+    Returns: (tablolar, kolonlar)
+    """
+    tables, aliases, output_aliases = [], {}, set()
+    names = []  # (parçalar, fonksiyon mu)
+    depth = 0
+    from_depths = []
+    expect_table = False
+    n = len(tokens)
+    i = 0
+    while i < n:
+        tok = tokens[i]
+        if tok.value == '(':
+            depth += 1
+        elif tok.value == ')':
+            depth -= 1
+            while from_depths and from_depths[-1] > depth:
+                from_depths.pop()
+        elif tok.kind == 'word' and tok.upper in ('FROM', 'JOIN', 'APPLY'):
+            expect_table = True
+            if tok.upper == 'FROM':
+                from_depths.append(depth)
+        elif tok.kind == 'word' and tok.upper in FROM_END:
+            if from_depths and from_depths[-1] == depth:
+                from_depths.pop()
+        elif tok.value == ',' and from_depths and from_depths[-1] == depth:
+            expect_table = True
+
+        if tok.kind in IDENT_KINDS and (tok.kind != 'word' or _is_name(tok)):
+            parts, j = _read_name(tokens, i)
+            after_as = i > 0 and tokens[i - 1].upper == 'AS'
+            is_func = j < n and tokens[j].value == '('
+            if expect_table and not is_func:
+                table = '.'.join(parts)
+                tables.append(table)
+                aliases[parts[-1]] = table
+                # Alias: [AS] ad
+                k = j + 1 if j < n and tokens[j].upper == 'AS' else j
+                if k < n and _is_name(tokens[k]) and not (k + 1 < n and tokens[k + 1].value == '.'):
+                    aliases[ident_name(tokens[k])] = table
+                    j = k + 1
+            elif after_as and len(parts) == 1:
+                output_aliases.add(parts[0])
+            elif i > 0 and tokens[i - 1].value == ')' and from_depths and from_depths[-1] == depth:
+                # Türetilmiş tablo alias'ı: FROM (SELECT ...) X
+                aliases[parts[0]] = parts[0]
+            else:
+                names.append((parts, is_func))
+            expect_table = False
+            i = j
+            continue
+        if tok.value != '(':
+            expect_table = expect_table and tok.upper in ('FROM', 'JOIN', 'APPLY', ',')
+        i += 1
+
+    single = tables[0] if len(set(tables)) == 1 else None
+    columns = []
+    for parts, is_func in names:
+        if is_func:
+            continue
+        if len(parts) > 1:
+            qualifier = parts[-2]
+            columns.append(f"{aliases.get(qualifier, qualifier)}.{parts[-1]}")
+        else:
+            name = parts[0]
+            if name in aliases or name in output_aliases:
+                continue
+            columns.append(f"{single}.{name}" if single else name)
+    return tuple(dict.fromkeys(tables)), tuple(dict.fromkeys(columns))
+
+
+def _fingerprint(tokens):
+    """Kelimeler büyük harf, diğer token'lar olduğu gibi: 'select  a' ile 'SELECT a' aynı"""
+    text = ' '.join(t.upper if t.kind == 'word' else t.value for t in tokens)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+def parse_sql(sql):
+    """
+    Sorgu metnini ayrıştır (güvenlik kuralları sql_validator'da)
+    Kapanmamış tırnak / köşeli parantez metnin sonuna kadar tek token olur;
+    sorguyu reddetmek sunucunun işi (sözdizimi hatası döner)
+    Returns: ParsedQuery
+    """
+    source = sql or ''
+    tokens, spaced = tokenize(source)
+    # Sondaki ; (birden fazla olabilir) kanonik metne girmez
+    while tokens and tokens[-1].value == ';':
+        tokens.pop()
+    tokens = tuple(tokens)
+
+    # Kanonik metin: token'lar arası boşluk tek, string içleri korunur
+    parts = [t.value for t in tokens]
+    for i in spaced:
+        if 0 < i < len(parts):
+            parts[i] = ' ' + parts[i]
+    canonical = ''.join(parts)
+
+    return ParsedQuery(source, canonical, tokens)
@@ -1,6 +1,10 @@
 """
 SQL Güvenlik Kontrolü
 Zararlı sorguları engelle
+
+Sorgu bir kez ayrıştırılır (sql_parser) ve kurallardan bir kez geçer.
+prepare_sql sonucu cache'lenir: clean_sql, /api/chat doğrulaması ve run_query
+aynı metin için aynı ParsedQuery nesnesini kullanır.
 """
 
 import re
@@ -9,69 +13,103 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config.db_config import SECURITY_CONFIG
+from rag.cache import LRUCache
+from sql_ai.sql_parser import ParsedQuery, parse_sql
+
+# Ayrıştırılmış sorgular (ham metin ve kanonik metin anahtarıyla; her anahtarın
+# hatası kendi metninden hesaplanır)
+_parsed_cache = LRUCache(maxsize=512, ttl=0, name='parsed_sql')
 
 class SQLValidator:
     def __init__(self):
         self.allowed_ops = SECURITY_CONFIG['allowed_operations']
         self.blocked_keywords = SECURITY_CONFIG['blocked_keywords']
+        # Tüm yasaklı kelimeler tek regex ile (kelime başına ayrı arama yerine)
+        self._blocked_pattern = re.compile(
+            r'\b(?:' + '|'.join(re.escape(k) for k in self.blocked_keywords) + r')\b'
+        )
     
-    def validate(self, sql):
+    def check(self, query):
         """
-        SQL sorgusunu doğrula
-        Returns: (is_valid, error_message)
+        Ayrıştırılmış sorguyu kurallara göre kontrol et
+        Kurallar token'larla değil kaynak metinle çalışır: string ve [ad] içleri de
+        taranır (OPENQUERY(LS, 'DELETE ...') gibi metin içinde gönderilen komutlar)
+        Returns: hata mesajı veya None
         """
+        sql = query.source
         if not sql:
-            return False, "SQL sorgusu boş"
+            return "SQL sorgusu boş"
         
         sql_upper = sql.upper().strip()
         
         # 1. Sadece izin verilen operasyonlar
-        first_word = sql_upper.split()[0] if sql_upper.split() else ''
+        words = sql_upper.split()
+        first_word = words[0] if words else ''
         if first_word not in self.allowed_ops:
-            return False, f"Sadece {', '.join(self.allowed_ops)} sorguları çalıştırılabilir"
+            return f"Sadece {', '.join(self.allowed_ops)} sorguları çalıştırılabilir"
         
-        # 2. Yasaklı kelimeler
-        for keyword in self.blocked_keywords:
-            # Kelime sınırlarını kontrol et
-            pattern = r'\b' + keyword + r'\b'
-            if re.search(pattern, sql_upper):
-                return False, f"Güvenlik: '{keyword}' kullanılamaz"
+        # 2. Yasaklı kelimeler (config sırasıyla ilk bulunan raporlanır)
+        found = set(self._blocked_pattern.findall(sql_upper))
+        if found:
+            keyword = next(k for k in self.blocked_keywords if k in found)
+            return f"Güvenlik: '{keyword}' kullanılamaz"
         
-        # 3. Çoklu statement kontrolü (SQL injection)
-        if ';' in sql:
-            # Sadece sondaki ; kabul edilebilir
-            if sql.rstrip(';').count(';') > 0:
-                return False, "Çoklu SQL ifadesi tespit edildi"
+        # 3. Çoklu statement kontrolü (SQL injection) - sadece sondaki ; kabul edilebilir
+        if ';' in sql and sql.rstrip(';').count(';') > 0:
+            return "Çoklu SQL ifadesi tespit edildi"
         
         # 4. Yorum içinde gizli komut kontrolü
         if '--' in sql or '/*' in sql:
-            return False, "SQL yorumları kullanılamaz"
+            return "SQL yorumları kullanılamaz"
         
         # 5. xp_cmdshell gibi tehlikeli fonksiyonlar
-        dangerous_funcs = ['xp_cmdshell', 'sp_execute', 'exec(', 'execute(']
-        for func in dangerous_funcs:
-            if func.lower() in sql.lower():
-                return False, f"Güvenlik: '{func}' kullanılamaz"
+        sql_lower = sql.lower()
+        for func in ['xp_cmdshell', 'sp_execute', 'exec(', 'execute(']:
+            if func in sql_lower:
+                return f"Güvenlik: '{func}' kullanılamaz"
         
-        return True, None
+        return None
+    
+    def validate(self, sql):
+        """
+        SQL sorgusunu doğrula
+        Returns: (is_valid, error_message)
+        """
+        query = prepare_sql(sql)
+        return query.error is None, query.error
     
     def sanitize(self, sql):
-        """SQL'i temizle"""
+        """SQL'i temizle (sondaki ; ve fazla boşluklar atılır)"""
         if not sql:
             return None
-        
-        # Sondaki ; kaldır
-        sql = sql.rstrip(';').strip()
-        
-        # Çift boşlukları tek boşluğa çevir
-        sql = re.sub(r'\s+', ' ', sql)
-        
-        return sql
+        return prepare_sql(sql).sql
 
 
 # Singleton instance
 _validator = SQLValidator()
 
+def prepare_sql(sql):
+    """
+    Metni ayrıştır + doğrula, sonucu cache'le
+    ParsedQuery verilirse olduğu gibi döner
+    Returns: ParsedQuery (error dolu ise geçersiz)
+    """
+    if isinstance(sql, ParsedQuery):
+        return sql
+    sql = sql or ''
+    query = _parsed_cache.get(sql)
+    if query is None:
+        query = parse_sql(sql)
+        query.error = _validator.check(query)
+        _parsed_cache.set(sql, query)
+        if query.sql != sql and not any(t.kind == 'line_comment' for t in query.tokens):
+            # Kanonik metin yeniden ayrıştırılınca aynı token'lar çıkar (satır yorumu
+            # yoksa); hata ise metne bağlı, kanonik metin için ayrıca kontrol edilir
+            canonical = ParsedQuery(query.sql, query.sql, query.tokens)
+            canonical.error = _validator.check(canonical)
+            _parsed_cache.set(query.sql, canonical)
+    return query
+
 def validate_sql(sql):
     """SQL doğrula"""
     return _validator.validate(sql)
@@ -89,7 +127,9 @@ if __name__ == '__main__':
         "SELECT * FROM users; DELETE FROM users",
         "SELECT * FROM users WHERE name = 'test' -- comment",
         "UPDATE users SET name = 'x'",
-        "SELECT * FROM TOHOM_SIPARIS WHERE TIP = 0"
+        "SELECT * FROM TOHOM_SIPARIS WHERE TIP = 0",
+        "SELECT * FROM OPENQUERY(LS, 'DELETE FROM T')",
+        "SELECT * FROM T WHERE A LIKE '%DROP%'"
     ]
     
     for sql in test_cases: